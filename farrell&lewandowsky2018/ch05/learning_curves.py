@@ -0,0 +1,137 @@
+'''
+5.1 - An example of what could go wrong: simulated learning curves
+
+The notebook (ch5.ipynb) draws each subject's change point s and
+learning rate r, and then each subject's performance on each trial,
+writing them one cell at a time into DataFrames with .loc. Here the
+performance of all subjects on all trials is a single array
+expression,
+
+    performance = min(N(50, 1) + r*max(trial - s, 0), 100)
+
+filled into a pre-allocated (subjects x trials) array a chunk of
+subjects at a time (so at most chunk_size x n_trials temporaries exist),
+and only turned into a DataFrame once, at the end:
+
+    >>> param_df, performance_df = simulate(n_subjs=10**4, n_trials=10**3)
+
+Running...
+$ python learning_curves.py
+
+...will simulate the notebook's 9 subjects and print the mean curve,
+and time 10^4 subjects x 10^3 trials.
+'''
+
+from __future__ import division
+
+import numpy as np
+from pandas import DataFrame, MultiIndex
+
+
+# parameters from the notebook
+S_MU = 40
+S_SIGMA = 20
+R_MU = 5
+R_SIGMA = 1.5
+# performance before learning starts, and its ceiling
+BASE_MU = 50
+BASE_SIGMA = 1
+MAX_PERFORMANCE = 100
+
+CHUNK_SIZE = 1000
+
+
+def simulate_params(n_subjs, s_mu=S_MU, s_sigma=S_SIGMA, r_mu=R_MU,
+    r_sigma=R_SIGMA, rng=None):
+    '''Change point (rounded to a trial) and learning rate of each subject.
+    RETURNS
+        s, r:   arrays (n_subjs,)
+    '''
+    rng = np.random.default_rng() if rng is None else rng
+    s = np.round(rng.normal(s_mu, s_sigma, n_subjs))
+    r = rng.normal(r_mu, r_sigma, n_subjs)
+    return s, r
+
+
+def performance(s, r, n_trials, base_mu=BASE_MU, base_sigma=BASE_SIGMA,
+    max_performance=MAX_PERFORMANCE, rng=None, chunk_size=CHUNK_SIZE,
+    dtype=float, out=None):
+    '''Performance of every subject on every trial.
+    ARGS
+        s, r:               change point and learning rate, arrays (n_subjs,)
+        n_trials:           number of trials
+        base_mu, base_sigma:
+                            performance (mean, sd) before learning
+        max_performance:    ceiling on performance
+        rng:                numpy Generator
+        chunk_size:         number of subjects simulated at a time
+        dtype:              float or np.float32 (half the memory)
+        out:                optional array (n_subjs, n_trials) to fill,
+                            eg a np.memmap
+    RETURNS
+        out:                array (n_subjs, n_trials)
+    '''
+    rng = np.random.default_rng() if rng is None else rng
+    s = np.asarray(s, dtype=dtype)
+    r = np.asarray(r, dtype=dtype)
+    if out is None:
+        out = np.empty((len(s), n_trials), dtype=dtype)
+    trials = np.arange(n_trials, dtype=dtype)
+
+    for start in range(0, len(s), chunk_size):
+        chunk = out[start:start + chunk_size]
+        # noise around the base level, drawn straight into the output
+        rng.standard_normal(out=chunk, dtype=out.dtype)
+        chunk *= base_sigma
+        chunk += base_mu
+        # improvement since the change point (none before it)
+        learned = trials - s[start:start + chunk_size, None]
+        np.maximum(learned, 0, out=learned)
+        learned *= r[start:start + chunk_size, None]
+        chunk += learned
+        np.minimum(chunk, max_performance, out=chunk)
+    return out
+
+
+def simulate(n_subjs=9, n_trials=120, seed=None, chunk_size=CHUNK_SIZE,
+    dtype=float, **params):
+    '''Simulate parameters and learning curves, as in the notebook.
+    ARGS
+        n_subjs, n_trials:  numbers of subjects and of trials
+        seed:               seed for the simulation
+        chunk_size, dtype:  as for performance
+        params:             other parameters of simulate_params and
+                            performance (eg, s_sigma, max_performance)
+    RETURNS
+        param_df:           DataFrame of s and r, indexed by subject
+        performance_df:     DataFrame of performance, indexed by
+                            (subj, trial)
+    '''
+    rng = np.random.default_rng(seed)
+    param_names = ('s_mu', 's_sigma', 'r_mu', 'r_sigma')
+    s, r = simulate_params(n_subjs, rng=rng, **dict((k, v)
+        for k, v in params.items() if k in param_names))
+    perf = performance(s, r, n_trials, rng=rng, chunk_size=chunk_size,
+        dtype=dtype, **dict((k, v) for k, v in params.items()
+        if k not in param_names))
+
+    param_df = DataFrame({'s': s, 'r': r}, columns=['s', 'r'])
+    performance_df = DataFrame({'performance': perf.ravel()},
+        index=MultiIndex.from_product([range(n_subjs), range(n_trials)],
+            names=['subj', 'trial']))
+    return param_df, performance_df
+
+
+if __name__ == '__main__':
+    import time
+
+    param_df, performance_df = simulate(seed=1)
+    print(param_df)
+    print('mean curve (every 10th trial):')
+    mean_curve = performance_df.groupby('trial')['performance'].mean()
+    print(np.round(mean_curve.values[::10], 1))
+
+    t0 = time.time()
+    param_df, performance_df = simulate(n_subjs=10**4, n_trials=10**3,
+        seed=2, dtype=np.float32)
+    print('10^4 subjects x 10^3 trials: {:.2f} s'.format(time.time() - t0))
@@ -0,0 +1,436 @@
+'''
+5.2 - Quantile averaging (Vincentizing) and fitting RT distributions
+
+Listings 5.1 and 5.2 (and the notebook) simulate shifted Weibull RTs
+one participant at a time, take each participant's quantiles with
+apply/groupby, and call optim/fmin once per participant. Here:
+
+    - quantiles() takes the RTs of every participant in one ragged
+      vector (with a participant index), sorts it once and reads all
+      the quantiles off the sorted array (R's default type 7, which is
+      also what numpy and pandas use)
+    - vincentize() averages them over participants
+    - fit_quantiles() and fit_individual() fit a shifted Weibull or an
+      ex-Gaussian (MODELS) to quantiles (averaged, or of each
+      participant) or to each participant's RTs, running one
+      Nelder-Mead simplex per participant side by side: every step of
+      the search evaluates the objective of all the participants still
+      being fitted in a single array operation
+
+so the group-level fit of thousands of participants takes well under
+a second:
+
+    >>> rts, subjects = simulate(wb_params, n_obs=80, seed=1)
+    >>> q = quantiles(rts, subjects)            # (n_subjs, 5)
+    >>> group = fit_quantiles('weibull', vincentize(q))
+    >>> individual = fit_individual('weibull', rts, subjects)
+
+As in the listings, illegal parameters get a discrepancy of PENALTY.
+The ex-Gaussian densities come from exgauss.py in chapter 4 of the
+2012 book.
+
+Running...
+$ python vincentize.py
+
+...will redo listings 5.1 and 5.2 for many participants, and time the
+fits.
+'''
+
+from __future__ import division
+
+import os
+import sys
+from collections import OrderedDict
+
+import numpy as np
+from pandas import DataFrame
+from scipy import special
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    os.pardir, os.pardir, 'lewandowsky&farrell2012', 'ch4'))
+import exgauss
+
+
+QUANT_PROBS = (.1, .3, .5, .7, .9)
+# discrepancy for illegal parameters (as in listings 5.1 and 5.2)
+PENALTY = 10000000
+
+
+## quantiles
+
+def sort_by_subject(rts, subjects, n_subjects=None):
+    '''Sort ragged RTs by participant, and by RT within participant.
+    ARGS
+        rts:        RTs of all participants, array (n_rts,)
+        subjects:   participant of each RT, ints from 0 to n_subjects-1
+        n_subjects: number of participants (default: max(subjects)+1)
+    RETURNS
+        rts:        the sorted RTs
+        starts:     index of each participant's first RT, (n_subjects,)
+        counts:     number of RTs of each participant, (n_subjects,)
+    '''
+    rts = np.asarray(rts, dtype=float)
+    subjects = np.asarray(subjects)
+    order = np.lexsort((rts, subjects))
+    counts = np.bincount(subjects, minlength=n_subjects or 0)
+    starts = np.cumsum(counts) - counts
+    return rts[order], starts, counts
+
+
+def quantiles(rts, subjects, probs=QUANT_PROBS, n_subjects=None):
+    '''Each participant's sample quantiles (type 7, as in R and pandas).
+    ARGS
+        rts, subjects, n_subjects:
+                    as for sort_by_subject
+        probs:      quantile probabilities
+    RETURNS
+        q:          array (n_subjects, len(probs)), nan for participants
+                    without RTs
+    '''
+    x, starts, counts = sort_by_subject(rts, subjects, n_subjects)
+    probs = np.asarray(probs, dtype=float)
+    # position of each quantile among each participant's sorted RTs
+    h = (np.maximum(counts, 1)[:, None] - 1) * probs
+    lo = np.floor(h).astype(int)
+    hi = np.minimum(lo + 1, np.maximum(counts, 1)[:, None] - 1)
+    if len(x) == 0:
+        return np.full(h.shape, np.nan)
+    x_lo = x[np.minimum(starts[:, None] + lo, len(x) - 1)]
+    x_hi = x[np.minimum(starts[:, None] + hi, len(x) - 1)]
+    q = x_lo + (h - lo)*(x_hi - x_lo)
+    return np.where(counts[:, None] > 0, q, np.nan)
+
+
+def vincentize(q):
+    '''Average quantiles over participants (rows of q).'''
+    return np.nanmean(q, axis=0)
+
+
+## models
+
+def weibull_ppf(p, shape, loc, scale):
+    '''Quantiles of the shifted Weibull (loc is the shift).'''
+    return loc + scale * (-np.log1p(-p))**(1/shape)
+
+
+def weibull_logpdf(y, shape, loc, scale):
+    '''log density of the shifted Weibull (-inf at or below the shift).'''
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = (y - loc)/scale
+        lnf = np.log(shape/scale) + (shape - 1)*np.log(z) - z**shape
+    return np.where(z > 0, lnf, -np.inf)
+
+
+def weibull_legal(shape, loc, scale):
+    '''Parameters allowed in listings 5.1 and 5.2 (all positive).'''
+    return (shape > 0) & (loc > 0) & (scale > 0)
+
+
+def weibull_start(probs, q, min_rt=None):
+    '''Starting (shape, loc, scale) from quantiles, array (..., 3).'''
+    q10, q50 = _interp_quantiles(probs, q, (.1, .5))
+    shape = np.full(q10.shape, 2.)
+    loc = np.clip(q10 - (q50 - q10), .1*q10, .9*q10)
+    if min_rt is not None:
+        loc = np.minimum(loc, .9*min_rt)
+    scale = (q50 - loc) / np.log(2)**(1/shape)
+    return np.stack([shape, loc, scale], axis=-1)
+
+
+def exgauss_ppf(p, mu, sigma, tau, tol=1e-10, max_iter=50):
+    '''Quantiles of the ex-Gaussian, by safeguarded Newton steps.
+
+    The quantile is bracketed by that of the normal component (below)
+    and by mu + 8 sigma + tau*(1 - log(1-p)) (above); a Newton step is
+    taken when it stays inside the bracket, and bisection otherwise.
+    '''
+    p, mu, sigma, tau = np.broadcast_arrays(*[np.asarray(a, dtype=float)
+        for a in (p, mu, sigma, tau)])
+    lower = mu + sigma*special.ndtri(p)
+    upper = mu + 8*sigma + tau*(1 - np.log1p(-p))
+    x = np.minimum(lower + tau*(-np.log1p(-p)), upper)
+    for it in range(max_iter):
+        F = exgauss.cdf(x, mu, sigma, tau)
+        below = F < p
+        lower = np.where(below, x, lower)
+        upper = np.where(below, upper, x)
+        if np.all(np.abs(F - p) < tol):
+            break
+        with np.errstate(divide='ignore', invalid='ignore'):
+            newton = x - (F - p)/exgauss.pdf(x, mu, sigma, tau)
+        x = np.where((newton > lower) & (newton < upper), newton,
+            (lower + upper)/2)
+    return x
+
+
+def exgauss_legal(mu, sigma, tau):
+    '''sigma and tau positive.'''
+    return (sigma > 0) & (tau > 0)
+
+
+def exgauss_start(probs, q, min_rt=None):
+    '''Starting (mu, sigma, tau) from quantiles, array (..., 3).'''
+    q10, q50, q90 = _interp_quantiles(probs, q, (.1, .5, .9))
+    sd = (q90 - q10) / (2*special.ndtri(.9))
+    tau = sd/2
+    return np.stack([q50 - tau*np.log(2), sd*np.sqrt(.75), tau], axis=-1)
+
+
+def _interp_quantiles(probs, q, new_probs):
+    '''Quantiles at new_probs, interpolated (flat beyond the ends).'''
+    probs = np.asarray(probs, dtype=float)
+    q = np.asarray(q, dtype=float)
+    idx = [np.interp(p, probs, np.arange(len(probs))) for p in new_probs]
+    lo = [np.floor(i).astype(int) for i in idx]
+    return [q[..., l] + (i - l)*(q[..., min(l + 1, len(probs) - 1)]
+        - q[..., l]) for i, l in zip(idx, lo)]
+
+
+MODELS = OrderedDict([
+    ('weibull', dict(parnames=('shape', 'loc', 'scale'), ppf=weibull_ppf,
+        logpdf=weibull_logpdf, legal=weibull_legal, start=weibull_start)),
+    ('exgauss', dict(parnames=('mu', 'sigma', 'tau'), ppf=exgauss_ppf,
+        logpdf=exgauss.logpdf, legal=exgauss_legal, start=exgauss_start)),
+])
+
+
+## objectives: theta is (m, n_params), rows the m participants
+
+def quantile_rmsd(theta, rows, model, q, probs):
+    '''RMSD between predicted and empirical quantiles (weib_qdev).'''
+    params = [t[:, None] for t in theta.T]
+    with np.errstate(all='ignore'):
+        pred = model['ppf'](np.asarray(probs), *params)
+        rmsd = np.sqrt(np.mean((pred - q[rows])**2, axis=1))
+    legal = model['legal'](*theta.T) & np.isfinite(rmsd)
+    return np.where(legal, rmsd, PENALTY)
+
+
+def deviance(theta, rows, model, x, starts, counts):
+    '''-2 log-likelihood of each participant's RTs (weib_deviance).'''
+    # the sorted RTs of just these participants
+    lens = counts[rows]
+    which = np.repeat(np.arange(len(rows)), lens)
+    offset = np.arange(len(which)) - (np.cumsum(lens) - lens)[which]
+    y = x[starts[rows][which] + offset]
+
+    params = [t[which] for t in theta.T]
+    with np.errstate(all='ignore'):
+        lnf = model['logpdf'](y, *params)
+        dev = -2*np.bincount(which, lnf, len(rows))
+    legal = model['legal'](*theta.T) & np.isfinite(dev)
+    return np.where(legal, dev, PENALTY)
+
+
+## batched simplex search
+
+def nelder_mead(fun, x0, args=(), xtol=1e-4, ftol=1e-4, max_iter=None):
+    '''One Nelder-Mead simplex per row of x0, all searched together.
+
+    Follows the steps (and the starting simplex and stopping rule) of
+    scipy.optimize.fmin, but each reflection, expansion, contraction or
+    shrink is evaluated for all the rows that take it in one call.
+    Rows that have converged drop out.
+    ARGS
+        fun:        objective, called as fun(theta, rows, *args) with
+                    theta (m, n_params) for the m rows given, and
+                    returning (m,) values
+        x0:         starting points, array (n_rows, n_params)
+        xtol, ftol: a row has converged once its simplex is within xtol
+                    of its best vertex, and its values within ftol
+        max_iter:   most iterations (default 200*n_params)
+    RETURNS
+        fit:        dict with x (n_rows, n_params), fun, n_iter, n_fev
+                    and converged (n_rows,)
+    '''
+    x0 = np.atleast_2d(np.asarray(x0, dtype=float))
+    n, k = x0.shape
+    if max_iter is None:
+        max_iter = 200*k
+
+    def f(theta, rows):
+        n_fev[rows] += 1
+        return fun(theta, rows, *args)
+
+    n_fev = np.zeros(n, dtype=int)
+    n_iter = np.zeros(n, dtype=int)
+    # starting simplex as in fmin: 5% steps (.00025 from zero)
+    sim = np.repeat(x0[:, None, :], k + 1, axis=1)
+    step = np.where(x0 != 0, .05*x0, .00025)
+    sim[:, np.arange(1, k + 1), np.arange(k)] += step
+    everyone = np.arange(n)
+    fsim = np.column_stack([f(sim[:, j], everyone) for j in range(k + 1)])
+    converged = np.zeros(n, dtype=bool)
+
+    for it in range(max_iter):
+        order = np.argsort(fsim, axis=1, kind='stable')
+        fsim = np.take_along_axis(fsim, order, axis=1)
+        sim = np.take_along_axis(sim, order[:, :, None], axis=1)
+        converged |= (np.max(np.abs(sim[:, 1:] - sim[:, :1]), axis=(1, 2))
+            <= xtol) & (np.max(np.abs(fsim[:, 1:] - fsim[:, :1]), axis=1)
+            <= ftol)
+        rows = np.flatnonzero(~converged)
+        if len(rows) == 0:
+            break
+        n_iter[rows] += 1
+        S, F = sim[rows], fsim[rows]
+        centroid = S[:, :-1].mean(axis=1)
+        worst = S[:, -1]
+
+        xr = 2*centroid - worst
+        fr = f(xr, rows)
+        new_x, new_f = xr.copy(), fr.copy()
+
+        # expand past the best vertex
+        expand = fr < F[:, 0]
+        if np.any(expand):
+            xe = 3*centroid[expand] - 2*worst[expand]
+            fe = f(xe, rows[expand])
+            better = fe < fr[expand]
+            new_x[expand] = np.where(better[:, None], xe, xr[expand])
+            new_f[expand] = np.where(better, fe, fr[expand])
+
+        # contract, outside (reflection beat the worst) or inside
+        contract = fr >= F[:, -2]
+        shrink = np.zeros(len(rows), dtype=bool)
+        if np.any(contract):
+            outside = (fr < F[:, -1])[contract]
+            c, w = centroid[contract], worst[contract]
+            xc = np.where(outside[:, None], 1.5*c - .5*w, .5*c + .5*w)
+            fc = f(xc, rows[contract])
+            accept = np.where(outside, fc <= fr[contract],
+                fc < F[contract, -1])
+            new_x[contract] = xc
+            new_f[contract] = fc
+            shrink[contract] = ~accept
+
+        # a rejected contraction is dropped, and the old simplex shrunk
+        keep = ~shrink
+        S[keep, -1], F[keep, -1] = new_x[keep], new_f[keep]
+        # shrink towards the best vertex
+        if np.any(shrink):
+            best = S[shrink, :1]
+            S[shrink, 1:] = best + .5*(S[shrink, 1:] - best)
+            F[shrink, 1:] = np.column_stack([f(S[shrink, j], rows[shrink])
+                for j in range(1, k + 1)])
+        sim[rows], fsim[rows] = S, F
+
+    best = np.argmin(fsim, axis=1)
+    return dict(x=sim[everyone, best], fun=fsim[everyone, best],
+        n_iter=n_iter, n_fev=n_fev, converged=converged)
+
+
+## fitting
+
+def _get_model(model):
+    return MODELS[model] if isinstance(model, str) else model
+
+
+def fit_quantiles(model, q, probs=QUANT_PROBS, start=None, **options):
+    '''Fit quantiles by minimizing their RMSD (listing 5.1).
+    ARGS
+        model:      name in MODELS (or one of its values)
+        q:          quantiles, (len(probs),) (eg, vincentize(q)) or
+                    (n_subjects, len(probs)) to fit each participant's
+        probs:      their probabilities
+        start:      starting parameters, broadcast to (n_subjects,
+                    n_params) (default: from the quantiles)
+        options:    passed to nelder_mead (eg, xtol)
+    RETURNS
+        fit:        dict of theta (..., n_params), rmsd, n_iter and
+                    converged, and the parnames
+    '''
+    model = _get_model(model)
+    q = np.asarray(q, dtype=float)
+    single = q.ndim == 1
+    q = np.atleast_2d(q)
+    if start is None:
+        start = model['start'](probs, q)
+    start = np.broadcast_to(start, (len(q), len(model['parnames'])))
+    res = nelder_mead(quantile_rmsd, start, args=(model, q, probs),
+        **options)
+    fit = dict(theta=res['x'], rmsd=res['fun'], n_iter=res['n_iter'],
+        converged=res['converged'])
+    if single:
+        fit = dict((key, value[0]) for key, value in fit.items())
+    fit['parnames'] = model['parnames']
+    return fit
+
+
+def fit_individual(model, rts, subjects, n_subjects=None, start=None,
+    **options):
+    '''Maximum likelihood fit of each participant's RTs (listing 5.2).
+    ARGS
+        model:      name in MODELS (or one of its values)
+        rts, subjects, n_subjects:
+                    as for sort_by_subject
+        start:      starting parameters, broadcast to (n_subjects,
+                    n_params) (default: from each participant's quantiles)
+        options:    passed to nelder_mead (eg, xtol)
+    RETURNS
+        fit:        dict of theta (n_subjects, n_params), deviance,
+                    n_iter and converged, and the parnames
+    '''
+    model = _get_model(model)
+    x, starts, counts = sort_by_subject(rts, subjects, n_subjects)
+    if start is None:
+        q = quantiles(rts, subjects, QUANT_PROBS, len(counts))
+        min_rt = x[np.minimum(starts, len(x) - 1)]
+        start = model['start'](QUANT_PROBS, q, min_rt)
+    start = np.broadcast_to(start, (len(counts), len(model['parnames'])))
+    res = nelder_mead(deviance, start, args=(model, x, starts, counts),
+        **options)
+    return dict(theta=res['x'], deviance=res['fun'], n_iter=res['n_iter'],
+        converged=res['converged'], parnames=model['parnames'])
+
+
+def simulate(params, n_obs, seed=None):
+    '''Shifted Weibull RTs for each participant (listing 5.1).
+    ARGS
+        params:     DataFrame with columns shape, loc and scale, one row
+                    per participant
+        n_obs:      RTs per participant, an int or one per participant
+        seed:       seed for the draws
+    RETURNS
+        rts:        array (n_rts,)
+        subjects:   participant (row of params) of each RT
+    '''
+    rng = np.random.default_rng(seed)
+    n_obs = np.broadcast_to(n_obs, len(params))
+    subjects = np.repeat(np.arange(len(params)), n_obs)
+    shape, loc, scale = [params[name].values[subjects]
+        for name in ('shape', 'loc', 'scale')]
+    return loc + scale*rng.weibull(shape), subjects
+
+
+if __name__ == '__main__':
+    import time
+
+    n_subjs = 5000
+    rng = np.random.default_rng(1)
+    # parameters as in listing 5.1
+    wb_params = DataFrame({'shape': rng.normal(2, .25, n_subjs),
+        'loc': rng.normal(250, 50, n_subjs),
+        'scale': rng.normal(200, 50, n_subjs)},
+        columns=['shape', 'loc', 'scale'])
+    # a ragged number of RTs per participant
+    rts, subjects = simulate(wb_params, rng.integers(20, 100, n_subjs),
+        seed=2)
+    print('{} participants, {} RTs'.format(n_subjs, len(rts)))
+    print('true mean parameters:')
+    print(wb_params.mean().round(2).to_dict())
+
+    t0 = time.time()
+    q = quantiles(rts, subjects)
+    vinq = vincentize(q)
+    group = fit_quantiles('weibull', vinq)
+    print('\nVincentized fit ({:.3f} s):'.format(time.time() - t0))
+    print(dict(zip(group['parnames'], np.round(group['theta'], 2).tolist())))
+
+    for name in MODELS:
+        t0 = time.time()
+        fit = fit_individual(name, rts, subjects)
+        print('\n{} fits of each participant ({:.2f} s, {} converged):'
+            .format(name, time.time() - t0, fit['converged'].sum()))
+        estimates = DataFrame(fit['theta'], columns=fit['parnames'])
+        print(estimates.aggregate(['mean', 'std']).round(2))
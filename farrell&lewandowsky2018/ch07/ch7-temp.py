@@ -7,6 +7,8 @@ import numpy as np
 import pandas as pd
 from scipy import stats
 
+from metropolis import metropolis, normal_mean_logpost
+
 import seaborn as sea
 import matplotlib.pyplot as plt; plt.ion()
 sea.set_style('whitegrid')
@@ -70,55 +72,32 @@ WHAT is a markov chain?
 
 # lets say we are interested in a normal like the book
 
-chain = np.zeros(5000)
-
 obs_val = 144
 known_sd = 15
 
 tune_sd = 2
 
 # starting guess
-chain[0] = 150
+start = 150
 
 
 ## NOTE we are doing parameter simulation?? for the mean of normal
 ## bc we kjnkow the Standard deviation of it.
 ## we just dont know the mean, but we have one sample to help us
 
-
-for i in range(1,5000):
-    
-    # grab current value (Markov Chains have memory of 1-back)
-    curr_mu = chain[i-1] # guessing MU (book calls this current)
-
-    # propose new value (PROPOSING MU) by adding noise
-    prop_mu = curr_mu + stats.norm(0,tune_sd).rvs(1)
-
-    ## decide what to do
-
-    # compare density of proposal and observed value (data)
-
-    ## WE are taking the DENSITY of the observed value
-    ## AT bothe the proposal and the previous iteration
-    ## **we are not using the observed as the mean**
-    curr_dens = stats.norm(curr_mu,known_sd).pdf(obs_val)
-    prop_dens = stats.norm(prop_mu,known_sd).pdf(obs_val)
-
-    # we want to keep the proposed value if the new density is higher
-    # ie, if the probability of the data coming from a distribution with that mu
-    # is higher than the previous one
-    if prop_dens > curr_dens:
-        # accept
-        chain[i] = prop_mu
-    else:
-        # accept it on probabilistc terms
-        llratio = prop_dens/curr_dens
-        if np.random.uniform() < llratio:
-            # accept
-            chain[i] = prop_mu
-        else:
-            # reject (just keep current)
-            chain[i] = curr_mu
+## the loop is in metropolis.py: each iteration
+# grabs the current value (Markov Chains have memory of 1-back),
+# proposes a new value of mu by adding noise,
+# and compares the density of the observed value (data)
+# AT both the proposal and the current value
+# **we are not using the observed as the mean**
+# if the proposal is more likely, it is always accepted,
+# otherwise it is accepted on probabilistic terms.
+# this is all done with LOG densities, which don't underflow,
+# so the ratio of densities is a difference: log(u) < prop - curr
+result = metropolis(normal_mean_logpost, [start], 4999, tune_sd=tune_sd,
+    args=(obs_val, known_sd))
+chain = np.concatenate([[start], result['samples'][:, 0]])
 
 
 
@@ -163,32 +142,15 @@ Just adds a normal rather than uniform prior.
 
 '''
 
-for i in range(1,5000):
-    
-    curr_mu = chain[i-1]
-    prop_mu = curr_mu + stats.norm(0,tune_sd).rvs(1)
-
-    curr_dens = stats.norm(curr_mu,known_sd).pdf(obs_val)
-    prop_dens = stats.norm(prop_mu,known_sd).pdf(obs_val)
-
-    # add the prior aspect here
-    # this adjust each dens by its relation to the prior
-    curr_dens *= stats.norm(prior_mu,prior_sd).pdf(obs_val)
-    prop_desn *= stats.norm(prior_mu,prior_sd).pdf(obs_val)
-
-
-    if prop_dens > curr_dens:
-        # accept
-        chain[i] = prop_mu
-    else:
-        # accept it on probabilistc terms
-        llratio = prop_dens/curr_dens
-        if np.random.uniform() < llratio:
-            # accept
-            chain[i] = prop_mu
-        else:
-            # reject (just keep current)
-            chain[i] = curr_mu
+# the prior is a density over mu, so it is evaluated at the
+# current and proposed mu (not at obs_val, which would cancel out),
+# and in log space it is added to the log-likelihood
+prior_mu = 100
+prior_sd = 10
+
+result = metropolis(normal_mean_logpost, [start], 4999, tune_sd=tune_sd,
+    args=(obs_val, known_sd, prior_mu, prior_sd))
+prior_chain = np.concatenate([[start], result['samples'][:, 0]])
 
 
 
@@ -0,0 +1,372 @@
+'''
+7.1 - Convergence diagnostics for MCMC, computed as the chains run
+
+ch7-temp.py judges convergence by looking at a plot of the chain and
+throwing away the first 1000 samples, and the JAGS notebooks (ch08,
+ch09) use R's gelman.plot. Here the usual diagnostics are updated block
+by block as the samples arrive, so a sampler can stop as soon as they
+look good, and the chains never have to be kept in memory:
+
+    - split R-hat, from the mean and variance of blocks of each chain
+      (adjacent blocks are merged once there are more than max_blocks,
+      so the first and second halves are split at a block boundary)
+    - autocorrelation up to max_lag, from running sums of lagged products
+      that each new block adds to with an FFT (so O(n log n) overall,
+      and memory only grows with max_lag, not with the number of samples)
+    - effective sample size, combining the chains' autocorrelations with
+      Geyer's initial monotone sequence (as Stan does), for the draws
+      themselves (bulk) and for whether they fall below the 5% or above
+      the 95% quantile (tail)
+
+Two differences from Stan's versions, both because the chains are never
+stored: the bulk ESS and R-hat use the draws rather than their ranks,
+and the tail quantiles are fixed from the first block that arrives
+(which should therefore come after burn-in).
+
+    >>> diag = StreamingDiagnostics(n_chains=4)
+    >>> for block in blocks:                # (n_draws, n_chains, ...)
+    ...     diag.update(block)
+    ...     if diag.converged(max_rhat=1.01, min_ess=400):
+    ...         break
+    >>> diag.summary()
+
+sample_until() does this with the sampler in metropolis.py.
+
+Running...
+$ python diagnostics.py
+
+...will sample the mean of a normal (as in chapter 7) until R-hat and
+the ESS are good enough, and print the diagnostics.
+'''
+
+from __future__ import division
+
+import numpy as np
+
+from metropolis import metropolis
+
+
+MAX_LAG = 500
+MAX_BLOCKS = 256
+# each update is summarised in this many pieces, for splitting the chains
+SUB_BLOCKS = 8
+TAIL_PROBS = (.05, .95)
+
+
+class _LaggedSums(object):
+    '''Running sums for the autocovariance of many series at once, up to
+    max_lag, as blocks of the series arrive.
+
+    ARGS
+        shape:      shape of the series (eg, n_chains x n_params)
+        max_lag:    largest lag kept
+    '''
+
+    def __init__(self, shape, max_lag):
+        self.max_lag = max_lag
+        self.n = 0
+        self.shift = None
+        self.total = np.zeros(shape)
+        self.lagged = np.zeros(shape + (max_lag + 1,))
+        self.head = np.zeros(shape + (0,))
+        self.tail = np.zeros(shape + (0,))
+
+    def update(self, y):
+        '''Add a block of samples, y: shape + (n_draws,).'''
+        if self.shift is None:
+            # work relative to the first block's mean, to avoid cancellation
+            self.shift = np.mean(y, axis=-1)
+        y = y - self.shift[..., None]
+        L, r, B = self.max_lag, self.tail.shape[-1], y.shape[-1]
+
+        # sum over the block of y[t]*x[t-k], x being the tail and then y
+        w = np.concatenate([self.tail, y], axis=-1)
+        nfft = _fft_size(r + 2*B)
+        cc = np.fft.irfft(np.fft.rfft(w, nfft)
+            * np.fft.rfft(y[..., ::-1], nfft), nfft)
+        # lag k is at index r - k + B - 1 (nothing at negative indices)
+        idx = r + B - 1 - np.arange(L + 1)
+        valid = idx >= 0
+        self.lagged[..., valid] += cc[..., idx[valid]]
+
+        self.total += np.sum(y, axis=-1)
+        if self.head.shape[-1] < L:
+            self.head = np.concatenate([self.head,
+                y[..., :L - self.head.shape[-1]]], axis=-1)
+        self.tail = w[..., -L:] if L > 0 else w[..., :0]
+        self.n += B
+
+    def autocov(self):
+        '''Autocovariance (about each series' own mean, divided by n) at
+        lags 0..max_lag, shape + (max_lag+1,).'''
+        n, L = self.n, self.max_lag
+        k = np.arange(L + 1)
+        m = self.total / n
+        # sums of the first and last k samples, for k = 0..max_lag
+        zeros = np.zeros(self.total.shape + (1,))
+        head = np.concatenate([zeros, np.cumsum(self.head, axis=-1)], axis=-1)
+        tail = np.concatenate([zeros,
+            np.cumsum(self.tail[..., ::-1], axis=-1)], axis=-1)
+        head = _pad_last(head, L + 1)
+        tail = _pad_last(tail, L + 1)
+        # sum over t of (x[t] - m)*(x[t-k] - m), for t = k..n-1
+        acov = self.lagged - m[..., None]*(2*self.total[..., None] - head
+            - tail) + np.maximum(n - k, 0)*m[..., None]**2
+        return np.where(k < n, acov / n, 0.)
+
+    def mean(self):
+        return self.total / self.n + self.shift
+
+
+def _fft_size(n):
+    return 1 << int(np.ceil(np.log2(max(n, 1))))
+
+
+def _pad_last(x, size):
+    '''Pad the last axis of x with its last value, up to size.'''
+    if x.shape[-1] >= size:
+        return x[..., :size]
+    pad = np.repeat(x[..., -1:], size - x.shape[-1], axis=-1)
+    return np.concatenate([x, pad], axis=-1)
+
+
+def _merge(counts, means, m2s):
+    '''Combine the (count, mean, sum of squared deviations) of blocks
+    along the first axis.'''
+    n = np.sum(counts, axis=0)
+    mean = np.sum(counts*means, axis=0) / n
+    m2 = np.sum(m2s + counts*(means - mean)**2, axis=0)
+    return n, mean, m2
+
+
+def geyer_ess(acov, means, n):
+    '''Effective sample size from the autocovariances of several chains.
+    ARGS
+        acov:   (n_chains, ..., n_lags) autocovariance of each chain
+        means:  (n_chains, ...) mean of each chain
+        n:      number of draws per chain
+    RETURNS
+        ess:        (...) effective sample size
+        truncated:  (...) True where the autocorrelations had not died
+                    out by the last lag, so ess is too high
+    '''
+    n_chains = acov.shape[0]
+    W = np.mean(acov[..., 0], axis=0) * n / (n - 1)
+    var_plus = W*(n - 1)/n
+    if n_chains > 1:
+        var_plus = var_plus + np.var(means, axis=0, ddof=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rho = 1 - (W[..., None] - np.mean(acov, axis=0)) / var_plus[..., None]
+    rho[..., 0] = 1
+    # sums of adjacent pairs, kept while positive and made non-increasing
+    n_pairs = rho.shape[-1] // 2
+    pairs = rho[..., :2*n_pairs:2] + rho[..., 1:2*n_pairs:2]
+    positive = np.cumprod(pairs > 0, axis=-1).astype(bool)
+    pairs = np.minimum.accumulate(np.where(positive, pairs, 0), axis=-1)
+    tau = -1 + 2*np.sum(pairs, axis=-1)
+    tau = np.maximum(tau, 1/np.log10(n_chains*n))
+    ess = np.where(np.isfinite(var_plus) & (var_plus > 0),
+        n_chains*n / tau, np.nan)
+    return ess, positive[..., -1]
+
+
+class StreamingDiagnostics(object):
+    '''R-hat, ESS and autocorrelation, updated as blocks of samples arrive.
+
+    ARGS
+        n_chains:   number of chains
+        max_lag:    largest lag of the autocorrelation kept
+        max_blocks: most block summaries kept per chain for R-hat
+        tail_probs: quantiles defining the tails, for the tail ESS
+    '''
+
+    def __init__(self, n_chains, max_lag=MAX_LAG, max_blocks=MAX_BLOCKS,
+        tail_probs=TAIL_PROBS):
+        self.n_chains = n_chains
+        self.max_lag = max_lag
+        self.max_blocks = max_blocks
+        self.tail_probs = tail_probs
+        self.par_shape = None
+        self.n = 0
+
+    def _start(self, par_shape, draws):
+        self.par_shape = par_shape
+        shape = (self.n_chains, int(np.prod(par_shape)))
+        self.draws = _LaggedSums(shape, self.max_lag)
+        # one indicator series for each tail
+        self.tails = [_LaggedSums(shape, self.max_lag) for _ in self.tail_probs]
+        self.thresholds = np.quantile(draws.reshape(-1, shape[1]),
+            self.tail_probs, axis=0)
+        self.counts = np.zeros((0,) + shape)
+        self.means = np.zeros((0,) + shape)
+        self.m2s = np.zeros((0,) + shape)
+
+    def update(self, block):
+        '''Add a block of samples.
+        ARGS
+            block:  (n_draws, n_chains) + parameter shape, as in the
+                    samples returned by metropolis()
+        '''
+        block = np.asarray(block, dtype=float)
+        if block.shape[1] != self.n_chains:
+            raise ValueError('expected {} chains, got {}'.format(
+                self.n_chains, block.shape[1]))
+        if len(block) == 0:
+            return
+        if self.par_shape is None:
+            self._start(block.shape[2:], block)
+        # (n_chains, n_params, n_draws)
+        x = block.reshape(len(block), self.n_chains, -1).transpose(1, 2, 0)
+
+        self.draws.update(x)
+        for i, (tail, p) in enumerate(zip(self.tails, self.tail_probs)):
+            below = x <= self.thresholds[i][:, None]
+            tail.update((below if p < .5 else ~below).astype(float))
+
+        pieces = np.array_split(x, min(SUB_BLOCKS, x.shape[-1]), axis=-1)
+        self.counts = np.concatenate([self.counts,
+            [np.full(x.shape[:2], piece.shape[-1]) for piece in pieces]])
+        self.means = np.concatenate([self.means,
+            [np.mean(piece, axis=-1) for piece in pieces]])
+        self.m2s = np.concatenate([self.m2s,
+            [np.sum((piece - np.mean(piece, axis=-1, keepdims=True))**2,
+            axis=-1) for piece in pieces]])
+        while len(self.counts) > self.max_blocks:
+            self._halve_blocks()
+        self.n += x.shape[-1]
+
+    def _halve_blocks(self):
+        '''Merge adjacent pairs of block summaries.'''
+        n_even = len(self.counts) // 2 * 2
+        stats = [x[:n_even].reshape((-1, 2) + x.shape[1:])
+            for x in (self.counts, self.means, self.m2s)]
+        merged = _merge(*[s.swapaxes(0, 1) for s in stats])
+        rest = [x[n_even:] for x in (self.counts, self.means, self.m2s)]
+        self.counts, self.means, self.m2s = [np.concatenate([m, r])
+            for m, r in zip(merged, rest)]
+
+    def _reshape(self, x):
+        return x.reshape(x.shape[:-1] + self.par_shape)
+
+    def rhat(self):
+        '''Split R-hat for each parameter.'''
+        cum = np.cumsum(self.counts[:, 0, 0])
+        split = np.argmin(np.abs(cum - cum[-1]/2)) + 1
+        if split >= len(cum):
+            return self._reshape(np.full(self.counts.shape[-1], np.nan))
+        halves = [_merge(self.counts[:split], self.means[:split],
+            self.m2s[:split]), _merge(self.counts[split:],
+            self.means[split:], self.m2s[split:])]
+        n = np.concatenate([h[0] for h in halves])
+        means = np.concatenate([h[1] for h in halves])
+        var = np.concatenate([h[2] for h in halves]) / (n - 1)
+        n = np.mean(n)
+        W = np.mean(var, axis=0)
+        B_n = np.var(means, axis=0, ddof=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rhat = np.sqrt(((n - 1)/n*W + B_n) / W)
+        return self._reshape(rhat)
+
+    def autocorr(self):
+        '''Autocorrelation of each chain,
+        (n_chains,) + parameter shape + (max_lag+1,).'''
+        acov = self.draws.autocov()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            acf = acov / acov[..., :1]
+        return acf.reshape((self.n_chains,) + self.par_shape + (-1,))
+
+    def ess_bulk(self):
+        '''Effective sample size of the draws, for each parameter.'''
+        return self._reshape(geyer_ess(self.draws.autocov(),
+            self.draws.mean(), self.n)[0])
+
+    def ess_tail(self):
+        '''Effective sample size in the tails (the smallest of the ESS of
+        the indicators for each tail), for each parameter.'''
+        ess = [geyer_ess(tail.autocov(), tail.mean(), self.n)[0]
+            for tail in self.tails]
+        return self._reshape(np.min(ess, axis=0))
+
+    def lag_truncated(self):
+        '''True for parameters whose autocorrelation was still positive
+        at max_lag, so that the ESS is overestimated.'''
+        return self._reshape(geyer_ess(self.draws.autocov(),
+            self.draws.mean(), self.n)[1])
+
+    def summary(self):
+        '''All of the diagnostics in a dict.'''
+        return dict(n=self.n, mean=self._reshape(
+            np.mean(self.draws.mean(), axis=0)), rhat=self.rhat(),
+            ess_bulk=self.ess_bulk(), ess_tail=self.ess_tail(),
+            lag_truncated=self.lag_truncated())
+
+    def converged(self, max_rhat=1.01, min_ess=400):
+        '''Whether every parameter has R-hat below max_rhat and bulk and
+        tail ESS of at least min_ess (and an ESS that can be trusted).'''
+        if self.n < 4:
+            return False
+        summary = self.summary()
+        with np.errstate(invalid='ignore'):
+            return bool(np.all(summary['rhat'] < max_rhat)
+                and np.all(summary['ess_bulk'] >= min_ess)
+                and np.all(summary['ess_tail'] >= min_ess)
+                and not np.any(summary['lag_truncated']))
+
+
+def sample_until(logpost, start, max_rhat=1.01, min_ess=400, block=1000,
+    max_samples=100000, burnin=1000, adapt=True, tune_sd=1., args=(),
+    seed=None, callback=None, max_lag=MAX_LAG):
+    '''Run metropolis() in blocks until the diagnostics are good enough.
+    ARGS
+        logpost, start, tune_sd, args:
+                        as for metropolis
+        max_rhat:       largest split R-hat accepted
+        min_ess:        smallest bulk and tail ESS accepted
+        block:          number of samples per chain between checks
+        max_samples:    give up after this many samples per chain
+        burnin, adapt:  burn-in (with adaptation of tune_sd) run first
+        seed:           seed for the sampler
+        callback:       called with each block of samples, eg to save
+                        them; they are not kept otherwise
+        max_lag:        largest lag of the autocorrelation kept
+    RETURNS
+        diag:           the StreamingDiagnostics
+        state:          the last state of each chain
+    '''
+    seeds = np.random.SeedSequence(seed).spawn(max_samples // block + 2)
+    result = metropolis(logpost, start, 0, tune_sd=tune_sd, burnin=burnin,
+        adapt=adapt, args=args, seed=seeds[0])
+    diag = StreamingDiagnostics(len(result['state']), max_lag=max_lag)
+    for b in range(1, len(seeds)):
+        n = min(block, max_samples - diag.n)
+        if n <= 0:
+            break
+        result = metropolis(logpost, result['state'], n,
+            tune_sd=result['tune_sd'], args=args, seed=seeds[b])
+        if callback is not None:
+            callback(result['samples'])
+        diag.update(result['samples'])
+        if diag.converged(max_rhat, min_ess):
+            break
+    return diag, result['state']
+
+
+if __name__ == '__main__':
+
+    from metropolis import normal_mean_logpost
+
+    obs_val = 144
+    known_sd = 15
+
+    # 4 chains, spread out from each other
+    start = np.array([100., 130., 160., 190.])
+    diag, state = sample_until(normal_mean_logpost, start, tune_sd=2,
+        args=(obs_val, known_sd), seed=1)
+    summary = diag.summary()
+    print('stopped after {} samples per chain'.format(summary['n']))
+    print('mean {:.2f}, R-hat {:.4f}, bulk ESS {:.0f}, tail ESS {:.0f}'
+        .format(float(summary['mean']), float(summary['rhat']),
+        float(summary['ess_bulk']), float(summary['ess_tail'])))
+    acf = diag.autocorr().mean(axis=0)
+    print('autocorrelation at lags 1, 5, 10, 50: {}'.format(
+        np.round(acf[[1, 5, 10, 50]], 3)))
@@ -0,0 +1,180 @@
+'''
+7.1 - Random-walk Metropolis-Hastings
+
+A reusable version of the sampler written out by hand in ch7-temp.py.
+
+Everything happens in log space: the target is a log-density (the log
+prior plus the log-likelihood, up to a constant), and a proposal is
+accepted when log(u) < logpost(proposal) - logpost(current). Comparing
+raw densities, as ch7-temp.py does, underflows as soon as there is more
+than a handful of data points.
+
+Many independent chains run side by side as one array, so every
+iteration is a single call to the log-target for all of the chains.
+The proposal noise and the uniform thresholds are drawn in blocks of
+iterations rather than one at a time, and the acceptance rate of each
+chain is tracked. During burn-in, tune_sd can be adapted (separately
+for each chain) towards a target acceptance rate.
+
+    >>> logpost = lambda mu: normal_mean_logpost(mu, obs_val, known_sd)
+    >>> result = metropolis(logpost, start=np.full(100, 150.), n_samples=5000)
+    >>> result['samples'].shape             # (n_samples, n_chains)
+    >>> result['accept_rate']
+
+Running...
+$ python metropolis.py
+
+...will run the examples from the start of chapter 7 (the mean of a
+normal, with a uniform and then a normal prior) and print a summary.
+'''
+
+from __future__ import division
+
+import numpy as np
+
+
+# number of iterations of noise drawn at a time
+BLOCK = 1000
+# optimal acceptance rate for a random walk in 1 dimension, and in many
+TARGET_ACCEPT_1D = .44
+TARGET_ACCEPT = .234
+
+LOG_SQRT_2PI = .5*np.log(2*np.pi)
+
+
+def _norm_logpdf(x, mu, sd):
+    # stats.norm.logpdf, without its overhead on every iteration
+    return -.5*((x - mu)/sd)**2 - np.log(sd) - LOG_SQRT_2PI
+
+
+def normal_mean_logpost(mu, obs, known_sd, prior_mu=None, prior_sd=None):
+    '''Log posterior (up to a constant) of the mean of a normal with
+    known sd, given observations obs.
+    ARGS
+        mu:         array of candidate means (eg, one per chain)
+        obs:        observed value(s)
+        known_sd:   sd of the normal
+        prior_mu, prior_sd:
+                    normal prior on mu; None for a flat prior
+    RETURNS
+        logp:       array, the same shape as mu
+    '''
+    mu = np.asarray(mu, dtype=float)
+    obs = np.asarray(obs, dtype=float).reshape((-1,) + (1,)*mu.ndim)
+    logp = np.sum(_norm_logpdf(obs, mu, known_sd), axis=0)
+    if prior_mu is not None:
+        # the prior is a density over mu, not over the data
+        logp = logp + _norm_logpdf(mu, prior_mu, prior_sd)
+    return logp
+
+
+def metropolis(logpost, start, n_samples, tune_sd=1., burnin=0,
+    adapt=False, target_accept=None, adapt_interval=50, args=(),
+    seed=None, block=BLOCK):
+    '''Random-walk Metropolis-Hastings for many chains at once.
+    ARGS
+        logpost:        log target density, called as logpost(theta, *args)
+                        with theta an array of the same shape as start,
+                        returning an array (n_chains,)
+        start:          starting values, (n_chains,) for a single
+                        parameter or (n_chains, n_params)
+        n_samples:      number of samples kept (after burnin) per chain
+        tune_sd:        sd of the normal proposal noise, scalar, one per
+                        parameter, or one per chain and parameter (the
+                        shape of start, eg from an earlier run)
+        burnin:         number of iterations run (and dropped) first
+        adapt:          tune tune_sd during burn-in, for each chain,
+                        towards target_accept
+        target_accept:  acceptance rate adapted to (default .44 for one
+                        parameter, .234 for more)
+        adapt_interval: number of iterations between adaptations
+        args:           extra arguments passed to logpost (eg, the data)
+        seed:           seed for the proposals and acceptance thresholds
+        block:          number of iterations of random numbers drawn at once
+    RETURNS
+        result:         dict with
+                            samples:        (n_samples,) + start.shape
+                            logp:           (n_samples, n_chains), logpost
+                                            of the samples
+                            accept_rate:    (n_chains,) after burn-in
+                            tune_sd:        the proposal sd of each chain,
+                                            the same shape as start
+                            state:          the last state of each chain,
+                                            to carry on sampling from
+    '''
+    rng = np.random.default_rng(seed)
+    curr = np.array(start, dtype=float)
+    n_chains = curr.shape[0]
+    par_shape = curr.shape[1:]
+    sd = np.array(np.broadcast_to(tune_sd, curr.shape), dtype=float)
+    if target_accept is None:
+        target_accept = TARGET_ACCEPT_1D if np.prod(par_shape) <= 1 \
+            else TARGET_ACCEPT
+    # broadcasts a per-chain value against the parameters
+    per_chain = (slice(None),) + (None,)*len(par_shape)
+
+    curr_lp = np.asarray(logpost(curr, *args), dtype=float)
+    if not np.all(np.isfinite(curr_lp)):
+        raise ValueError('logpost is not finite at the start')
+
+    n_iter = burnin + n_samples
+    samples = np.empty((n_samples,) + curr.shape)
+    logp = np.empty((n_samples, n_chains))
+    n_accept = np.zeros(n_chains)
+    window = np.zeros(n_chains)
+
+    for b in range(0, n_iter, block):
+        n = min(block, n_iter - b)
+        noise = rng.standard_normal((n,) + curr.shape)
+        log_u = np.log(rng.random((n, n_chains)))
+        for j in range(n):
+            i = b + j
+            prop = curr + sd*noise[j]
+            prop_lp = np.asarray(logpost(prop, *args), dtype=float)
+            # nan (eg, outside the support) never gets accepted
+            accept = log_u[j] < prop_lp - curr_lp
+            curr = np.where(accept[per_chain], prop, curr)
+            curr_lp = np.where(accept, prop_lp, curr_lp)
+
+            if i < burnin:
+                if adapt:
+                    window += accept
+                    if (i + 1) % adapt_interval == 0:
+                        rate = window / adapt_interval
+                        sd *= np.exp(rate - target_accept)[per_chain]
+                        window[:] = 0
+            else:
+                samples[i - burnin] = curr
+                logp[i - burnin] = curr_lp
+                n_accept += accept
+
+    return dict(samples=samples, logp=logp,
+        accept_rate=n_accept / max(n_samples, 1), tune_sd=sd, state=curr)
+
+
+if __name__ == '__main__':
+    import time
+
+    obs_val = 144
+    known_sd = 15
+    n_chains = 1000
+
+    # uniform prior, starting from 150 as in the book
+    t0 = time.time()
+    flat = metropolis(normal_mean_logpost, np.full(n_chains, 150.), 5000,
+        tune_sd=2, burnin=1000, args=(obs_val, known_sd), seed=1)
+    elapsed = time.time() - t0
+    print('flat prior: mean {:.2f}, sd {:.2f}, acceptance {:.2f}'.format(
+        flat['samples'].mean(), flat['samples'].std(),
+        flat['accept_rate'].mean()))
+    print('  {:.1f} million samples per second'.format(
+        6000*n_chains / elapsed / 1e6))
+
+    # normal prior, with tune_sd adapted during burn-in
+    prior = metropolis(normal_mean_logpost, np.full(n_chains, 150.), 5000,
+        tune_sd=2, burnin=1000, adapt=True,
+        args=(obs_val, known_sd, 100, 10), seed=2)
+    print('normal prior: mean {:.2f}, sd {:.2f}, acceptance {:.2f}, '
+        'tune_sd {:.1f}'.format(prior['samples'].mean(),
+        prior['samples'].std(), prior['accept_rate'].mean(),
+        prior['tune_sd'].mean()))
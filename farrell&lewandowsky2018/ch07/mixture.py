@@ -0,0 +1,298 @@
+'''
+7.1.2 - Mixture models (guessing + von Mises), vectorized
+
+The notebook ch7-1-2_mixture-models.ipynb simulates one trial at a time,
+writing each into a pandas MultiIndex, and converts sigma to kappa for
+every trial. Here:
+
+    - sd2kappa and kappa2sd take (and return) whole arrays, and are
+      exact inverses of each other (the notebook's sd2kappa is an
+      approximation, which sd2kappa(sd, newton_steps=0) still gives)
+    - simulate() draws every trial of every subject and set size at once
+    - fit_em() finds the maximum likelihood g and sigma for every
+      (subject, set size) at once with the EM algorithm, using bincount
+      to sum over the trials of each group; the von Mises terms use the
+      exponentially scaled Bessel functions i0e and i1e, which don't
+      overflow for large kappa
+
+so a million trials take seconds:
+
+    >>> data = simulate(tru_params, n_trials=1000, n_subjects=100)
+    >>> fits = fit_em(data)                 # one row per subject x setsize
+
+Errors are in degrees in the DataFrames (as in the notebook), and in
+radians in the array functions.
+
+Running...
+$ python mixture.py
+
+...will simulate the notebook's two set sizes for many subjects and
+recover g and sigma.
+'''
+
+from __future__ import division
+
+import numpy as np
+import pandas as pd
+from scipy import special
+
+
+LOG_2PI = np.log(2*np.pi)
+# largest mean resultant length used, so kappa stays finite
+MAX_R = 1 - 1e-12
+# g is kept this far from 0 and 1, so both components stay in the mixture
+MIN_G = 1e-10
+
+
+def a1(kappa):
+    '''Mean resultant length of a von Mises, I1(kappa)/I0(kappa).'''
+    kappa = np.asarray(kappa, dtype=float)
+    return special.i1e(kappa) / special.i0e(kappa)
+
+
+def a1inv(r, newton_steps=2):
+    '''Inverse of a1: the kappa with a mean resultant length r.
+    Starts from the piecewise approximation used by sd2kappa in the
+    notebook, which is then polished by a few Newton steps.
+    '''
+    r = np.clip(np.asarray(r, dtype=float), 0, MAX_R)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        kappa = np.select([r < .53, r < .85],
+            [2*r + r**3 + (5*r**5)/6, -.4 + 1.39*r + .43/(1 - r)],
+            1/(r**3 - 4*r**2 + 3*r))
+        for step in range(newton_steps):
+            A = a1(kappa)
+            # derivative of a1
+            dA = 1 - A/kappa - A**2
+            kappa = np.where((kappa > 0) & (dA > 0),
+                kappa - (A - r)/dA, kappa)
+    return np.maximum(np.where(r > 0, kappa, 0.), 0.)
+
+
+def sd2kappa(sd, newton_steps=3):
+    '''von Mises kappa for a circular sd, the inverse of kappa2sd.
+    ARGS
+        sd:             standard deviation(s) in degrees
+        newton_steps:   Newton steps polishing the notebook's
+                        approximation (3 invert kappa2sd to rounding
+                        error; 0 gives the notebook's kappa)
+    RETURNS
+        kappa:          (in radians), the same shape as sd
+    '''
+    s = np.deg2rad(sd)
+    return a1inv(np.exp(-s**2 / 2), newton_steps)
+
+
+def kappa2sd(kappa):
+    '''Circular sd of a von Mises with concentration kappa.
+    ARGS
+        kappa:  concentration(s), in radians
+    RETURNS
+        sd:     standard deviation(s) in degrees, the same shape as kappa
+    '''
+    with np.errstate(divide='ignore'):
+        return np.rad2deg(np.sqrt(-2*np.log(a1(kappa))))
+
+
+def vonmises_logpdf(x, kappa):
+    '''log von Mises density at x (radians), centred on 0.'''
+    # log I0(kappa) = log(i0e(kappa)) + kappa
+    return kappa*(np.cos(x) - 1) - np.log(special.i0e(kappa)) - LOG_2PI
+
+
+def logmixturepdf(x, g, kappa):
+    '''log density of the mixture, (1-g)*vonmises(x; kappa) + g/(2 pi).'''
+    return np.logaddexp(np.log1p(-g) + vonmises_logpdf(x, kappa),
+        np.log(g) - LOG_2PI)
+
+
+def simulate_errors(g, sigma, n_trials, rng=None):
+    '''Errors (radians) for any number of conditions in one draw.
+    ARGS
+        g:          probability of guessing, array (...)
+        sigma:      sd (degrees) of the von Mises, broadcast against g
+        n_trials:   trials per condition
+        rng:        numpy Generator
+    RETURNS
+        errors:     array (..., n_trials)
+    '''
+    rng = np.random.default_rng() if rng is None else rng
+    g, kappa = np.broadcast_arrays(np.asarray(g, dtype=float),
+        sd2kappa(sigma))
+    shape = g.shape + (n_trials,)
+    guess = rng.random(shape) < g[..., None]
+    errors = np.where(guess, rng.uniform(-np.pi, np.pi, shape),
+        rng.vonmises(0, np.broadcast_to(kappa[..., None], shape)))
+    return errors
+
+
+def simulate(tru_params, n_trials, n_subjects=1, seed=None):
+    '''Simulate every subject and set size, as in the notebook.
+    ARGS
+        tru_params: DataFrame indexed by setsize, with columns g and sigma
+        n_trials:   trials per subject and set size
+        n_subjects: number of subjects (all with the same parameters)
+        seed:       seed for the draws
+    RETURNS
+        data:       DataFrame with an error column (degrees), indexed by
+                    (subject, setsize, trial)
+    '''
+    rng = np.random.default_rng(seed)
+    setsizes = list(tru_params.index)
+    g = np.tile(tru_params['g'].values, (n_subjects, 1))
+    sigma = np.tile(tru_params['sigma'].values, (n_subjects, 1))
+    errors = simulate_errors(g, sigma, n_trials, rng)
+    index = pd.MultiIndex.from_product([range(n_subjects), setsizes,
+        range(n_trials)], names=['subject', 'setsize', 'trial'])
+    return pd.DataFrame({'error': np.rad2deg(errors).ravel()}, index=index)
+
+
+def _em_step(cos, groups, n, g, kappa):
+    '''One EM iteration for every group.'''
+    n_groups = len(n)
+    # E step: probability each trial came from the von Mises,
+    # 1/(1 + odds of guessing), with the odds built per group first
+    log_odds = np.log(g) - np.log1p(-g) + np.log(special.i0e(kappa))
+    with np.errstate(over='ignore'):
+        w = 1 / (1 + np.exp(log_odds[groups] + kappa[groups]*(1 - cos)))
+
+    # M step
+    sum_w = np.bincount(groups, w, n_groups)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r = np.bincount(groups, w*cos, n_groups) / sum_w
+    new_kappa = np.where(sum_w > 0, a1inv(r), kappa)
+    new_g = np.clip(1 - sum_w/n, MIN_G, 1 - MIN_G)
+    return new_g, new_kappa
+
+
+def _loglik(cos, groups, n, g, kappa):
+    '''Summed log-likelihood of each group.'''
+    log_vm = np.log1p(-g) - np.log(special.i0e(kappa)) - LOG_2PI
+    log_guess = np.log(g) - LOG_2PI
+    return np.bincount(groups, np.logaddexp(log_vm[groups]
+        + kappa[groups]*(cos - 1), log_guess[groups]), len(n))
+
+
+def em(errors, groups, n_groups=None, g=.5, kappa=1., tol=1e-6,
+    max_iter=500):
+    '''Maximum likelihood g and kappa for many groups of trials at once.
+
+    Plain EM converges very slowly when the von Mises is broad (it can
+    hardly be told apart from guessing), so the EM steps are accelerated
+    with SQUAREM (Varadhan & Roland, 2008): each iteration takes two EM
+    steps, extrapolates along them and takes one more EM step from
+    there, falling back on the second EM step for any group where that
+    lowered the likelihood. Groups that have converged are dropped, so
+    later iterations only pass over the trials of the slow groups.
+    ARGS
+        errors:     errors (radians), array (n_trials,)
+        groups:     group (eg, subject x set size) of each trial, ints
+                    from 0 to n_groups-1
+        n_groups:   number of groups (default: max(groups)+1)
+        g, kappa:   starting values, scalars or (n_groups,)
+        tol:        a group has converged once its g changes by less than
+                    tol, and its kappa by less than tol relative to its size
+        max_iter:   most (accelerated) iterations
+    RETURNS
+        fit:        dict of arrays (n_groups,): g, kappa, sigma (degrees),
+                    loglik, n (trials), n_iter and converged
+    '''
+    errors = np.asarray(errors, dtype=float)
+    groups = np.asarray(groups)
+    if n_groups is None:
+        n_groups = groups.max() + 1
+    n = np.bincount(groups, minlength=n_groups).astype(float)
+    g = np.full(n_groups, g, dtype=float)
+    kappa = np.full(n_groups, kappa, dtype=float)
+    n_iter = np.zeros(n_groups, dtype=int)
+    converged = n == 0
+
+    # trials of the groups still being fitted
+    cos, active = np.cos(errors), groups
+    loglik = _loglik(cos, active, n, g, kappa)
+
+    def step(g, kappa):
+        return _em_step(cos, active, n, g, kappa)
+
+    for it in range(max_iter):
+        g1, kappa1 = step(g, kappa)
+        g2, kappa2 = step(g1, kappa1)
+        # SQUAREM extrapolation, separately for each group
+        rg, rk = g1 - g, kappa1 - kappa
+        vg, vk = g2 - 2*g1 + g, kappa2 - 2*kappa1 + kappa
+        with np.errstate(divide='ignore', invalid='ignore'):
+            alpha = -np.sqrt(rg**2 + rk**2) / np.sqrt(vg**2 + vk**2)
+        alpha = np.where(np.isfinite(alpha), np.minimum(alpha, -1), -1)
+        g3 = np.clip(g - 2*alpha*rg + alpha**2*vg, MIN_G, 1 - MIN_G)
+        kappa3 = np.maximum(kappa - 2*alpha*rk + alpha**2*vk, 0)
+        g3, kappa3 = step(g3, kappa3)
+        loglik3 = _loglik(cos, active, n, g3, kappa3)
+        # EM never lowers the likelihood, so nor should the extrapolation
+        worse = ~(loglik3 >= loglik)
+        new_g = np.where(worse, g2, g3)
+        new_kappa = np.where(worse, kappa2, kappa3)
+        if np.any(worse & ~converged):
+            loglik3[worse] = _loglik(cos, active, n, new_g, new_kappa)[worse]
+
+        # only the groups still being fitted move
+        moving = ~converged
+        change = np.maximum(np.abs(new_g - g),
+            np.abs(new_kappa - kappa) / np.maximum(kappa, 1))
+        g = np.where(moving, new_g, g)
+        kappa = np.where(moving, new_kappa, kappa)
+        loglik = np.where(moving, loglik3, loglik)
+        n_iter += moving
+        converged = converged | (change < tol)
+
+        if np.all(converged):
+            break
+        if np.any(converged != ~moving):
+            keep = ~converged[active]
+            cos, active = cos[keep], active[keep]
+
+    return dict(g=g, kappa=kappa, sigma=kappa2sd(kappa), loglik=loglik, n=n,
+        n_iter=n_iter, converged=converged)
+
+
+def fit_em(data, by=('subject', 'setsize'), **kwargs):
+    '''Fit g and sigma to every group of trials in a DataFrame.
+    ARGS
+        data:       DataFrame with an error column (degrees), and the
+                    grouping variables as index levels or columns
+        by:         the grouping variables
+        kwargs:     passed to em (eg, tol)
+    RETURNS
+        fits:       DataFrame indexed by the groups, with columns g,
+                    sigma, kappa, loglik and n
+    '''
+    by = [name for name in by if name in data.index.names
+        or name in data.columns]
+    keys = data.reset_index()[by]
+    codes, uniques = pd.MultiIndex.from_frame(keys).factorize()
+    fit = em(np.deg2rad(data['error'].values), codes, len(uniques), **kwargs)
+    return pd.DataFrame(dict((name, fit[name])
+        for name in ('g', 'sigma', 'kappa', 'loglik', 'n')),
+        index=pd.MultiIndex.from_tuples(uniques, names=by))
+
+
+if __name__ == '__main__':
+    import time
+
+    # true parameters from the notebook
+    tru_params = pd.DataFrame.from_dict({
+        3: dict(g=.01, sigma=40),
+        6: dict(g=.30, sigma=80)
+    }, orient='index')
+
+    t0 = time.time()
+    data = simulate(tru_params, n_trials=5000, n_subjects=100, seed=1)
+    t1 = time.time()
+    fits = fit_em(data)
+    t2 = time.time()
+
+    print('{} trials: simulated in {:.2f} s, fitted in {:.2f} s'.format(
+        len(data), t1 - t0, t2 - t1))
+    print('mean estimates over subjects:')
+    print(fits.groupby(level='setsize')[['g', 'sigma']].mean().round(3))
+    print('true:')
+    print(tru_params)
@@ -0,0 +1,372 @@
+'''
+Chapter 8 - MCMC for the JAGS models, without JAGS
+
+The notebooks in ch08 and ch09 run their models through R and rjags.
+This is a sampler backend for the same models in Python. Every chain
+(and, in the hierarchical models of ch09, every subject) is a slot in
+one array, and each parameter is updated by either
+
+    - a Gibbs step, drawing from its full conditional distribution,
+      where the model is conjugate (see ch09/hierarchical.py), or
+    - a random-walk Metropolis step otherwise, proposing a new value
+      for every chain and subject at once and accepting each of them
+      separately (the proposal sd is adapted during burn-in, like
+      JAGS's adaptation phase)
+
+so the number of numpy operations per iteration doesn't depend on the
+number of chains or subjects. The interface follows rjags, and takes
+the same data lists (as dicts) that the notebooks pass to jags.model:
+
+    >>> sdtj = jags_model('sdt_model.j', data=dict(h=60, f=11,
+    ...     sigtrials=100, noistrials=100), n_chains=4)
+    >>> sdtj.update(1000)                   # burn-in
+    >>> samples = sdtj.coda_samples(['d', 'b', 'phih', 'phif'], 5000)
+    >>> samples['d'].shape                  # (n_chains, n_iter)
+
+This file has the models of ch08 (sdt_model.j, 1ht.j, memMod.j and
+mymodel.j); the hierarchical models of ch09 are in ch09/hierarchical.py.
+
+Running...
+$ python gibbs.py
+
+...will run the signal detection example and print posterior summaries.
+'''
+
+from __future__ import division
+import os
+import sys
+from collections import OrderedDict
+
+import numpy as np
+from scipy import special
+
+# target acceptance rate from the Metropolis sampler in ch07
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    os.pardir, 'ch07'))
+from metropolis import TARGET_ACCEPT_1D
+
+
+ADAPT_INTERVAL = 50
+LOG_2PI = np.log(2*np.pi)
+
+
+## log densities (up to constants that don't depend on the parameters)
+
+def norm_logpdf(x, mu, tau):
+    '''dnorm(mu, tau) in JAGS, with tau the precision.'''
+    return .5*np.log(tau) - .5*tau*(x - mu)**2 - .5*LOG_2PI
+
+
+def binom_loglik(k, n, p):
+    '''dbin(p, n) for counts k, -inf outside 0 <= p <= 1.'''
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where((p < 0) | (p > 1), -np.inf,
+            special.xlogy(k, p) + special.xlog1py(n - k, -p))
+
+
+def binom_loglik_phi(k, n, x):
+    '''dbin(phi(x), n) for counts k, in log space on both sides.'''
+    return k*special.log_ndtr(x) + (n - k)*special.log_ndtr(-x)
+
+
+def uniform_support(x, lower, upper):
+    '''0 inside [lower, upper] and -inf outside (dunif, or dbeta(1,1)).'''
+    return np.where((x >= lower) & (x <= upper), 0., -np.inf)
+
+
+def truncnorm(mean, sd, lower, upper, rng):
+    '''Draws from normals truncated to [lower, upper], by inverting the
+    cdf (on whichever side of the mean the interval is further from).'''
+    mean, sd = np.broadcast_arrays(mean, sd)
+    a = (lower - mean)/sd
+    b = (upper - mean)/sd
+    # in the upper tail, sample -x on (-b, -a) instead
+    flip = a > 0
+    a, b = np.where(flip, -b, a), np.where(flip, -a, b)
+    lo, hi = special.ndtr(a), special.ndtr(b)
+    z = special.ndtri(lo + rng.random(mean.shape)*(hi - lo))
+    z = np.clip(z, a, b)
+    return mean + sd*np.where(flip, -z, z)
+
+
+class GibbsModel(object):
+    '''A model sampled by Gibbs and Metropolis steps, for many chains.
+
+    Subclasses give
+        params:             names of the stochastic parameters
+        default_inits():    dict of starting values, each an array
+                            (n_chains,) + the parameter's shape
+        sweep():            one iteration, updating self.state
+        derived():          dict of deterministic nodes (eg, phih)
+
+    ARGS
+        data:       dict of data, as passed to jags.model
+        inits:      dict of starting values used for every chain, or a
+                    list of dicts (one per chain); anything missing gets
+                    a default
+        n_chains:   number of chains
+        seed:       seed for the sampler
+    '''
+
+    params = ()
+
+    def __init__(self, data, inits=None, n_chains=4, seed=None):
+        self.data = dict((key, np.asarray(value, dtype=float))
+            for key, value in data.items())
+        self.n_chains = n_chains
+        self.rng = np.random.default_rng(seed)
+        self.state = self.default_inits()
+        if inits is not None:
+            if isinstance(inits, dict):
+                inits = [inits]*n_chains
+            for chain, init in enumerate(inits):
+                for name, value in init.items():
+                    self.state[name][chain] = value
+        self.tune = {}
+        self._window = {}
+        self.adapting = False
+        self.n_iter = 0
+
+    def default_inits(self):
+        raise NotImplementedError
+
+    def sweep(self):
+        raise NotImplementedError
+
+    def derived(self):
+        return {}
+
+    def _shape(self, *shape):
+        return (self.n_chains,) + tuple(int(s) for s in shape)
+
+    def metropolis(self, name, logp, sd=.1):
+        '''Random-walk Metropolis step for every element of a parameter.
+        ARGS
+            name:   the parameter
+            logp:   log of its full conditional (up to a constant), for a
+                    candidate value of the whole array, evaluated
+                    element by element (so each element's conditional
+                    must only depend on that element)
+            sd:     initial proposal sd
+        '''
+        x = self.state[name]
+        tune = self.tune.setdefault(name, np.full(x.shape, float(sd)))
+        prop = x + tune*self.rng.standard_normal(x.shape)
+        with np.errstate(invalid='ignore'):
+            accept = np.log(self.rng.random(x.shape)) < logp(prop) - logp(x)
+        self.state[name] = np.where(accept, prop, x)
+
+        if self.adapting:
+            window = self._window.setdefault(name, np.zeros(x.shape))
+            window += accept
+            if (self.n_iter + 1) % ADAPT_INTERVAL == 0:
+                tune *= np.exp(window/ADAPT_INTERVAL - TARGET_ACCEPT_1D)
+                window[:] = 0
+
+    def _run(self, n_iter, record=None):
+        for i in range(n_iter):
+            self.sweep()
+            if record is not None:
+                record(i)
+            self.n_iter += 1
+
+    def update(self, n_iter):
+        '''Burn-in: run n_iter iterations (adapting the proposals) and
+        keep nothing.'''
+        self.adapting = True
+        try:
+            self._run(n_iter)
+        finally:
+            self.adapting = False
+
+    def coda_samples(self, variables, n_iter, thin=1):
+        '''Run n_iter iterations and keep every thin-th value of variables.
+        RETURNS
+            samples:    dict of variable: array (n_chains, n_iter//thin)
+                        + the variable's shape
+        '''
+        current = self._values(variables)
+        samples = OrderedDict((name, np.empty((self.n_chains, n_iter//thin)
+            + current[name].shape[1:])) for name in variables)
+
+        def record(i):
+            if (i + 1) % thin == 0:
+                values = self._values(variables)
+                for name in variables:
+                    samples[name][:, i//thin] = values[name]
+
+        self._run(n_iter, record)
+        return samples
+
+    def _values(self, variables):
+        values = dict(self.state)
+        if any(name not in values for name in variables):
+            values.update(self.derived())
+        missing = [name for name in variables if name not in values]
+        if missing:
+            raise KeyError('not in the model: {}'.format(', '.join(missing)))
+        return values
+
+
+## the models of ch08
+
+class SDT(GibbsModel):
+    '''sdt_model.j: signal detection with d ~ dnorm(1,1), b ~ dnorm(0,1).'''
+
+    params = ('d', 'b')
+
+    def default_inits(self):
+        return dict(d=np.ones(self.n_chains), b=np.zeros(self.n_chains))
+
+    def _loglik(self, d, b):
+        data = self.data
+        return binom_loglik_phi(data['h'], data['sigtrials'], d/2 - b) \
+            + binom_loglik_phi(data['f'], data['noistrials'], -d/2 - b)
+
+    def sweep(self):
+        s = self.state
+        self.metropolis('d', lambda d: norm_logpdf(d, 1, 1)
+            + self._loglik(d, s['b']))
+        self.metropolis('b', lambda b: norm_logpdf(b, 0, 1)
+            + self._loglik(s['d'], b))
+
+    def derived(self):
+        d, b = self.state['d'], self.state['b']
+        return dict(phih=special.ndtr(d/2 - b), phif=special.ndtr(-d/2 - b))
+
+
+class OneHT(GibbsModel):
+    '''1ht.j: one-high-threshold model with th1, th2 ~ dbeta(1,1).'''
+
+    params = ('th1', 'th2')
+
+    def default_inits(self):
+        return dict(th1=self.rng.uniform(.25, .75, self.n_chains),
+            th2=self.rng.uniform(.25, .75, self.n_chains))
+
+    def _loglik(self, th1, th2):
+        data = self.data
+        return binom_loglik(data['h'], data['sigtrials'], th1 + (1-th1)*th2) \
+            + binom_loglik(data['f'], data['noistrials'], th2)
+
+    def sweep(self):
+        s = self.state
+        self.metropolis('th1', lambda th1: uniform_support(th1, 0, 1)
+            + self._loglik(th1, s['th2']))
+        self.metropolis('th2', lambda th2: uniform_support(th2, 0, 1)
+            + self._loglik(s['th1'], th2))
+
+    def derived(self):
+        th1, th2 = self.state['th1'], self.state['th2']
+        return dict(predh=th1 + (1 - th1)*th2, predf=th2)
+
+
+class MemMod(GibbsModel):
+    '''memMod.j: the witness multinomial processing tree, with
+    p, q, c ~ dbeta(1,1).'''
+
+    params = ('p', 'q', 'c')
+    conditions = ('consistent', 'inconsistent', 'neutral')
+
+    def default_inits(self):
+        return dict((name, self.rng.uniform(.25, .75, self.n_chains))
+            for name in self.params)
+
+    @staticmethod
+    def predprob(p, q, c):
+        '''Predicted probabilities, (..., 3 conditions, 4 categories).'''
+        p, q, c = [np.asarray(x, dtype=float)[..., None] for x in (p, q, c)]
+        return np.stack([
+            np.concatenate([(1 + p + q - p*q + 4*p*c)/6,
+                (1 + p + q - p*q - 2*p*c)/3, (1 - p - q + p*q)/6,
+                (1 - p - q + p*q)/3], axis=-1),
+            np.concatenate([(1 + p - q + p*q + 4*p*c)/6,
+                (1 + p - q + p*q - 2*p*c)/3, (1 - p + q - p*q)/6,
+                (1 - p + q - p*q)/3], axis=-1),
+            np.concatenate([(1 + p + 4*p*c)/6, (1 + p - 2*p*c)/3,
+                (1 - p)/6, (1 - p)/3], axis=-1),
+            ], axis=-2)
+
+    def _logp(self, name):
+        counts = np.array([self.data[cond] for cond in self.conditions])
+
+        def logp(x):
+            values = dict(self.state)
+            values[name] = x
+            with np.errstate(divide='ignore', invalid='ignore'):
+                lnL = np.sum(special.xlogy(counts, self.predprob(
+                    values['p'], values['q'], values['c'])), axis=(-2, -1))
+            return uniform_support(x, 0, 1) + lnL
+        return logp
+
+    def sweep(self):
+        for name in self.params:
+            self.metropolis(name, self._logp(name))
+
+    def derived(self):
+        s = self.state
+        return dict(predprob=self.predprob(s['p'], s['q'], s['c']))
+
+
+class NormalModel(GibbsModel):
+    '''mymodel.j: xx ~ dnorm(mu, tau), mu ~ dunif(-100,100),
+    sigma ~ dunif(0,100), tau = sigma^-2.'''
+
+    params = ('mu', 'sigma')
+
+    def default_inits(self):
+        xx = self.data['xx']
+        return dict(mu=np.full(self.n_chains, np.mean(xx)),
+            sigma=np.full(self.n_chains, np.std(xx) + 1e-3))
+
+    def sweep(self):
+        xx, s = self.data['xx'], self.state
+        n = len(xx)
+        # mu: Gibbs, the normal likelihood truncated by the uniform prior
+        s['mu'] = truncnorm(np.mean(xx), s['sigma']/np.sqrt(n), -100, 100,
+            self.rng)
+        ss = np.sum((xx[:, None] - s['mu'])**2, axis=0)
+        self.metropolis('sigma', lambda sigma: uniform_support(sigma, 0, 100)
+            - n*np.log(np.abs(sigma)) - ss/(2*sigma**2), sd=.1*np.std(xx))
+
+    def derived(self):
+        return dict(tau=self.state['sigma']**-2.)
+
+
+MODELS = OrderedDict([
+    ('sdt_model.j', SDT),
+    ('1ht.j', OneHT),
+    ('memMod.j', MemMod),
+    ('mymodel.j', NormalModel),
+    ])
+
+
+def jags_model(file, data, inits=None, n_chains=4, seed=None):
+    '''The Python version of jags.model(file, data, inits, n.chains).
+    ARGS
+        file:       name of the .j file of a model in MODELS (or in
+                    ch09/hierarchical.py, once that has been imported)
+        data, inits, n_chains, seed:
+                    as for GibbsModel
+    '''
+    name = os.path.basename(file)
+    if name not in MODELS:
+        raise ValueError('no sampler for {}'.format(name))
+    return MODELS[name](data, inits=inits, n_chains=n_chains, seed=seed)
+
+
+if __name__ == '__main__':
+
+    # Signal Detection Example.ipynb
+    data = dict(h=60, f=11, sigtrials=100, noistrials=100)
+    rng = np.random.default_rng(1)
+    inits = [dict(d=rng.normal(0, .1), b=rng.normal(0, .1))
+        for chain in range(4)]
+
+    sdtj = jags_model('sdt_model.j', data, inits=inits, n_chains=4, seed=2)
+    sdtj.update(1000)
+    samples = sdtj.coda_samples(['d', 'b', 'phih', 'phif'], 5000)
+
+    for name, x in samples.items():
+        print('{:>5}: mean {:.3f}, sd {:.3f}, 95% interval [{:.3f}, {:.3f}]'
+            .format(name, x.mean(), x.std(), *np.quantile(x, [.025, .975])))
@@ -0,0 +1,326 @@
+'''
+Chapter 9 - Hierarchical models, sampled without JAGS
+
+Samplers for the JAGS models of this chapter, on the backend in
+ch08/gibbs.py:
+
+    - hsdt.j:   hierarchical signal detection
+    - hef.j:    hierarchical exponential forgetting
+    - hpf.j:    hierarchical power forgetting
+    - hmic.j:   hierarchical intertemporal choice
+
+The subjects' parameters are updated by Metropolis steps for all chains
+and subjects at once (given the group-level parameters, the subjects are
+independent). The group-level parameters are drawn from their full
+conditionals where these are conjugate: a normal (or, under a dunif
+prior, a truncated normal) for a group mean, and a gamma for a group
+precision with a dgamma prior. hmic.j truncates the subjects' parameters
+at 0, which makes its group level non-conjugate, so it uses Metropolis
+steps there too.
+
+Importing this module adds the models to gibbs.MODELS, so
+
+    >>> sdtjh = jags_model('hsdt.j', data=dict(epsilon=.001, h=h, f=f,
+    ...     n=n, sigtrials=100, noistrials=100), inits=oneinit, n_chains=4)
+    >>> sdtjh.update(1000)
+    >>> samples = sdtjh.coda_samples(['d', 'b', 'mud', 'mub'], 5000)
+
+takes the same data as the notebook. hsdt.j itself had the false alarms
+depending on phih instead of phif; that is fixed in the .j file too.
+
+Running...
+$ python hierarchical.py
+
+...will run the hierarchical SDT example from the notebook, print the
+posterior means and R-hats, time it with 10 and with 300 subjects, and
+check that hef.j keeps theta inside [0, 1] when recall is perfect.
+'''
+
+from __future__ import division
+import os
+import sys
+from collections import OrderedDict
+
+import numpy as np
+from scipy import special
+
+# the sampler backend lives in ch08
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    os.pardir, 'ch08'))
+from gibbs import (GibbsModel, MODELS, jags_model, norm_logpdf,
+    binom_loglik, binom_loglik_phi, uniform_support, truncnorm)
+
+
+## conjugate updates for the group level
+
+def gibbs_normal_mean(x, tau, prior_mu, prior_tau, rng):
+    '''Draw a group mean given subjects' values x ~ dnorm(mean, tau) and
+    the prior mean ~ dnorm(prior_mu, prior_tau).
+    ARGS
+        x:      (n_chains, n_subjects)
+        tau:    (n_chains,) group precision
+    RETURNS
+        mean:   (n_chains,)
+    '''
+    post_tau = prior_tau + x.shape[-1]*tau
+    post_mu = (prior_tau*prior_mu + tau*np.sum(x, axis=-1)) / post_tau
+    return post_mu + rng.standard_normal(post_mu.shape)/np.sqrt(post_tau)
+
+
+def gibbs_uniform_mean(x, tau, lower, upper, rng):
+    '''As gibbs_normal_mean, with the prior mean ~ dunif(lower, upper).'''
+    n = x.shape[-1]
+    return truncnorm(np.mean(x, axis=-1), 1/np.sqrt(n*tau), lower, upper,
+        rng)
+
+
+def gibbs_precision(x, mu, shape, rate, rng):
+    '''Draw a group precision given subjects' values x ~ dnorm(mu, tau)
+    and the prior tau ~ dgamma(shape, rate).
+    ARGS
+        x:      (n_chains, n_subjects)
+        mu:     (n_chains,) group mean
+    RETURNS
+        tau:    (n_chains,)
+    '''
+    post_shape = shape + x.shape[-1]/2
+    post_rate = rate + np.sum((x - mu[:, None])**2, axis=-1)/2
+    return rng.gamma(post_shape, 1/post_rate)
+
+
+## the models
+
+class HSDT(GibbsModel):
+    '''hsdt.j: d[i] ~ dnorm(mud, taud), b[i] ~ dnorm(mub, taub), with
+    mud, mub ~ dnorm(0, epsilon) and taud, taub ~ dgamma(epsilon, epsilon).
+    '''
+
+    params = ('mud', 'mub', 'taud', 'taub', 'd', 'b')
+
+    def default_inits(self):
+        n = self.data['n']
+        return dict(mud=np.zeros(self.n_chains), mub=np.zeros(self.n_chains),
+            taud=np.ones(self.n_chains), taub=np.ones(self.n_chains),
+            d=np.zeros(self._shape(n)), b=np.zeros(self._shape(n)))
+
+    def _loglik(self, d, b):
+        data = self.data
+        return binom_loglik_phi(data['h'], data['sigtrials'], d/2 - b) \
+            + binom_loglik_phi(data['f'], data['noistrials'], -d/2 - b)
+
+    def sweep(self):
+        s, eps, rng = self.state, self.data['epsilon'], self.rng
+        self.metropolis('d', lambda d: norm_logpdf(d, s['mud'][:, None],
+            s['taud'][:, None]) + self._loglik(d, s['b']))
+        self.metropolis('b', lambda b: norm_logpdf(b, s['mub'][:, None],
+            s['taub'][:, None]) + self._loglik(s['d'], b))
+        s['mud'] = gibbs_normal_mean(s['d'], s['taud'], 0, eps, rng)
+        s['taud'] = gibbs_precision(s['d'], s['mud'], eps, eps, rng)
+        s['mub'] = gibbs_normal_mean(s['b'], s['taub'], 0, eps, rng)
+        s['taub'] = gibbs_precision(s['b'], s['mub'], eps, eps, rng)
+
+    def derived(self):
+        d, b = self.state['d'], self.state['b']
+        return dict(phih=special.ndtr(d/2 - b), phif=special.ndtr(-d/2 - b))
+
+
+class HEF(GibbsModel):
+    '''hef.j: theta[i,j] = a[i] + (1-a[i])*b[i]*exp(-alpha[i]*t[j]), with
+    each subject parameter ~ dnorm(mu, tau), mu ~ dunif(0,1) and
+    tau ~ dgamma(epsilon, epsilon).
+    '''
+
+    rate = 'alpha'
+    params = ('mualpha', 'taualpha', 'mua', 'taua', 'mub', 'taub',
+        'alpha', 'a', 'b')
+    # (hyper mean, hyper precision) of each subject-level parameter
+    groups = OrderedDict([('a', ('mua', 'taua')), ('b', ('mub', 'taub'))])
+
+    def __init__(self, *args, **kwargs):
+        self.groups = OrderedDict([(self.rate, ('mualpha', 'taualpha'))]
+            + list(self.groups.items()))
+        super(HEF, self).__init__(*args, **kwargs)
+
+    @staticmethod
+    def decay(rate, t):
+        return np.exp(-rate*t)
+
+    def default_inits(self):
+        ns = self.data['ns']
+        start = {self.rate: .2, 'a': .1, 'b': .9}
+        inits = {}
+        for name, (mu, tau) in self.groups.items():
+            x = start[name] + self.rng.uniform(-.05, .05, self._shape(ns))
+            inits[name] = x
+            inits[mu] = np.mean(x, axis=-1)
+            inits[tau] = np.full(self.n_chains, 10.)
+        return inits
+
+    def theta(self, values):
+        rate, a, b = [values[name][..., None]
+            for name in (self.rate, 'a', 'b')]
+        return a + (1 - a)*b*self.decay(rate, self.data['t'])
+
+    def _logp(self, name):
+        mu, tau = self.groups[name]
+        s = self.state
+
+        def logp(x):
+            values = dict(s)
+            values[name] = x
+            lnL = np.sum(binom_loglik(self.data['k'], self.data['n'],
+                self.theta(values)), axis=-1)
+            return norm_logpdf(x, s[mu][:, None], s[tau][:, None]) + lnL
+        return logp
+
+    def sweep(self):
+        s, eps, rng = self.state, self.data['epsilon'], self.rng
+        for name, (mu, tau) in self.groups.items():
+            self.metropolis(name, self._logp(name), sd=.05)
+        for name, (mu, tau) in self.groups.items():
+            s[mu] = gibbs_uniform_mean(s[name], s[tau], 0, 1, rng)
+            s[tau] = gibbs_precision(s[name], s[mu], eps, eps, rng)
+
+    def derived(self):
+        return dict(theta=self.theta(self.state))
+
+
+class HPF(HEF):
+    '''hpf.j: as hef.j, with theta[i,j] = a[i] + (1-a[i])*b[i]*(t[j]+1)^-beta[i]
+    (beta keeps the hyperparameters mualpha and taualpha, as in hpf.j).
+    '''
+
+    rate = 'beta'
+    params = ('mualpha', 'taualpha', 'mua', 'taua', 'mub', 'taub',
+        'beta', 'a', 'b')
+
+    @staticmethod
+    def decay(rate, t):
+        return (t + 1)**-rate
+
+
+class HMIC(GibbsModel):
+    '''hmic.j: hyperbolic discounting, with k[p] and alpha[p] normal
+    truncated at 0, and P[p,t] = phi((VB[p,t] - VA[p,t])/alpha[p]).
+    '''
+
+    params = ('groupkmu', 'groupksigma', 'groupALPHAmu', 'groupALPHAsigma',
+        'k', 'alpha')
+    # (group mean, group sd) of each subject-level parameter
+    groups = OrderedDict([('k', ('groupkmu', 'groupksigma')),
+        ('alpha', ('groupALPHAmu', 'groupALPHAsigma'))])
+
+    def default_inits(self):
+        nsubj = self.data['nsubj']
+        return dict(groupkmu=np.full(self.n_chains, .1),
+            groupksigma=np.full(self.n_chains, .1),
+            groupALPHAmu=np.ones(self.n_chains),
+            groupALPHAsigma=np.ones(self.n_chains),
+            k=self.rng.uniform(.05, .15, self._shape(nsubj)),
+            alpha=self.rng.uniform(.5, 1.5, self._shape(nsubj)))
+
+    def values(self, k, alpha):
+        data = self.data
+        VA = data['A']/(1 + k[..., None]*data['DA'])
+        VB = data['B']/(1 + k[..., None]*data['DB'])
+        return VA, VB, (VB - VA)/alpha[..., None]
+
+    def _truncated(self, x, mu, sigma):
+        '''log dnorm(mu, 1/sigma^2)T(0,), with its normalizing constant.'''
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(x > 0, norm_logpdf(x, mu, sigma**-2.), -np.inf) \
+                - special.log_ndtr(mu/sigma)
+
+    def _loglik(self, k, alpha):
+        x = self.values(k, alpha)[2]
+        return np.sum(binom_loglik_phi(self.data['R'], 1, x), axis=-1)
+
+    def _group_logp(self, name, which):
+        '''Full conditional of the group mean (which=0) or sd (which=1).'''
+        s = self.state
+        mu, sigma = self.groups[name]
+
+        def logp(x):
+            values = dict(s)
+            values[(mu, sigma)[which]] = x
+            if mu == 'groupkmu':
+                prior = norm_logpdf(values[mu], 0, 1/100) if which == 0 \
+                    else uniform_support(values[sigma], 0, 100)
+            else:
+                prior = uniform_support((values[mu], values[sigma])[which],
+                    0, 5)
+            return prior + np.sum(self._truncated(s[name],
+                values[mu][:, None], values[sigma][:, None]), axis=-1)
+        return logp
+
+    def sweep(self):
+        s = self.state
+        self.metropolis('k', lambda k: self._truncated(k,
+            s['groupkmu'][:, None], s['groupksigma'][:, None])
+            + self._loglik(k, s['alpha']), sd=.01)
+        self.metropolis('alpha', lambda alpha: self._truncated(alpha,
+            s['groupALPHAmu'][:, None], s['groupALPHAsigma'][:, None])
+            + self._loglik(s['k'], alpha))
+        for name, (mu, sigma) in self.groups.items():
+            self.metropolis(mu, self._group_logp(name, 0))
+            self.metropolis(sigma, self._group_logp(name, 1))
+
+    def derived(self):
+        VA, VB, x = self.values(self.state['k'], self.state['alpha'])
+        return dict(VA=VA, VB=VB, P=special.ndtr(x),
+            DB=np.broadcast_to(self.data['DB'], VB.shape))
+
+
+MODELS.update([
+    ('hsdt.j', HSDT),
+    ('hef.j', HEF),
+    ('hpf.j', HPF),
+    ('hmic.j', HMIC),
+    ])
+
+
+if __name__ == '__main__':
+    import time
+
+    # convergence diagnostics live in ch07
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+        os.pardir, 'ch07'))
+    from diagnostics import StreamingDiagnostics
+
+    def simulate(n, rng):
+        sigtrials = noistrials = 100
+        return dict(epsilon=.001, h=rng.binomial(sigtrials, .8, n),
+            f=rng.binomial(noistrials, .2, n), n=n, sigtrials=sigtrials,
+            noistrials=noistrials)
+
+    rng = np.random.default_rng(1)
+    for n in (10, 300):
+        data = simulate(n, rng)
+        oneinit = dict(mud=0, mub=0, taud=1, taub=1, d=np.zeros(n),
+            b=np.zeros(n))
+
+        t0 = time.time()
+        sdtjh = jags_model('hsdt.j', data, inits=oneinit, n_chains=4, seed=n)
+        sdtjh.update(1000)
+        samples = sdtjh.coda_samples(['d', 'b', 'mud', 'mub', 'taud', 'taub'],
+            5000)
+        print('{} subjects: {:.1f} s'.format(n, time.time() - t0))
+
+        for name in ('mud', 'mub', 'taud', 'taub'):
+            diag = StreamingDiagnostics(4)
+            diag.update(samples[name].T)
+            print('  {:>4}: mean {:.3f}, R-hat {:.3f}'.format(name,
+                samples[name].mean(), float(diag.rhat())))
+
+    # forgetting with perfect recall at lag 0 for some subjects (as in the
+    # notebook's simulations): theta must stay inside [0, 1]
+    t = np.array([0, 1, 2, 4, 7, 12, 21, 35, 59, 99.])
+    k = rng.binomial(20, .2 + .8*.95*np.exp(-.1*t), (20, len(t)))
+    k[:8, 0] = 20
+    hef = jags_model('hef.j', dict(epsilon=.001, k=k, n=20, t=t, ns=20,
+        nt=len(t)), n_chains=4, seed=2)
+    hef.update(1000)
+    theta = hef.coda_samples(['theta'], 1000)['theta']
+    assert np.all((theta >= 0) & (theta <= 1)), 'theta left [0, 1]'
+    print('hef.j with k == n: theta in [{:.3f}, {:.3f}]'.format(theta.min(),
+        theta.max()))
@@ -61,7 +61,7 @@ mp = 0.9  # momentum parameter
 # construct input and output patterns (ie, make the stims?)
 
 inputs = np.empty([n_patterns,n])
-outputs = np.empty([n_patterns,n])
+outputs = np.empty([n_patterns,m])
 
 i = 0
 for train_set in range(n_sets):
@@ -69,7 +69,7 @@ for train_set in range(n_sets):
 
     # initialize stim vectors with 0s and 1s
     stem = np.random.randint(2,size=n_stem)
-    train_out = np.random.randint(2,size=n)
+    train_out = np.random.randint(2,size=m)
 
     # regular
     '''The regular items all share the same output,
@@ -90,7 +90,7 @@ for train_set in range(n_sets):
         non_stem = np.random.randint(2,size=n_other)
         inp_patt = np.append(stem,non_stem)
         # make a new out stim bc irregular is inconsistent??
-        train_out = np.random.randint(2,size=n)
+        train_out = np.random.randint(2,size=m)
 
         inputs[i,:] = inp_patt
         outputs[i,:] = train_out
@@ -126,7 +126,9 @@ to_train = range(n_patterns)
 
 # some empty stuff to hold results
 error = np.zeros(n_train)
-patt_err = np.zeros([n_patterns,n_train*n_patterns])
+# error on each sweep, for the pattern trained (nan for the others);
+# backprop.py keeps a compact ErrorLog instead
+patt_err = np.full([n_patterns,n_train], np.nan)
 patts = np.zeros(n_train)
 classes = np.zeros(n_train)
 
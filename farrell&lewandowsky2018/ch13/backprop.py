@@ -0,0 +1,246 @@
+'''
+13.2 - Backpropagation: regular and irregular mappings, batched
+
+13-2.py (listing 13.6) trains one network on one randomly chosen
+pattern per sweep, with matrix-vector products, and logs the error of
+each sweep into a n_patterns x (n_train*n_patterns) array that is
+almost all zeros. Here:
+
+    - a stack of independent networks (Wih, Who, Bh and Bo with a
+      leading network axis, each with its own learning rate eta and
+      momentum mp) is trained at once
+    - each update is on a batch of patterns: one (mode='sgd', as in
+      the listing), batch_size random ones ('minibatch'), or all of
+      them ('batch'), and the forward and backward passes are
+      matrix-matrix products over the batch (and the stack)
+    - errors go to an ErrorLog: a ring buffer of the last log_size
+      updates, and the latest error of each pattern
+
+    >>> inputs, outputs, irregular = make_patterns(seed=1)
+    >>> fit = train(inputs, outputs, eta=[.05, .1, .2], n_train=6000)
+    >>> pattern_rmsd(fit['net'], inputs, outputs)   # (3, n_patterns)
+
+The weight changes of a batch are averaged over its patterns, so a
+batch of one gives exactly the listing's updates.
+
+Running...
+$ python backprop.py
+
+...will train many networks in each mode and compare the errors on the
+regular and irregular patterns.
+'''
+
+from __future__ import division
+
+import numpy as np
+from scipy.special import expit
+
+from stimuli import (N_STEM, N_OTHER, N_OUTPUT, N_REG, N_IRREG, N_SETS,
+    build_stimuli)
+
+
+# listing 13.6
+N_HIDDEN = 15
+N_TRAIN = 6000
+ETA = .1
+MP = .9
+BIAS = .01
+
+LOG_SIZE = 1000
+MODES = ('sgd', 'minibatch', 'batch')
+
+
+def make_patterns(n_stem=N_STEM, n_other=N_OTHER, m=N_OUTPUT, n_reg=N_REG,
+    n_irreg=N_IRREG, n_sets=N_SETS, shape=(), seed=None):
+    '''Input and output patterns of listing 13.6, as floats (see
+    stimuli.build_stimuli, which takes the same arguments).
+    RETURNS
+        inputs:             array (..., n_patterns, n_stem+n_other)
+        outputs:            array (..., n_patterns, m)
+        irregular:          whether each pattern is irregular, (n_patterns,)
+    '''
+    stims = build_stimuli(n_stem, n_other, m, n_reg, n_irreg, n_sets, shape,
+        seed)
+    inputs, outputs = stims.as_float(float)
+    return inputs, outputs, stims.irregular
+
+
+def init_net(n_nets, n, h=N_HIDDEN, m=N_OUTPUT, init_sd=ETA, rng=None):
+    '''Weights and biases of a stack of n_nets networks (as in 13-2.py,
+    weights are normal with sd init_sd, and biases .01).
+    RETURNS
+        net:    dict of Wih (n_nets, h, n), Who (n_nets, m, h),
+                Bh (n_nets, h) and Bo (n_nets, m)
+    '''
+    rng = np.random.default_rng() if rng is None else rng
+    init_sd = np.reshape(init_sd, (-1, 1, 1))
+    return dict(Wih=rng.normal(size=(n_nets, h, n)) * init_sd,
+        Who=rng.normal(size=(n_nets, m, h)) * init_sd,
+        Bh=np.full((n_nets, h), BIAS), Bo=np.full((n_nets, m), BIAS))
+
+
+def forward(net, X):
+    '''Activations of the hidden and output layers.
+    ARGS
+        net:    as returned by init_net
+        X:      cues, (n_nets, batch, n), or (batch, n) for the same
+                cues to every network
+    RETURNS
+        hidden: array (n_nets, batch, h)
+        output: array (n_nets, batch, m)
+    '''
+    hidden = expit(np.matmul(X, np.swapaxes(net['Wih'], -1, -2))
+        + net['Bh'][:, None])
+    output = expit(np.matmul(hidden, np.swapaxes(net['Who'], -1, -2))
+        + net['Bo'][:, None])
+    return hidden, output
+
+
+def rmsd(target, output):
+    '''RMSD between each output pattern and its target.'''
+    return np.sqrt(np.mean((target - output)**2, axis=-1))
+
+
+def pattern_rmsd(net, inputs, outputs):
+    '''Error of every network on every pattern, (n_nets, n_patterns).'''
+    return rmsd(outputs, forward(net, inputs)[1])
+
+
+class ErrorLog(object):
+    '''Compact record of training errors, replacing patt_err.
+
+    Keeps the mean error over the batch of each of the last `size`
+    updates (a ring buffer), and the latest error of each pattern with
+    the update it was seen on.
+    '''
+
+    def __init__(self, n_nets, n_patterns, size=LOG_SIZE):
+        self.size = size
+        self.n_updates = 0
+        self._sweep = np.full(size, -1)
+        self._error = np.full((n_nets, size), np.nan)
+        self.pattern_error = np.full((n_nets, n_patterns), np.nan)
+        self.pattern_sweep = np.full((n_nets, n_patterns), -1)
+
+    def record(self, idx, err):
+        '''Log one update.
+        ARGS
+            idx:    patterns trained, (n_nets, batch) or (batch,)
+            err:    their errors, (n_nets, batch)
+        '''
+        slot = self.n_updates % self.size
+        self._sweep[slot] = self.n_updates
+        self._error[:, slot] = err.mean(axis=-1)
+        rows = np.arange(err.shape[0])[:, None]
+        idx = np.broadcast_to(idx, err.shape)
+        self.pattern_error[rows, idx] = err
+        self.pattern_sweep[rows, idx] = self.n_updates
+        self.n_updates += 1
+
+    def history(self):
+        '''The logged updates, oldest first.
+        RETURNS
+            sweeps: update numbers, (n_logged,)
+            error:  mean error of each network, (n_nets, n_logged)
+        '''
+        order = np.argsort(self._sweep)
+        order = order[self._sweep[order] >= 0]
+        return self._sweep[order], self._error[:, order]
+
+
+def train(inputs, outputs, n_train=N_TRAIN, eta=ETA, mp=MP, h=N_HIDDEN,
+    mode='sgd', batch_size=None, n_nets=None, init_sd=None, seed=None,
+    log_size=LOG_SIZE, log=None):
+    '''Train a stack of networks with backpropagation and momentum.
+    ARGS
+        inputs:     cues, (n_patterns, n) or one set per network
+                    (n_nets, n_patterns, n)
+        outputs:    targets, (n_patterns, m) or (n_nets, n_patterns, m)
+        n_train:    number of updates
+        eta, mp:    learning rate and momentum, scalars or one per network
+        h:          hidden units
+        mode:       'sgd' (one random pattern per update), 'minibatch'
+                    (batch_size random patterns) or 'batch' (all of them)
+        batch_size: for 'minibatch' (default: a fifth of the patterns)
+        n_nets:     number of networks (default: from inputs, eta and mp)
+        init_sd:    sd of the initial weights (default: eta, as in 13-2.py)
+        seed:       seed for the weights and the choice of patterns
+        log_size:   updates kept in the ErrorLog
+        log:        where to record errors instead (anything with a
+                    record(idx, err) method, like ErrorLog)
+    RETURNS
+        fit:        dict of the trained net (see init_net) and its log
+    '''
+    if mode not in MODES:
+        raise ValueError('unknown mode: {}'.format(mode))
+    rng = np.random.default_rng(seed)
+    inputs = np.asarray(inputs, dtype=float)
+    outputs = np.asarray(outputs, dtype=float)
+    shared = inputs.ndim == 2
+    if n_nets is None:
+        n_nets = max(1 if shared else len(inputs), np.size(eta), np.size(mp))
+    n_patterns, n = inputs.shape[-2:]
+    m = outputs.shape[-1]
+    eta = np.broadcast_to(eta, (n_nets,)).astype(float)
+    mp = np.broadcast_to(mp, (n_nets,)).astype(float)
+    if batch_size is None:
+        batch_size = {'sgd': 1, 'minibatch': max(1, n_patterns // 5),
+            'batch': n_patterns}[mode]
+
+    net = init_net(n_nets, n, h, m, eta if init_sd is None else init_sd, rng)
+    delta_Wih = np.zeros_like(net['Wih'])
+    delta_Who = np.zeros_like(net['Who'])
+    if log is None:
+        log = ErrorLog(n_nets, n_patterns, log_size)
+    nets = np.arange(n_nets)[:, None]
+    eta3 = eta[:, None, None]
+    mp3 = mp[:, None, None]
+
+    for sweep in range(n_train):
+        ## which patterns to train?
+        if mode == 'batch':
+            idx = np.arange(n_patterns)
+            X, T = inputs, outputs
+        else:
+            idx = rng.integers(n_patterns, size=(n_nets, batch_size))
+            X = inputs[idx] if shared else inputs[nets, idx]
+            T = outputs[idx] if shared else outputs[nets, idx]
+
+        ## cue the networks
+        hidden, output = forward(net, X)
+        log.record(idx, rmsd(T, output))
+
+        ## backpropagation, averaged over the batch
+        delta_output = (T - output) * output * (1 - output)
+        delta_hidden = np.matmul(delta_output, net['Who']) \
+            * hidden * (1 - hidden)
+        delta_Who = eta3 * np.matmul(np.swapaxes(delta_output, -1, -2),
+            hidden) / batch_size + mp3 * delta_Who
+        delta_Wih = eta3 * np.matmul(np.swapaxes(delta_hidden, -1, -2),
+            np.broadcast_to(X, hidden.shape[:-1] + (n,))) / batch_size \
+            + mp3 * delta_Wih
+
+        ## update the weights and biases
+        net['Who'] += delta_Who
+        net['Wih'] += delta_Wih
+        net['Bo'] += eta[:, None] * delta_output.mean(axis=1)
+        net['Bh'] += eta[:, None] * delta_hidden.mean(axis=1)
+
+    return dict(net=net, log=log)
+
+
+if __name__ == '__main__':
+    import time
+
+    n_nets = 200
+    inputs, outputs, irregular = make_patterns(shape=(n_nets,), seed=1)
+    settings = [('sgd', N_TRAIN), ('minibatch', N_TRAIN // 5),
+        ('batch', N_TRAIN // 5)]
+    for mode, n_train in settings:
+        t0 = time.time()
+        fit = train(inputs, outputs, n_train=n_train, mode=mode, seed=2)
+        err = pattern_rmsd(fit['net'], inputs, outputs)
+        print('{:9s} {} networks x {} updates: {:.2f} s; '
+            'rmsd regular {:.3f}, irregular {:.3f}'.format(mode, n_nets,
+            n_train, time.time() - t0, err[:, ~irregular].mean(),
+            err[:, irregular].mean()))
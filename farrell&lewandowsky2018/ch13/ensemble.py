@@ -0,0 +1,147 @@
+'''
+13.2 - Ensembles of backpropagation networks: average learning curves
+
+The learning curves of the regular and irregular items from one network
+(13-2.py, 13-2-Backpropagation.ipynb) are noisy. ensemble() trains R
+replicas, each with its own patterns (from make_patterns) and initial
+weights, as stacked weight tensors (R, h, n) and (R, m, h) with
+backprop.train, and builds the learning curves while they train: a
+CurveLog adds each update's errors into bins of bin_size sweeps, for
+regular and irregular items, so no per-sweep history is kept.
+
+Large ensembles are split into shards of shard_size replicas (each
+small enough for its tensors to stay in cache), which are trained on a
+pool of worker processes and their curves merged:
+
+    >>> curves = ensemble(n_reps=500, n_train=6000, seed=1)
+    >>> curves['mean'].unstack()        # sweeps x (regular, irregular)
+
+Running...
+$ python ensemble.py
+
+...will train 400 networks and print their average learning curves.
+'''
+
+from __future__ import division
+
+import multiprocessing
+
+import numpy as np
+from pandas import DataFrame, MultiIndex
+
+from backprop import N_TRAIN, ETA, MP, make_patterns, train
+
+
+BIN_SIZE = 200
+SHARD_SIZE = 100
+TYPES = ('regular', 'irregular')
+
+
+class CurveLog(object):
+    '''Learning curves of regular and irregular items, in bins of sweeps.
+
+    Used as the log of backprop.train: record() adds the errors of each
+    update to running sums (and sums of squares and counts) for its bin
+    and word type.
+    '''
+
+    def __init__(self, irregular, n_train, bin_size=BIN_SIZE):
+        self.irregular = np.asarray(irregular, dtype=int)
+        self.bin_size = bin_size
+        self.n_updates = 0
+        n_bins = -(-n_train // bin_size)
+        self.sum = np.zeros((n_bins, len(TYPES)))
+        self.sum_sq = np.zeros((n_bins, len(TYPES)))
+        self.count = np.zeros((n_bins, len(TYPES)))
+
+    def record(self, idx, err):
+        '''Add one update's errors, err (n_nets, batch) on patterns idx.'''
+        which = np.broadcast_to(self.irregular[idx], err.shape).ravel()
+        err = err.ravel()
+        b = self.n_updates // self.bin_size
+        self.sum[b] += np.bincount(which, err, len(TYPES))
+        self.sum_sq[b] += np.bincount(which, err**2, len(TYPES))
+        self.count[b] += np.bincount(which, minlength=len(TYPES))
+        self.n_updates += 1
+
+    def merge(self, other):
+        '''Add in the curves of another CurveLog (eg, another shard).'''
+        self.sum += other.sum
+        self.sum_sq += other.sum_sq
+        self.count += other.count
+        return self
+
+    def curves(self):
+        '''DataFrame indexed by (sweep, type), the sweep being the start
+        of each bin, with the mean and sd of the errors and their count.
+        '''
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = self.sum / self.count
+            sd = np.sqrt(np.maximum(self.sum_sq/self.count - mean**2, 0))
+        index = MultiIndex.from_product([np.arange(len(mean))*self.bin_size,
+            TYPES], names=['sweep', 'type'])
+        return DataFrame({'mean': mean.ravel(), 'sd': sd.ravel(),
+            'n': self.count.ravel()}, index=index, columns=['mean', 'sd', 'n'])
+
+
+def _run_shard(task):
+    '''Train one shard of replicas, and return its CurveLog.'''
+    n_reps, seed, n_train, bin_size, pattern_kwargs, train_kwargs = task
+    pattern_seed, train_seed = seed.spawn(2)
+    inputs, outputs, irregular = make_patterns(shape=(n_reps,),
+        seed=pattern_seed, **pattern_kwargs)
+    log = CurveLog(irregular, n_train, bin_size)
+    train(inputs, outputs, n_train=n_train, seed=train_seed, log=log,
+        **train_kwargs)
+    return log
+
+
+def ensemble(n_reps, n_train=N_TRAIN, eta=ETA, mp=MP, bin_size=BIN_SIZE,
+    seed=None, shard_size=SHARD_SIZE, processes=None, pattern_kwargs=None,
+    **train_kwargs):
+    '''Average learning curves of n_reps replicated networks.
+    ARGS
+        n_reps:         number of networks
+        n_train:        updates of each network
+        eta, mp:        learning rate and momentum (the same for all)
+        bin_size:       sweeps in each bin of the learning curves
+        seed:           seed for the ensemble; every shard gets its own,
+                        spawned from it, so the results don't depend on
+                        the number of processes
+        shard_size:     replicas trained together as one stack
+        processes:      worker processes (default: one per CPU; 1 trains
+                        the shards one after another in this process)
+        pattern_kwargs: passed to make_patterns (eg, n_irreg)
+        train_kwargs:   passed to backprop.train (eg, mode, h)
+    RETURNS
+        curves:         as CurveLog.curves, over all the networks
+    '''
+    seeds = np.random.SeedSequence(seed).spawn(-(-n_reps // shard_size))
+    tasks = [(min(shard_size, n_reps - i*shard_size), shard_seed, n_train,
+        bin_size, pattern_kwargs or {}, dict(train_kwargs, eta=eta, mp=mp))
+        for i, shard_seed in enumerate(seeds)]
+
+    if processes == 1 or len(tasks) == 1:
+        logs = map(_run_shard, tasks)
+        total = None
+        for log in logs:
+            total = log if total is None else total.merge(log)
+    else:
+        pool = multiprocessing.Pool(processes)
+        try:
+            total = None
+            for log in pool.imap_unordered(_run_shard, tasks):
+                total = log if total is None else total.merge(log)
+        finally:
+            pool.close()
+            pool.join()
+    return total.curves()
+
+
+if __name__ == '__main__':
+    import time
+
+    t0 = time.time()
+    curves = ensemble(n_reps=400, seed=1)
+    print('400 networks: {:.2f} s'.format(time.time() - t0))
+    print(curves['mean'].unstack().iloc[::3].round(3))
@@ -0,0 +1,168 @@
+'''
+13.1 - The Hebbian associator, in matrix form
+
+13-1-remy.py learns listing 13.1 with a loop over pairs, output units
+and input units, and listing 13.2 adds one outer product per pair and
+tests one probe at a time, inside loops over replications and
+similarities. Here a whole list is learned as one matrix product,
+
+    W += alpha * O.T C          (O: items x m, C: items x n)
+
+and recalled as another, O' = C' W.T; the cosine of every recalled
+pattern with its target is a single normalized row-wise product.
+HebbianAssociator also takes any number of leading (replication) axes,
+so a stack of networks, W (reps x m x n), studies and is tested with
+matmul in one go:
+
+    >>> net = HebbianAssociator(n=100, m=50, shape=(n_reps,))
+    >>> net.study(C, O)                 # C (n_reps, 20, 100), O (n_reps, 20, 50)
+    >>> acc = net.test(probes, O)       # cosines (n_reps, 20)
+
+generalization() is the fig 13.4 experiment built on it.
+
+Running...
+$ python hebbian.py
+
+...will redo listing 13.1, time the fig 13.4 experiment and plot it.
+'''
+
+from __future__ import division
+
+import numpy as np
+
+
+# listing 13.2
+N_INPUT = 100
+N_OUTPUT = 50
+LIST_LENGTH = 20
+N_REPS = 100
+ALPHA = .25
+STIM_SIMS = (0, .25, .5, .75, 1)
+
+CHUNK_SIZE = 10
+
+
+def cosine(a, b):
+    '''Cosine similarity of the rows (last axis) of a and b.'''
+    num = np.sum(a*b, axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return num / np.sqrt(np.sum(a*a, axis=-1) * np.sum(b*b, axis=-1))
+
+
+def random_patterns(shape, rng=None, dtype=float):
+    '''Patterns of random +1s and -1s (sign(rnorm(n)) in the listings).'''
+    rng = np.random.default_rng() if rng is None else rng
+    return (2*rng.integers(0, 2, size=shape, dtype=np.int8) - 1).astype(dtype)
+
+
+def distort(patterns, similarity, rng=None):
+    '''Probes sharing (on average) a proportion similarity of their
+    elements with patterns, the rest being random +1s and -1s.
+    '''
+    rng = np.random.default_rng() if rng is None else rng
+    keep = rng.random(patterns.shape) < similarity
+    return np.where(keep, patterns,
+        random_patterns(patterns.shape, rng, patterns.dtype))
+
+
+class HebbianAssociator(object):
+    '''A stack of Hebbian associators from n input to m output units.
+    ARGS
+        n, m:       numbers of input and output units
+        alpha:      learning rate
+        shape:      leading (eg, replication) axes of the stack, () for a
+                    single network
+        dtype:      of the weights (np.float32 halves their memory)
+    '''
+
+    def __init__(self, n, m, alpha=ALPHA, shape=(), dtype=float):
+        self.n, self.m = n, m
+        self.alpha = alpha
+        self.W = np.zeros(tuple(shape) + (m, n), dtype=dtype)
+
+    def reset(self):
+        '''Forget everything.'''
+        self.W[...] = 0
+
+    def study(self, C, O):
+        '''Learn the pairs in the rows of C (..., items, n) and
+        O (..., items, m): W += alpha * sum of the outer products o c^T.
+        '''
+        self.W += self.alpha * np.matmul(np.swapaxes(O, -1, -2), C)
+
+    def recall(self, C, W=None):
+        '''Outputs (..., items, m) to the cues C (..., items, n), ie W c
+        for each cue; W defaults to the learned weights.
+        '''
+        W = self.W if W is None else W
+        return np.matmul(C, np.swapaxes(W, -1, -2))
+
+    def test(self, C, O, W=None):
+        '''Cosine of the output to each cue in C with its target in O.'''
+        return cosine(self.recall(C, W), O)
+
+
+def generalization(n=N_INPUT, m=N_OUTPUT, list_length=LIST_LENGTH,
+    n_reps=N_REPS, alpha=ALPHA, stim_sims=STIM_SIMS, seed=None,
+    chunk_size=CHUNK_SIZE, dtype=float):
+    '''Generalization to distorted cues (listing 13.2, fig 13.4).
+
+    Each replication learns a list of random pairs, and is then cued
+    with probes sharing a proportion of their elements with the studied
+    cues. The replications are run as a stack of networks, chunk_size
+    at a time (which bounds the memory the weights take).
+    ARGS
+        n, m:           numbers of input and output units
+        list_length:    pairs in each list
+        n_reps:         replications
+        alpha:          learning rate
+        stim_sims:      probe-cue similarities
+        seed:           seed for the patterns
+        chunk_size:     replications run at once
+        dtype:          of the patterns and weights
+    RETURNS
+        accuracy:       mean cosine at each similarity, (len(stim_sims),)
+    '''
+    rng = np.random.default_rng(seed)
+    total = np.zeros(len(stim_sims))
+    for start in range(0, n_reps, chunk_size):
+        reps = min(chunk_size, n_reps - start)
+        net = HebbianAssociator(n, m, alpha, shape=(reps,), dtype=dtype)
+        stim = random_patterns((reps, list_length, n), rng, dtype)
+        resp = random_patterns((reps, list_length, m), rng, dtype)
+        net.study(stim, resp)
+        for i, sim in enumerate(stim_sims):
+            probes = distort(stim, sim, rng)
+            total[i] += net.test(probes, resp).mean(axis=-1).sum()
+    return total / n_reps
+
+
+if __name__ == '__main__':
+    import time
+
+    # listing 13.1
+    c = np.array([[1, -1, 1, -1], [1, 1, 1, 1]], dtype=float)
+    o = np.array([[1, 1, -1, -1], [1, -1, -1, 1]], dtype=float)
+    net = HebbianAssociator(n=4, m=4, alpha=.25)
+    net.study(c, o)
+    print('W =')
+    print(net.W)
+    print('response to the first cue: {}, cosine with its target: {:.3f}'
+        .format(net.recall(c[0]), net.test(c[0], o[0])))
+
+    # listing 13.2 (fig 13.4)
+    t0 = time.time()
+    accuracy = generalization(seed=1)
+    print('fig 13.4 in {:.3f} s: {}'.format(time.time() - t0,
+        np.round(accuracy, 3)))
+
+    t0 = time.time()
+    generalization(n=2000, m=1000, n_reps=100, seed=2, dtype=np.float32)
+    print('n=2000, m=1000: {:.2f} s'.format(time.time() - t0))
+
+    import matplotlib.pyplot as plt
+    plt.plot(STIM_SIMS, accuracy, marker='o', ms=5)
+    plt.xlabel('Stimulus-Cue Similarity')
+    plt.ylabel('Cosine')
+    plt.title('figure 13.4, generalization in the Hebbian model')
+    plt.show()
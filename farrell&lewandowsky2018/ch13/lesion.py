@@ -0,0 +1,196 @@
+'''
+13.1.2 - Lesioning the Hebbian associator: graceful degradation
+
+The last part of section 13.1 (left out of 13-1-remy.py, and plotted in
+HebbLesion.pdf) zeroes a random proportion of the connections of a
+learned network and tests it again, one lesion probability, one
+replication and one item at a time. Here a whole sweep over
+
+    lesion proportion x list length x probe similarity
+
+is batched: each replication's weights W are learned once (and kept
+in a cache, keyed by the list length and the seed of the replications,
+so they are reused by every lesion level, every similarity and later
+sweeps), and all the lesion levels are applied at once as a stack of
+masked weight tensors, which are probed with hebbian.HebbianAssociator:
+
+    >>> results = sweep(lesion_ps=np.linspace(0, 1, 11), n_reps=1000)
+    >>> results.loc[(20, 1)]            # the HebbLesion.pdf curve
+
+Each replication draws one uniform number per connection, and a lesion
+of proportion p removes the connections whose number is below p; so
+heavier lesions include lighter ones, and the differences between
+lesion levels aren't swamped by different draws.
+
+Running...
+$ python lesion.py
+
+...will time a degradation curve over 2000 replications and plot it.
+'''
+
+from __future__ import division
+
+import numpy as np
+from pandas import DataFrame, MultiIndex
+
+import hebbian
+from hebbian import (N_INPUT, N_OUTPUT, LIST_LENGTH, ALPHA,
+    HebbianAssociator, random_patterns, distort)
+
+
+LESION_PS = tuple(np.round(np.linspace(0, 1, 11), 1))
+N_REPS = 100
+CHUNK_SIZE = 50
+
+
+def lesion(W, lesion_ps, u=None, noise=None, rng=None):
+    '''Lesion the weights W at every proportion in lesion_ps at once.
+    ARGS
+        W:          weights, array (..., m, n)
+        lesion_ps:  proportions of connections to lesion, (n_ps,)
+        u:          uniform numbers deciding which connections go first,
+                    the shape of W (default: drawn from rng)
+        noise:      None to zero the lesioned connections, or an array
+                    the shape of W added to them instead (ie, perturbed)
+        rng:        numpy Generator
+    RETURNS
+        lesioned:   array (n_ps, ..., m, n)
+    '''
+    if u is None:
+        rng = np.random.default_rng() if rng is None else rng
+        u = rng.random(W.shape)
+    lesion_ps = np.asarray(lesion_ps, dtype=float)
+    mask = u < lesion_ps.reshape((-1,) + (1,)*W.ndim)
+    if noise is None:
+        return np.where(mask, 0, W).astype(W.dtype)
+    return (W + mask*noise).astype(W.dtype)
+
+
+class WeightCache(object):
+    '''Learned networks, keyed by the study conditions.
+
+    get() returns the stack of networks (with their studied cues and
+    responses) for one chunk of replications, learning them the first
+    time only. Each chunk has its own seed, spawned from the sweep's
+    seed, so what is learned doesn't depend on which other conditions
+    are run.
+    '''
+
+    def __init__(self):
+        self._store = {}
+
+    def __len__(self):
+        return len(self._store)
+
+    def clear(self):
+        self._store.clear()
+
+    def get(self, n, m, list_length, alpha, n_reps, seed, dtype=float):
+        '''
+        ARGS
+            n, m, list_length, alpha:
+                        as for hebbian.generalization
+            n_reps:     replications in the chunk
+            seed:       np.random.SeedSequence of the chunk
+        RETURNS
+            net:        HebbianAssociator with shape (n_reps,)
+            stim, resp: the studied cues (n_reps, list_length, n) and
+                        responses (n_reps, list_length, m)
+        '''
+        key = (n, m, list_length, alpha, n_reps, seed.entropy,
+            seed.spawn_key, np.dtype(dtype).str)
+        if key not in self._store:
+            rng = np.random.default_rng(seed)
+            net = HebbianAssociator(n, m, alpha, shape=(n_reps,), dtype=dtype)
+            stim = random_patterns((n_reps, list_length, n), rng, dtype)
+            resp = random_patterns((n_reps, list_length, m), rng, dtype)
+            net.study(stim, resp)
+            self._store[key] = net, stim, resp
+        return self._store[key]
+
+
+def sweep(lesion_ps=LESION_PS, list_lengths=(LIST_LENGTH,), stim_sims=(1,),
+    n=N_INPUT, m=N_OUTPUT, alpha=ALPHA, n_reps=N_REPS, noise_sd=None,
+    seed=None, cache=None, chunk_size=CHUNK_SIZE, dtype=float):
+    '''Cosine of recall after lesions, for every condition.
+    ARGS
+        lesion_ps:      proportions of connections lesioned
+        list_lengths:   numbers of pairs studied
+        stim_sims:      similarities of the probes to the studied cues
+                        (1, the default, probes with the cues themselves)
+        n, m, alpha:    as for hebbian.generalization
+        n_reps:         replications of each condition
+        noise_sd:       None to zero the lesioned connections, or the sd
+                        of Gaussian noise added to them
+        seed:           seed for the sweep
+        cache:          WeightCache to take the learned networks from, and
+                        add them to (default: a new one)
+        chunk_size:     replications run at once
+        dtype:          of the patterns and weights
+    RETURNS
+        results:        DataFrame indexed by (list_length, stim_sim,
+                        lesion_p), with the mean cosine and its sd over
+                        replications
+    '''
+    cache = WeightCache() if cache is None else cache
+    lesion_ps = np.asarray(lesion_ps, dtype=float)
+    seed = np.random.SeedSequence(seed)
+    chunk_seeds = seed.spawn(-(-n_reps // chunk_size))
+    # sums over replications of each rep's mean cosine, and of its square
+    shape = (len(list_lengths), len(stim_sims), len(lesion_ps))
+    total, total_sq = np.zeros(shape), np.zeros(shape)
+
+    for i, list_length in enumerate(list_lengths):
+        for chunk, chunk_seed in enumerate(chunk_seeds):
+            reps = min(chunk_size, n_reps - chunk*chunk_size)
+            net, stim, resp = cache.get(n, m, list_length, alpha, reps,
+                chunk_seed, dtype)
+            # lesions and probes are drawn afresh for each list length
+            rng = np.random.default_rng(np.random.SeedSequence(
+                chunk_seed.entropy, spawn_key=chunk_seed.spawn_key
+                + (list_length,)))
+            noise = None if noise_sd is None else \
+                noise_sd*rng.standard_normal(net.W.shape).astype(dtype)
+            W = lesion(net.W, lesion_ps, rng.random(net.W.shape), noise)
+            for j, sim in enumerate(stim_sims):
+                probes = stim if sim == 1 else distort(stim, sim, rng)
+                # (n_ps, reps, list_length) cosines; a network with no
+                # connections left recalls nothing, which counts as 0
+                cos = np.nan_to_num(net.test(probes, resp, W)).mean(axis=-1)
+                total[i, j] += cos.sum(axis=-1)
+                total_sq[i, j] += (cos**2).sum(axis=-1)
+
+    mean = total / n_reps
+    sd = np.sqrt(np.maximum(total_sq/n_reps - mean**2, 0))
+    index = MultiIndex.from_product([list_lengths, stim_sims, lesion_ps],
+        names=['list_length', 'stim_sim', 'lesion_p'])
+    return DataFrame({'cosine': mean.ravel(), 'sd': sd.ravel()},
+        index=index, columns=['cosine', 'sd'])
+
+
+if __name__ == '__main__':
+    import time
+
+    cache = WeightCache()
+    t0 = time.time()
+    results = sweep(n_reps=2000, list_lengths=(10, 20, 40),
+        stim_sims=hebbian.STIM_SIMS, seed=1, cache=cache)
+    print('{} conditions x 2000 replications: {:.2f} s'.format(
+        len(results), time.time() - t0))
+
+    # the learned networks are reused by a second sweep
+    t0 = time.time()
+    perturbed = sweep(n_reps=2000, list_lengths=(10, 20, 40),
+        stim_sims=hebbian.STIM_SIMS, noise_sd=.5, seed=1, cache=cache)
+    print('again, with noise instead of zeros: {:.2f} s'.format(
+        time.time() - t0))
+
+    curve = results.loc[(20, 1), 'cosine']
+    print(curve.round(3))
+
+    import matplotlib.pyplot as plt
+    plt.plot(curve.index, curve.values, marker='o')
+    plt.xlabel('Lesion Probability')
+    plt.ylabel('Cosine')
+    plt.ylim(0, 1)
+    plt.show()
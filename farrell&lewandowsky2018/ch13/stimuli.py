@@ -0,0 +1,159 @@
+'''
+13.2 - Stimulus sets for the regular/irregular (past tense) network
+
+13-2-Backpropagation.ipynb builds its input and output patterns by
+writing numpy arrays into the cells of object-dtype DataFrames, one
+word at a time. build_stimuli() draws every pattern of every set (and,
+for ensembles, of every replica) at once, into contiguous uint8 arrays,
+with the labels of the patterns kept as small integer codes:
+
+    >>> stims = build_stimuli(shape=(1000,), seed=1)    # 1000 replicas
+    >>> stims.inputs.shape, stims.inputs.dtype
+    ((1000, 25, 30), dtype('uint8'))
+    >>> X = stims.as_float()                            # float32, for training
+    >>> X_df, Y_df = stims.to_frames(rep=0)             # the notebook's X and Y
+
+In each set the inputs share a stem (the first n_stem units), and each
+word has its own non-stem units; the regular words share one output
+pattern, and each irregular word has its own.
+
+Running...
+$ python stimuli.py
+
+...will print the notebook's X and Y, and time 10^4 replicas.
+'''
+
+from __future__ import division
+
+import numpy as np
+import pandas as pd
+
+
+# listing 13.6 (the notebook has 50 output units)
+N_STEM = 10
+N_OTHER = 20
+N_OUTPUT = 30
+N_REG = 4
+N_IRREG = 1
+N_SETS = 5
+
+
+def word_types(n_reg=N_REG, n_irreg=N_IRREG):
+    '''Labels of the words in a set, eg reg1, ..., reg4, irreg1.'''
+    return ['reg{}'.format(i + 1) for i in range(n_reg)] \
+        + ['irreg{}'.format(i + 1) for i in range(n_irreg)]
+
+
+class StimulusSet(object):
+    '''Input and output patterns, with integer labels.
+
+    ATTRIBUTES
+        inputs:     uint8 array (..., n_patterns, n_stem+n_other)
+        outputs:    uint8 array (..., n_patterns, m)
+        set_codes:  set of each pattern, (n_patterns,)
+        word_codes: word type of each pattern (into word_names),
+                    (n_patterns,)
+        irregular:  whether each pattern is irregular, (n_patterns,)
+        word_names: labels of the word types
+        n_stem:     number of stem input units
+    The labels are the same for every replica (leading axes).
+    '''
+
+    def __init__(self, inputs, outputs, set_codes, word_codes, word_names,
+        n_reg, n_stem):
+        self.inputs = inputs
+        self.outputs = outputs
+        self.set_codes = set_codes
+        self.word_codes = word_codes
+        self.word_names = list(word_names)
+        self.irregular = word_codes >= n_reg
+        self.n_stem = n_stem
+
+    @property
+    def n_sets(self):
+        return int(self.set_codes.max()) + 1 if len(self.set_codes) else 0
+
+    def as_float(self, dtype=np.float32):
+        '''inputs and outputs as dtype, ready for training.'''
+        return self.inputs.astype(dtype), self.outputs.astype(dtype)
+
+    def index(self):
+        '''The (set, word_type) pandas MultiIndex of the patterns.'''
+        return pd.MultiIndex(levels=[np.arange(self.n_sets),
+            self.word_names], codes=[self.set_codes, self.word_codes],
+            names=['set', 'word_type'])
+
+    def to_frames(self, rep=None):
+        '''DataFrames X and Y of the patterns, as in the notebook.
+        ARGS
+            rep:    index of the replica to show (a tuple for more than
+                    one leading axis); None for a single replica
+        RETURNS
+            X, Y:   DataFrames indexed by (set, word_type), with columns
+                    stem/nonstem (X) and output unit (Y)
+        '''
+        inputs, outputs = self.inputs, self.outputs
+        if rep is not None:
+            inputs, outputs = inputs[rep], outputs[rep]
+        n = inputs.shape[-1]
+        columns = np.concatenate([np.repeat('stem', self.n_stem),
+            np.repeat('nonstem', n - self.n_stem)])
+        index = self.index()
+        return (pd.DataFrame(inputs, index=index, columns=columns),
+            pd.DataFrame(outputs, index=index))
+
+
+def build_stimuli(n_stem=N_STEM, n_other=N_OTHER, m=N_OUTPUT, n_reg=N_REG,
+    n_irreg=N_IRREG, n_sets=N_SETS, shape=(), seed=None):
+    '''Draw the patterns of every set (and replica) at once.
+    ARGS
+        n_stem, n_other:    input units of the stem, and of the rest
+        m:                  output units
+        n_reg, n_irreg:     regular and irregular words in each set
+        n_sets:             sets
+        shape:              leading axes, eg (n_reps,) for a different
+                            stimulus set for each network of an ensemble
+        seed:               seed for the patterns
+    RETURNS
+        stims:              StimulusSet
+    '''
+    rng = np.random.default_rng(seed)
+    shape = tuple(shape)
+    n_words = n_reg + n_irreg
+    n_patterns = n_sets * n_words
+
+    inputs = np.empty(shape + (n_sets, n_words, n_stem + n_other),
+        dtype=np.uint8)
+    inputs[..., :n_stem] = rng.integers(2, size=shape + (n_sets, 1, n_stem),
+        dtype=np.uint8)
+    inputs[..., n_stem:] = rng.integers(2,
+        size=shape + (n_sets, n_words, n_other), dtype=np.uint8)
+    # one output shared by the regular words, one for each irregular word
+    outs = rng.integers(2, size=shape + (n_sets, 1 + n_irreg, m),
+        dtype=np.uint8)
+    which = np.r_[np.zeros(n_reg, dtype=np.intp), np.arange(1, 1 + n_irreg)]
+    outputs = np.ascontiguousarray(outs[..., which, :])
+
+    small = np.min_scalar_type(max(n_sets, n_words))
+    set_codes = np.repeat(np.arange(n_sets, dtype=small), n_words)
+    word_codes = np.tile(np.arange(n_words, dtype=small), n_sets)
+    return StimulusSet(inputs.reshape(shape + (n_patterns, -1)),
+        outputs.reshape(shape + (n_patterns, m)), set_codes, word_codes,
+        word_types(n_reg, n_irreg), n_reg, n_stem)
+
+
+if __name__ == '__main__':
+    import time
+
+    stims = build_stimuli(seed=1)
+    X, Y = stims.to_frames()
+    print('INPUT PATTERNS')
+    print(X.head(10))
+    print('OUTPUT PATTERNS')
+    print(Y.head())
+
+    t0 = time.time()
+    stims = build_stimuli(shape=(10**4,), seed=2)
+    print('10^4 replicas: {} inputs in {:.3f} s ({:.1f} MB)'.format(
+        stims.inputs.shape, time.time() - t0,
+        (stims.inputs.nbytes + stims.outputs.nbytes) / 2**20))
@@ -0,0 +1,317 @@
+'''
+Lewandowsky and Farrell, 2014, Chapter 2
+Model of phonological loop, as an importable simulation.
+
+SLPhonologicalLoop1.py and SLPhonologicalLoop2.py walk through the model
+one rep at a time. Here all reps (and all speech rates) are simulated at
+once, so each rehearsal step is a single array operation on a
+(speech rates x reps x words) block of activations.
+
+    >>> from phonological_loop import simulate
+    >>> accuracy = simulate(1./np.linspace(1.5, 4, 15), decay_sd=.2)
+
+With decay_sd=0 this is SLPhonologicalLoop1.py, otherwise it is
+SLPhonologicalLoop2.py. Given the same seed both produce the same
+accuracy curve as the scripts.
+
+solve() and solve_noisy() get the same answers without stepping
+through the delay at all. A word's fate only depends on how many
+steps it survives after being (re)activated, so they jump straight
+from one event (a word dropping out, rehearsal wrapping around)
+to the next. See count_intact() for details.
+'''
+
+from __future__ import division
+import numpy as np
+
+
+# default parameters (same as the scripts)
+N_REPS = 1000       # number of iterations
+N_WORDS = 5         # per list
+INIT_ACTIV = 1      # initial activation of items
+MIN_ACTIV = 0       # minimum activation for recall
+DECAY_RATE = .8     # per second
+DECAY_SD = 0        # jitter of decay rate across reps
+DELAY_TIME = 5      # seconds
+
+# beyond this many steps, n_rehearsal_steps() stops accumulating time
+MAX_EXACT_STEPS = 10**5
+
+
+def n_rehearsal_steps(t, delay_time=DELAY_TIME):
+    '''Number of times the `while secs < DELAY_TIME` loop runs
+    for words that take <t> seconds to say.
+    Time is accumulated the same way as in the scripts,
+    so rounding decides borderline cases the same way too.
+    For very long delays (more than MAX_EXACT_STEPS) that would
+    dominate the cost of solve(), so the count is taken directly.
+    '''
+    if delay_time / t > MAX_EXACT_STEPS:
+        return int(np.ceil(delay_time / t))
+    steps = 0
+    secs = 0
+    while secs < delay_time:
+        secs += t
+        steps += 1
+    return steps
+
+
+def next_rehearsal_word(intact, rehearsal_word):
+    '''Vectorized version of the "next intact word" lookup in the scripts.
+
+    ARGS
+        intact:         boolean array (..., n_words), words above threshold
+        rehearsal_word: int array (...), word rehearsed on the previous step
+    RETURNS
+        rehearsal_word: int array (...), word to rehearse now
+
+    The scripts take the _position_ of the next intact word within
+    the list of intact words (np.where(intact>rehearsal_word)[0][0]),
+    which is the number of intact words up to and including the
+    current one. We keep that exactly, so results match.
+    '''
+    n_words = intact.shape[-1]
+    behind = np.arange(n_words) <= rehearsal_word[..., None]
+    n_behind = np.sum(intact & behind, axis=-1)
+    n_intact = np.sum(intact, axis=-1)
+    # head back to beginning of word list if nothing is left ahead
+    return np.where(n_behind < n_intact, n_behind, 0)
+
+
+def simulate(speech_times, n_reps=N_REPS, n_words=N_WORDS,
+    decay_rate=DECAY_RATE, decay_sd=DECAY_SD, delay_time=DELAY_TIME,
+    init_activ=INIT_ACTIV, min_activ=MIN_ACTIV, rng=np.random):
+    '''Simulate the phonological loop for all reps and speech rates at once.
+
+    ARGS
+        speech_times:   vector of times (s) it takes to say each word
+        n_reps:         number of simulated lists per speech time
+        n_words:        number of words per list
+        decay_rate:     activation lost per second
+        decay_sd:       sd of the per-rep jitter applied to decay_rate
+                        (0 gives the deterministic model)
+        delay_time:     length of the delay (rehearsal) period (s)
+        init_activ:     activation of a word after encoding or rehearsal
+        min_activ:      minimum activation for recall
+        rng:            source of the decay jitter; anything with a
+                        .normal(size=...) method (np.random by default,
+                        so np.random.seed() reproduces the scripts)
+    RETURNS
+        accuracy:       vector (same length as speech_times) holding the
+                        proportion of words recalled, averaged over reps
+    '''
+    speech_times = np.atleast_1d(np.asarray(speech_times, dtype=float))
+    n_rates = speech_times.size
+
+    # apply sd to jitter the decay rate, one draw per rep
+    # (drawn in the same order as the scripts' nested loops)
+    trial_decay_rate = np.full([n_rates, n_reps], float(decay_rate))
+    if decay_sd:
+        trial_decay_rate += rng.normal(size=[n_rates, n_reps]) * decay_sd
+    # decay applied on each step, according to the length of the word
+    step_decay = trial_decay_rate * speech_times[:, None]
+
+    # each speech rate has its own number of rehearsal steps
+    n_steps = np.array([n_rehearsal_steps(t, delay_time) for t in speech_times])
+
+    # start each word in the list with the same activation value
+    activations = np.full([n_rates, n_reps, n_words], float(init_activ))
+    # allows rehearsal to start at beginning of list
+    rehearsal_word = np.full([n_rates, n_reps], -1)
+    reps = np.arange(n_reps)
+
+    for step in range(n_steps.max() if n_rates else 0):
+
+        # speech rates whose delay period is still running
+        running = np.flatnonzero(n_steps > step)
+        act = activations[running]
+
+        # find words still in memory and pick the next one to rehearse
+        intact = act > min_activ
+        word = next_rehearsal_word(intact, rehearsal_word[running])
+        rehearsal_word[running] = word
+
+        # re-activate the item being rehearsed
+        act[np.arange(running.size)[:, None], reps, word] = init_activ
+
+        # everything decays
+        activations[running] = act - step_decay[running][:, :, None]
+
+    # how many items are still in memory?
+    n_correct = np.sum(activations > min_activ, axis=-1)
+    # save accuracy as percentage of whole word list, averaged over reps
+    return np.mean(n_correct / n_words, axis=-1)
+
+
+def word_lifetime(step_decay, n_steps, init_activ=INIT_ACTIV,
+    min_activ=MIN_ACTIV):
+    '''Number of steps a freshly (re)activated word stays above threshold.
+
+    ARGS
+        step_decay: activation lost on each step (decay rate * t),
+                    scalar or array
+        n_steps:    number of steps in the delay period
+    RETURNS
+        lifetime:   int array (same shape as step_decay). A word that
+                    was last activated `age` steps ago is still intact
+                    if age < lifetime. Words that can never drop out
+                    within the delay get n_steps+1.
+
+    Activation is decayed by repeated subtraction, as in simulate() and
+    the scripts, so rounding decides borderline cases the same way too:
+    when (init_activ-min_activ)/step_decay is a whole number, the
+    subtractions leave a tiny residue above min_activ and the word
+    survives one more step than ceil() of the ratio says. Lifetimes
+    beyond MAX_EXACT_STEPS are taken from the ratio directly.
+    '''
+    step_decay = np.asarray(step_decay, dtype=float)
+    lifetime = np.full(step_decay.shape, n_steps + 1)
+    with np.errstate(divide='ignore'):
+        guess = np.where(step_decay > 0,
+            np.ceil((init_activ - min_activ) / step_decay), np.inf)
+    # words that might drop out within the delay
+    exact = guess <= min(n_steps, MAX_EXACT_STEPS)
+    lifetime[(guess <= n_steps) & ~exact] = guess[(guess <= n_steps) & ~exact]
+
+    activ = np.full(step_decay.shape, float(init_activ))
+    alive = exact & (activ > min_activ)
+    lifetime[exact & ~alive] = 0
+    last = int(guess[exact].max()) + 1 if exact.any() else 0
+    for age in range(1, min(last, n_steps) + 1):
+        if not alive.any():
+            break
+        activ = activ - step_decay
+        dropped = alive & ~(activ > min_activ)
+        lifetime[dropped] = age
+        alive &= ~dropped
+    return np.clip(lifetime, 0, n_steps + 1).astype(int)
+
+
+def count_intact(lifetime, n_steps, n_words=N_WORDS):
+    '''Event-driven solution of the delay period for a single list.
+
+    ARGS
+        lifetime:   steps a word survives after (re)activation
+                    (see word_lifetime)
+        n_steps:    number of steps in the delay period
+        n_words:    number of words per list
+    RETURNS
+        n_correct:  number of words still in memory at the end
+
+    Instead of activations we track the age of each word (steps since
+    it was last activated, capped at lifetime). While every word up to
+    the rehearsal pointer is intact and there is an intact word ahead,
+    the pointer just moves on one word per step, so that whole run is
+    applied in one go. The steps in between runs (a word dropped out
+    behind the pointer, or rehearsal wraps around) use the scripts'
+    rule directly. Once a state repeats the remaining whole cycles
+    are skipped, so long delays cost no more than the first cycle.
+    '''
+    if lifetime <= 0:
+        return 0
+    if lifetime > n_steps:
+        return n_words
+
+    words = np.arange(n_words)
+    age = np.zeros(n_words, dtype=int)
+    rehearsal_word = -1
+    step = 0
+    seen = {}
+
+    while step < n_steps:
+        intact = age < lifetime
+
+        # longest run in which the pointer moves on one word per step:
+        # words behind the pointer must not drop out...
+        if rehearsal_word >= 0:
+            run = lifetime - age[:rehearsal_word+1].max()
+        else:
+            run = lifetime
+        # ...and some word ahead must still be intact when we reach it
+        ahead = words > rehearsal_word
+        reach = np.minimum(words[ahead] - rehearsal_word,
+            lifetime - age[ahead])
+        run = min(run, reach.max() if reach.size else 0, n_steps - step)
+
+        if run > 0:
+            age += run
+            age[rehearsal_word+1:rehearsal_word+run+1] = np.arange(run, 0, -1)
+            np.minimum(age, lifetime, out=age)
+            rehearsal_word += run
+            step += run
+            continue
+
+        # skip whole cycles once the model state repeats
+        state = (rehearsal_word, age.tobytes())
+        if state in seen:
+            period = step - seen[state]
+            step += (n_steps - step) // period * period
+            seen = {}
+            if step >= n_steps:
+                break
+        seen[state] = step
+
+        # single step, exactly as in the scripts
+        rehearsal_word = int(next_rehearsal_word(intact,
+            np.array(rehearsal_word)))
+        age[rehearsal_word] = 0
+        age += 1
+        np.minimum(age, lifetime, out=age)
+        step += 1
+
+    return int(np.sum(age < lifetime))
+
+
+def solve(speech_times, n_words=N_WORDS, decay_rate=DECAY_RATE,
+    delay_time=DELAY_TIME, init_activ=INIT_ACTIV, min_activ=MIN_ACTIV):
+    '''Accuracy of the deterministic model (SLPhonologicalLoop1.py).
+
+    Without jitter every rep gives the same result, so one
+    event-driven pass per speech time replaces all the reps.
+    Arguments are as in simulate().
+
+    RETURNS
+        accuracy:   vector (same length as speech_times) holding the
+                    proportion of words recalled
+    '''
+    speech_times = np.atleast_1d(np.asarray(speech_times, dtype=float))
+    accuracy = np.zeros_like(speech_times)
+    for i, t in enumerate(speech_times):
+        n_steps = n_rehearsal_steps(t, delay_time)
+        lifetime = word_lifetime(decay_rate*t, n_steps, init_activ, min_activ)
+        accuracy[i] = count_intact(lifetime, n_steps, n_words) / n_words
+    return accuracy
+
+
+def solve_noisy(speech_times, n_reps=N_REPS, n_words=N_WORDS,
+    decay_rate=DECAY_RATE, decay_sd=DECAY_SD, delay_time=DELAY_TIME,
+    init_activ=INIT_ACTIV, min_activ=MIN_ACTIV, rng=np.random):
+    '''Accuracy of the noisy model (SLPhonologicalLoop2.py) by table lookup.
+
+    For a given speech time the outcome of a rep only depends on its
+    trial decay rate through the word lifetime. So accuracy is solved
+    once per distinct lifetime, and each rep just looks up its entry.
+    Arguments and random draws are as in simulate(), so the same seed
+    gives the same accuracy curve.
+
+    RETURNS
+        accuracy:   vector (same length as speech_times) holding the
+                    proportion of words recalled, averaged over reps
+    '''
+    speech_times = np.atleast_1d(np.asarray(speech_times, dtype=float))
+    n_rates = speech_times.size
+
+    trial_decay_rate = np.full([n_rates, n_reps], float(decay_rate))
+    if decay_sd:
+        trial_decay_rate += rng.normal(size=[n_rates, n_reps]) * decay_sd
+
+    accuracy = np.zeros(n_rates)
+    for i, t in enumerate(speech_times):
+        n_steps = n_rehearsal_steps(t, delay_time)
+        lifetimes = word_lifetime(trial_decay_rate[i]*t, n_steps,
+            init_activ, min_activ)
+        # accuracy as a function of lifetime (ie, of trial decay rate)
+        table, lookup = np.unique(lifetimes, return_inverse=True)
+        table = np.array([count_intact(l, n_steps, n_words) for l in table])
+        accuracy[i] = np.mean(table[lookup] / n_words)
+    return accuracy
@@ -0,0 +1,241 @@
+'''
+Lewandowsky and Farrell, 2014, Chapter 2
+Parameter sweeps of the phonological loop model.
+
+Rather than editing the constants at the top of SLPhonologicalLoop2.py
+and re-running it, give a grid of parameter values. Every combination
+(a "condition") is solved with phonological_loop.solve_noisy() on a
+pool of worker processes, and written as one row of a CSV file as soon
+as it is done. Nothing is plotted, so this runs fine on a cluster node.
+
+Each condition gets its own child of one np.random.SeedSequence, picked
+by its position in the grid. So results do not depend on the number of
+workers or on the order conditions finish in, and a sweep that was
+killed can be resumed by running the same command again: conditions
+already in the file are skipped. The grid, n_reps and seed of a sweep
+are kept next to its CSV file (in <path>.json), and resuming with
+different ones is refused, so results of different sweeps never mix.
+
+Running...
+$ python phonological_sweep.py sweep.csv --n-words 3 5 7 --decay-sd 0 .2 .4
+
+...will solve every combination of the given values (parameters that
+are not given keep their default values) with all available cores.
+
+From python...
+    >>> from phonological_sweep import sweep, load
+    >>> sweep({'n_words': [3, 5, 7], 'decay_sd': [0, .2, .4]}, 'sweep.csv')
+    >>> results = load('sweep.csv')
+'''
+
+from __future__ import division
+import argparse
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+
+import numpy as np
+
+import phonological_loop as pl
+
+
+# parameters that can be swept, with their default values
+DEFAULTS = dict(
+    n_words=[pl.N_WORDS],
+    decay_rate=[pl.DECAY_RATE],
+    decay_sd=[.2],
+    delay_time=[pl.DELAY_TIME],
+    speech_rate=list(np.linspace(1.5, 4, 15)),
+    )
+PARAMS = ('n_words', 'decay_rate', 'decay_sd', 'delay_time', 'speech_rate')
+COLUMNS = ('condition',) + PARAMS + ('n_reps', 'accuracy')
+
+
+def _word_counts(values):
+    '''The n_words values as ints, refusing any that aren't whole.'''
+    counts = [int(v) for v in values]
+    if counts != values:
+        raise ValueError('n_words must be whole numbers, got {}'.format(
+            values))
+    return counts
+
+
+def make_conditions(grid):
+    '''Expand a grid into a list of conditions.
+
+    ARGS
+        grid:       dict mapping parameter names (see PARAMS) to a list
+                    of values; parameters left out keep their defaults
+    RETURNS
+        conditions: list of dicts, one per combination of values,
+                    always in the same order for the same grid
+    '''
+    unknown = set(grid) - set(PARAMS)
+    if unknown:
+        raise ValueError('unknown parameters: {}'.format(sorted(unknown)))
+    values = [np.atleast_1d(grid.get(p, DEFAULTS[p])).tolist() for p in PARAMS]
+    values[PARAMS.index('n_words')] = _word_counts(
+        values[PARAMS.index('n_words')])
+    return [dict(zip(PARAMS, combo)) for combo in itertools.product(*values)]
+
+
+def _config(grid, n_reps, seed):
+    '''Everything that decides the rows of a sweep, for its .json file.'''
+    values = dict((p, np.atleast_1d(grid.get(p, DEFAULTS[p])).tolist())
+        for p in PARAMS)
+    values['n_words'] = _word_counts(values['n_words'])
+    return dict(grid=values, n_reps=int(n_reps), seed=seed)
+
+
+def _check_config(path, config):
+    '''Write the config of a new sweep to <path>.json, or make sure a
+    sweep being resumed has the same one. A seed of None resumes with
+    the entropy the sweep was started with.
+    RETURNS
+        seed:   entropy for the root np.random.SeedSequence
+    '''
+    config_path = path + '.json'
+    if os.path.exists(config_path):
+        with open(config_path) as f:
+            old = json.load(f)
+        if config['seed'] is None:
+            config = dict(config, seed=old['seed'])
+        if old != config:
+            raise ValueError('{} was started with a different grid, n_reps '
+                'or seed (see {}); use another file'.format(path,
+                config_path))
+        return old['seed']
+    if _read_rows(path):
+        raise ValueError('{} has results but no {}, so they cannot be '
+            'checked against this sweep; use another file'.format(path,
+            config_path))
+    if config['seed'] is None:
+        config = dict(config, seed=np.random.SeedSequence().entropy)
+    with open(config_path, 'w') as f:
+        json.dump(config, f, indent=1, sort_keys=True)
+    return config['seed']
+
+
+def run_condition(task):
+    '''Solve a single condition (this is what each worker runs).
+
+    ARGS
+        task:   (condition index, condition dict, n_reps, SeedSequence)
+    RETURNS
+        row:    dict with an entry for each of COLUMNS
+    '''
+    index, condition, n_reps, seed_seq = task
+    rng = np.random.default_rng(seed_seq)
+    accuracy = pl.solve_noisy(1. / condition['speech_rate'],
+        n_reps=n_reps,
+        n_words=condition['n_words'],
+        decay_rate=condition['decay_rate'],
+        decay_sd=condition['decay_sd'],
+        delay_time=condition['delay_time'],
+        rng=rng)
+    row = dict(condition, condition=index, n_reps=n_reps, accuracy=accuracy[0])
+    return row
+
+
+def load(path):
+    '''Read a sweep file into columns.
+
+    ARGS
+        path:       CSV file written by sweep()
+    RETURNS
+        results:    dict mapping each of COLUMNS to an array,
+                    sorted by condition index
+    '''
+    rows = _read_rows(path)
+    rows.sort(key=lambda row: row['condition'])
+    return dict((col, np.array([row[col] for row in rows])) for col in COLUMNS)
+
+
+def _read_rows(path):
+    '''Complete rows already in <path>. A partly written last line
+    (from a killed sweep) is dropped from the file.
+    '''
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r+') as f:
+        text = f.read()
+        if text and not text.endswith('\n'):
+            f.seek(0)
+            f.truncate(text.rfind('\n') + 1)
+    rows = []
+    with open(path) as f:
+        for row in csv.DictReader(f):
+            rows.append(dict((col, float(row[col])) for col in COLUMNS))
+            rows[-1]['condition'] = int(rows[-1]['condition'])
+    return rows
+
+
+def sweep(grid, path, n_reps=pl.N_REPS, seed=0, processes=None, chunksize=1):
+    '''Solve every condition in a parameter grid, in parallel.
+
+    ARGS
+        grid:       dict of parameter values (see make_conditions)
+        path:       CSV file to write one row per condition to;
+                    if it exists, conditions already in it are skipped
+                    (the grid, n_reps and seed go to <path>.json, and
+                    a ValueError is raised if they don't match it)
+        n_reps:     number of simulated lists per condition
+        seed:       entropy for the root np.random.SeedSequence (None
+                    for fresh entropy, or the sweep's own when resuming)
+        processes:  number of worker processes (default: all cores)
+        chunksize:  number of conditions handed to a worker at a time
+    RETURNS
+        n_run:      number of conditions solved by this call
+    '''
+    conditions = make_conditions(grid)
+    seed = _check_config(path, _config(grid, n_reps, seed))
+    seeds = np.random.SeedSequence(seed).spawn(len(conditions))
+    done = set(row['condition'] for row in _read_rows(path))
+    tasks = [(i, cond, n_reps, seeds[i])
+        for i, cond in enumerate(conditions) if i not in done]
+    if not tasks:
+        return 0
+
+    new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+    with open(path, 'a') as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS, lineterminator='\n')
+        if new_file:
+            writer.writeheader()
+        pool = multiprocessing.Pool(processes)
+        try:
+            for row in pool.imap_unordered(run_condition, tasks, chunksize):
+                writer.writerow(row)
+                # so a killed sweep keeps everything finished so far
+                f.flush()
+        finally:
+            pool.terminate()
+            pool.join()
+    return len(tasks)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Sweep the parameters of the phonological loop model.')
+    parser.add_argument('path', help='CSV file to write (or resume)')
+    for p in PARAMS:
+        parser.add_argument('--' + p.replace('_', '-'), nargs='+',
+            type=int if p == 'n_words' else float, metavar='X',
+            help='values of {} (default: {})'.format(p, DEFAULTS[p]))
+    parser.add_argument('--n-reps', type=int, default=pl.N_REPS)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--processes', type=int, default=None,
+        help='number of worker processes (default: all cores)')
+    parser.add_argument('--chunksize', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    grid = dict((p, getattr(args, p)) for p in PARAMS
+        if getattr(args, p) is not None)
+    n_run = sweep(grid, args.path, n_reps=args.n_reps, seed=args.seed,
+        processes=args.processes, chunksize=args.chunksize)
+    print('Solved {} conditions, results in {}'.format(n_run, args.path))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+'''Lewandowsky and Farrell, Chapter 3
+
+Headless, batched version of the functions in parameter_estimation.py:
+    - getregpred
+    - bof
+    - wrapper4fmin
+
+In parameter_estimation.py every evaluation of bof() redraws the plot,
+pauses and prints. Here the discrepancy function does nothing but
+compute, and it takes a whole batch of candidate parameter sets at
+once: parms is (n_params x n_candidates) and bof() returns one RMSD per
+column, computed in a single matrix product. A single parameter vector
+works too, and gives back a single RMSD.
+
+Plotting and printing are moved into progress callbacks, which are only
+called if you ask for them:
+
+    >>> from batch_estimation import wrapper4fmin, show_progress
+    >>> x, fVal = wrapper4fmin([-1., .2], data)                 # quiet
+    >>> x, fVal = wrapper4fmin([-1., .2], data, show_progress)  # like the script
+
+data has the same layout as in the scripts: column 0 holds the
+dependent variable (y) and column 1 the predictor (x).
+'''
+
+from __future__ import division
+import numpy as np
+import scipy.optimize
+
+
+def getregpred(parms, data):
+    '''get REGression prediction for a batch of parameter sets
+    ARGS
+        parms:  array (2,) or (2, n_candidates) holding slope (b1)
+                and intercept (b0), in that order (as in the scripts)
+        data:   array (n_data_pts, 2), y in column 0 and x in column 1
+    RETURNS
+        preds:  predictions, (n_data_pts,) or (n_data_pts, n_candidates)
+    '''
+    design = np.column_stack([data[:, 1], np.ones(len(data))])
+    return np.dot(design, np.asarray(parms, dtype=float))
+
+
+def bof(parms, data):
+    '''The discrepancy function (RMSD) for a batch of parameter sets.
+    ARGS
+        parms:  array (2,) or (2, n_candidates), see getregpred
+        data:   array (n_data_pts, 2), y in column 0 and x in column 1
+    RETURNS
+        rmsd:   the RMSD of each candidate, scalar or (n_candidates,)
+    '''
+    predictions = getregpred(parms, data)
+    y = data[:, 0].reshape((-1,) + (1,)*(predictions.ndim-1))
+    sd = (predictions - y)**2
+    return np.sqrt(np.mean(sd, axis=0))
+
+
+def wrapper4fmin(pArray, data, callback=None, **fmin_kwargs):
+    '''Estimate the parameters with fmin, from starting parameters pArray.
+    ARGS
+        pArray:         starting parameters (b1, b0)
+        data:           array (n_data_pts, 2), y in column 0 and x in column 1
+        callback:       optional progress hook, called as
+                        callback(parms, rmsd, data) after each evaluation
+                        (eg, show_progress to get the script's behaviour)
+        fmin_kwargs:    passed on to scipy.optimize.fmin
+    RETURNS
+        x:              best fitting parameters
+        fVal:           RMSD at x
+    '''
+    def objective(parms):
+        rmsd = bof(parms, data)
+        if callback is not None:
+            callback(parms, rmsd, data)
+        return rmsd
+
+    fmin_kwargs.setdefault('disp', callback is not None)
+    x, fVal = scipy.optimize.fmin(func=objective, x0=pArray,
+        full_output=True, **fmin_kwargs)[:2]
+    return x, fVal
+
+
+## progress hooks
+
+def print_progress(parms, rmsd, data):
+    '''Print the current parameters and RMSD.
+    '''
+    print('Parameters (x,y): ({:.04f},{:.04f})'.format(parms[0], parms[1]))
+    print('RMSD: {:.05f}'.format(rmsd))
+
+
+def plot_progress(parms, rmsd, data, pause=.5):
+    '''Plot current predictions and data (as getregpred does in the script).
+    '''
+    import matplotlib.pyplot as plt
+    preds = getregpred(parms, data)
+    plt.cla()
+    plt.plot(data[:,1], data[:,0], 'o', color=[0.4, 0.4, 0.4], markeredgecolor='black')
+    plt.plot(data[:,1], preds, linestyle='--')
+    plt.xlim([-2, 2])
+    plt.ylim([-2, 2])
+    plt.xlabel('X', fontsize=18)
+    plt.ylabel('Y', fontsize=18)
+    plt.xticks([-2,2])
+    plt.yticks([-2,2])
+    plt.pause(pause)
+
+
+def show_progress(parms, rmsd, data):
+    '''Plot and print, like parameter_estimation.py does.
+    '''
+    plot_progress(parms, rmsd, data)
+    print_progress(parms, rmsd, data)
@@ -0,0 +1,140 @@
+'''Lewandowsky and Farrell, Chapter 3
+
+Multi-start front-end for parameter estimation.
+
+wrapper4fmin (in parameter_estimation.py) runs a single simplex search
+from one hand-picked set of starting parameters, and can easily get
+stuck in a local minimum. multistart() instead spreads many starting
+points over the parameter bounds (Latin hypercube or Sobol), runs a
+bounded Nelder-Mead search from each of them on a pool of worker
+processes, and stops early once enough searches agree on the best
+minimum found so far.
+
+    >>> from multistart import multistart
+    >>> best, runs = multistart(bof, bounds=[(-5, 5), (-5, 5)], args=(data,))
+    >>> best['x'], best['fun']
+
+The objective (and anything in args) is sent to the worker processes,
+so it has to be picklable, ie defined at the top level of a module.
+Use processes=1 to run the searches one after another in this process,
+which works with any callable.
+'''
+
+from __future__ import division
+import multiprocessing
+import warnings
+
+import numpy as np
+import scipy.optimize
+from scipy.stats import qmc
+
+
+def start_points(bounds, n_starts, method='lhs', seed=None):
+    '''Spread starting points over the parameter bounds.
+    ARGS
+        bounds:     sequence of (lower, upper) pairs, one per parameter
+                    (must be finite)
+        n_starts:   number of starting points
+        method:     'lhs' (Latin hypercube) or 'sobol'
+        seed:       seed for the (scrambled) sampler
+    RETURNS
+        starts:     array (n_starts, n_params)
+    '''
+    bounds = np.asarray(bounds, dtype=float)
+    if not np.all(np.isfinite(bounds)):
+        raise ValueError('start points need finite bounds')
+    if method == 'lhs':
+        sampler = qmc.LatinHypercube(len(bounds), seed=seed)
+    elif method == 'sobol':
+        sampler = qmc.Sobol(len(bounds), seed=seed)
+    else:
+        raise ValueError('unknown method: {}'.format(method))
+    with warnings.catch_warnings():
+        # Sobol prefers powers of 2, but any number of starts is fine here
+        warnings.simplefilter('ignore', UserWarning)
+        sample = sampler.random(n_starts)
+    return qmc.scale(sample, bounds[:, 0], bounds[:, 1])
+
+
+def local_search(objective, x0, bounds=None, args=(), options=None):
+    '''A single bounded Nelder-Mead search.
+    ARGS
+        objective:  function to minimize, called as objective(x, *args)
+        x0:         starting parameters
+        bounds:     sequence of (lower, upper) pairs (or None)
+        args:       extra arguments passed to the objective
+        options:    options for scipy.optimize.minimize
+    RETURNS
+        run:        dict with the starting point (start), best parameters
+                    (x), objective value (fun), number of evaluations
+                    (nfev) and iterations (nit), success flag (success)
+                    and the best point of each iteration (trajectory)
+    '''
+    trajectory = [np.array(x0, dtype=float)]
+    res = scipy.optimize.minimize(objective, x0, args=args,
+        method='Nelder-Mead', bounds=bounds, options=options,
+        callback=lambda xk: trajectory.append(np.copy(xk)))
+    return dict(start=trajectory[0], x=res.x, fun=float(res.fun),
+        nfev=res.nfev, nit=res.nit, success=res.success,
+        trajectory=np.array(trajectory))
+
+
+def _run_task(task):
+    '''Unpack a task for the worker pool.
+    '''
+    index, objective, x0, bounds, args, options = task
+    run = local_search(objective, x0, bounds, args, options)
+    run['index'] = index
+    return run
+
+
+def multistart(objective, bounds, n_starts=20, method='lhs', args=(),
+    n_agree=None, tol=1e-6, processes=None, seed=None, options=None):
+    '''Minimize an objective from many starting points in parallel.
+    ARGS
+        objective:  function to minimize, called as objective(x, *args)
+        bounds:     sequence of (lower, upper) pairs, one per parameter
+        n_starts:   number of starting points (and local searches)
+        method:     how to spread the starts, 'lhs' or 'sobol'
+        args:       extra arguments passed to the objective (eg, data)
+        n_agree:    stop once this many searches have found the best
+                    minimum so far (within tol); None runs them all
+        tol:        how close two minima have to be to agree
+        processes:  number of worker processes (default: all cores)
+        seed:       seed for the starting points
+        options:    options for scipy.optimize.minimize (eg, maxfev)
+    RETURNS
+        best:       the run with the lowest objective value
+        runs:       all completed runs (see local_search), sorted from
+                    best to worst; each also has its start index
+    '''
+    starts = start_points(bounds, n_starts, method, seed)
+    tasks = [(i, objective, x0, bounds, args, options)
+        for i, x0 in enumerate(starts)]
+
+    runs = []
+    def done():
+        if n_agree is None:
+            return False
+        best = min(run['fun'] for run in runs)
+        return sum(run['fun'] <= best + tol for run in runs) >= n_agree
+
+    if processes == 1:
+        for task in tasks:
+            runs.append(_run_task(task))
+            if done():
+                break
+    else:
+        pool = multiprocessing.Pool(processes)
+        try:
+            for run in pool.imap_unordered(_run_task, tasks):
+                runs.append(run)
+                if done():
+                    break
+        finally:
+            # drop any searches still running
+            pool.terminate()
+            pool.join()
+
+    runs.sort(key=lambda run: run['fun'])
+    return runs[0], runs
@@ -24,6 +24,8 @@ import numpy as np
 import scipy.optimize
 import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D
+from batch_estimation import bof as batch_bof
+from surface import evaluate_surface
 plt.ion()
 
 def getregpred(parms,data):
@@ -109,14 +111,10 @@ b = np.linalg.lstsq(X,y)[0]
 b0_list = np.linspace(-5,5,50)
 b1_list = np.linspace(-5,5,50)
 def make_surface():
-    # one time
-    surface = np.empty([50,50])
-    for i, b0 in enumerate(b0_list):
-        for j, b1 in enumerate(b1_list):
-            predictions = b0 + b1*data[:,1]
-            sd = (predictions-data[:,0])**2
-            rmsd = np.sqrt(np.sum(sd)/sd.size)
-            surface[i,j] = rmsd
+    # one time, evaluating the whole grid in batches
+    # (batch_bof takes b1 first, but b0 runs along the rows here)
+    surface = evaluate_surface(lambda parms: batch_bof(parms[::-1], data),
+        [b0_list, b1_list], point_bytes=8*len(data))[0]
     return surface
 
 def draw_surface(surface):
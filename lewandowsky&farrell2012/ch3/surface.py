@@ -0,0 +1,95 @@
+'''Lewandowsky and Farrell, Chapter 3
+
+Evaluating a discrepancy (or likelihood) function over a grid of
+parameter values, as done for the surface plots in
+parameter_estimation3d.py (make_surface) and ch4/LSurfaceL.py.
+
+Instead of a nested loop with one function call per grid cell, the grid
+is walked in chunks: each chunk of grid points is handed to the function
+as a single (n_params x n_points) batch (the same layout bof() uses in
+batch_estimation.py), which it broadcasts against the data. Chunks are
+sized to stay within a memory budget, so the full
+(grid points x data points) array never exists, and grids can be large
+(1000x1000) or have more than 2 dimensions.
+
+    >>> from surface import evaluate_surface
+    >>> surface, argmin, best = evaluate_surface(
+    ...     lambda parms: bof(parms, data), [b1_list, b0_list],
+    ...     point_bytes=8*len(data))
+
+With path='surface.npy' the surface is written to a memory-mapped .npy
+file as it is computed, and plotting code can reload it with
+load_surface() rather than computing it again.
+'''
+
+from __future__ import division
+import numpy as np
+
+
+# default memory budget (in bytes) for the temporaries of one chunk
+MEMORY = 2**27
+
+
+def evaluate_surface(func, axes, point_bytes=8*1024, memory=MEMORY,
+    path=None, dtype=float):
+    '''Evaluate func on every point of the grid spanned by axes.
+    ARGS
+        func:           function taking an (n_params x n_points) array of
+                        parameter values and returning n_points values
+        axes:           sequence of n_params vectors, the values of each
+                        parameter along its grid dimension
+        point_bytes:    (rough) memory func needs per grid point, eg
+                        8*len(data) when it builds an (n_data x n_points)
+                        array of predictions
+        memory:         memory budget for a chunk, in bytes
+        path:           if given, write the surface to this .npy file
+                        (memory-mapped) instead of keeping it in memory
+        dtype:          dtype of the surface
+    RETURNS
+        surface:        array with one dimension per axis, so that
+                        surface[i,j] = func at (axes[0][i], axes[1][j])
+        argmin:         index (tuple) of the smallest value in surface
+        best:           parameter values at argmin
+    '''
+    axes = [np.asarray(ax, dtype=float) for ax in axes]
+    shape = tuple(len(ax) for ax in axes)
+    n_points = int(np.prod(shape))
+    chunk = int(max(1, memory // point_bytes))
+
+    if path is None:
+        surface = np.empty(shape, dtype=dtype)
+    else:
+        surface = np.lib.format.open_memmap(path, mode='w+',
+            dtype=dtype, shape=shape)
+    flat = surface.reshape(-1)
+
+    best_value = np.inf
+    best_flat = 0
+    for start in range(0, n_points, chunk):
+        stop = min(start + chunk, n_points)
+        # parameter values of the grid points in this chunk
+        index = np.unravel_index(np.arange(start, stop), shape)
+        parms = np.array([ax[i] for ax, i in zip(axes, index)])
+        values = func(parms)
+        flat[start:stop] = values
+
+        # keep track of the minimum as we go
+        with np.errstate(invalid='ignore'):
+            if not np.all(np.isnan(values)):
+                i = np.nanargmin(values)
+                if values[i] < best_value:
+                    best_value = values[i]
+                    best_flat = start + i
+
+    if path is not None:
+        surface.flush()
+    argmin = tuple(int(i) for i in np.unravel_index(best_flat, shape))
+    best = np.array([ax[i] for ax, i in zip(axes, argmin)])
+    return surface, argmin, best
+
+
+def load_surface(path):
+    '''Reload a surface written by evaluate_surface(..., path=path),
+    memory-mapped (read only) so large surfaces are not read in full.
+    '''
+    return np.load(path, mmap_mode='r')
@@ -19,6 +19,8 @@ doesnt give warnings, so plots look the same.
 '''
 
 from __future__ import division
+import os
+import sys
 import numpy as np
 from scipy import stats
 from scipy import special
@@ -26,6 +28,11 @@ import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D
 plt.ion()
 
+# the surface evaluation utility lives in ch3
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    os.pardir, 'ch3'))
+from surface import evaluate_surface
+
 
 # pick range and resolution of points along each dimension (ie, each parameter)
 pmin = 0
@@ -56,20 +63,24 @@ def exGaussPDF(y, mu, sigma, tau):
 
 ## create likelihood and log-likelihood surfaces
 
-# empties to fill
-likeli_surf = np.empty([n_samples,n_samples])
-loglikeli_surf = np.empty([n_samples,n_samples])
-
-# nested loops to try each combination of parameters mu and tau
-for i, mu in enumerate(mu_list):
-    for j, tau in enumerate(tau_list):
-        # get a density for each RT
-        densities = exGaussPDF(rt, mu, .1, tau)
-        ## here calculate _joint_ likelihoods
-        # likelihood is the product of each independent density
-        likeli_surf[i,j] = np.prod(densities)
-        # after taking the log of _anything_, *products* become *sums*
-        loglikeli_surf[i,j] = np.sum(np.log(densities))
+def loglikelihood(parms):
+    '''Joint log-likelihood of the RTs for a batch of parameter pairs.
+    ARGS
+        parms:  array (2 x n_points), mu in row 0 and tau in row 1
+    RETURNS
+        lnL:    vector (n_points) of summed log densities
+    '''
+    # get a density for each RT (rows) and parameter pair (columns)
+    densities = exGaussPDF(rt[:,None], parms[0], .1, parms[1])
+    # after taking the log of _anything_, *products* become *sums*
+    return np.sum(np.log(densities), axis=0)
+
+# try each combination of parameters mu and tau
+loglikeli_surf = evaluate_surface(loglikelihood, [mu_list, tau_list],
+    point_bytes=8*len(rt))[0]
+## here calculate _joint_ likelihoods
+# likelihood is the product of each independent density
+likeli_surf = np.exp(loglikeli_surf)
 
 
 
@@ -17,13 +17,13 @@ def SIMPLEmultinomLnL(c, alpha, presTime, recTime, J, k):
         lnL: the predicted proportion of correct responses at each position
     '''
 
-    lnL = np.zeros([1,J])
-    Ti = np.cumsum(np.repmat(presTime,1,J))
-    Tr = Ti[-1] + np.cumsum(np.repmat(recTime,1,J))
+    lnL = np.zeros(J)
+    Ti = np.cumsum(np.repeat(presTime,J))
+    Tr = Ti[-1] + np.cumsum(np.repeat(recTime,J))
 
     for i in range(J): # i indexes output + probe position
         M = np.log(Tr[i]-Ti)
-        eta = np.exp(-c*abs(M(i)-M)**alpha)
+        eta = np.exp(-c*abs(M[i]-M)**alpha)
         pall = eta/sum(eta)
         lnL[i] = sum(k[i,:] * np.log(pall))
 
@@ -16,13 +16,13 @@ There are 3 SIMPLE models below, each with their own "thing".
 
 from __future__ import division
 import numpy as np
-import scipy.misc
+import scipy.special
 
 
 
 def binomPMF(k, N, p):
     # could also use scipy.stats.binom()
-    pMass = scipy.misc.comb(N,k) * p**k * (1-p)**(N-k)
+    pMass = scipy.special.comb(N,k) * p**k * (1-p)**(N-k)
     return pMass
 
 
@@ -110,13 +110,13 @@ def SIMPLEmultinomLnL(c, alpha, presTime, recTime, J, k):
         lnL:        
     '''
 
-    lnL = np.zeros([1,J])
-    Ti = np.cumsum(np.repmat(presTime,1,J))
-    Tr = Ti[-1] + np.cumsum(np.repmat(recTime,1,J))
+    lnL = np.zeros(J)
+    Ti = np.cumsum(np.repeat(presTime,J))
+    Tr = Ti[-1] + np.cumsum(np.repeat(recTime,J))
 
     for i in range(J): # i indexes output + probe position
         M = np.log(Tr[i]-Ti)
-        eta = np.exp(-c*abs(M(i)-M)**alpha)
+        eta = np.exp(-c*abs(M[i]-M)**alpha)
         pall = eta/sum(eta)
         lnL[i] = sum(k[i,:] * np.log(pall))
 
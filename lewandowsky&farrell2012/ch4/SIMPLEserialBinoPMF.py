@@ -1,13 +1,13 @@
 
 from __future__ import division
 import numpy as np
-import scipy.misc
+import scipy.special
 
 
 
 def binomPMF(k, N, p):
     # could also use scipy.stats.binom()
-    pMass = scipy.misc.comb(N,k) * p**k * (1-p)**(N-k);
+    pMass = scipy.special.comb(N,k) * p**k * (1-p)**(N-k);
     return pMass
 
 def SIMPLEserialBinoPMF(c, presTime, recTime, J, Nc, N):
@@ -20,7 +20,7 @@ def SIMPLEserialBinoPMF(c, presTime, recTime, J, Nc, N):
         Nc: number of words correctly recalled at each position
         N: number of trials at each position
     RETURNS
-        pcor: the predicted proportion of correct responses at each position
+        pmf: the binomial probability of Nc at each position
     '''
 
     # presentation times (for each word)
@@ -41,4 +41,4 @@ def SIMPLEserialBinoPMF(c, presTime, recTime, J, Nc, N):
         pcor = (1./sum(eta))
         pmf.append(binomPMF(Nc[i], N, pcor))
 
-    return pcor
\ No newline at end of file
+    return pmf
\ No newline at end of file
@@ -0,0 +1,270 @@
+'''Lewandowsky and Farrell, Chapter 4
+
+Adaptive exploration of a (log) likelihood surface.
+
+LSurfaceL.py samples the ex-Gaussian surface on a uniform 50x50 grid.
+Most of those evaluations land where the surface is flat (or hopelessly
+far from the best fit), and the likelihood itself underflows to 0
+almost everywhere. Here the parameter space is instead cut into cells
+that are split in half along every dimension (a quadtree for 2
+parameters, an octree for 3, ...) only where the log-likelihood changes
+quickly (high gradient) or bends (high curvature), and only in the part
+of the space that is within reach of the best fit. So we get sub-grid
+resolution around the MLE for far fewer evaluations.
+
+Everything is done on the log-likelihood. The likelihood view is
+computed from it with log-sum-exp, so it is scaled relative to the
+grid rather than underflowing.
+
+All evaluations are cached on the AdaptiveSurface, so the different
+views (likelihood, log-likelihood, negative log-likelihood, zoomed or
+not) are all made from the same set of points without recomputing.
+
+    >>> surf = AdaptiveSurface(loglik, bounds=[(0, 5), (.01, 5)])
+    >>> surf.refine()
+    >>> mu, tau, ll = surf.grid(200, view='loglik')
+    >>> surf.n_evals, surf.mle()
+
+Running...
+$ python adaptive_surface.py
+
+...will explore the ex-Gaussian surface from LSurfaceL.py and plot it.
+'''
+
+from __future__ import division
+import itertools
+
+import numpy as np
+from scipy import interpolate
+from scipy import special
+
+import exgauss
+
+
+class AdaptiveSurface(object):
+    '''Quadtree/octree explorer of a log-likelihood surface.
+
+    ARGS
+        loglik:     function taking an (n_params x n_points) array of
+                    parameter values and returning n_points
+                    log-likelihoods (non-finite values are allowed,
+                    eg for illegal parameters)
+        bounds:     sequence of (lower, upper) pairs, one per parameter
+        n_init:     number of cells per dimension to start from
+        max_depth:  maximum number of times a cell can be split
+        tol:        split a cell if the log-likelihood varies by more
+                    than this across its corners (gradient), or its
+                    center is more than this away from the mean of its
+                    corners (curvature)
+        span:       only split cells that reach within this many
+                    log-likelihood units of the best point found so far
+    '''
+
+    def __init__(self, loglik, bounds, n_init=8, max_depth=5, tol=1.,
+        span=10.):
+        self.loglik = loglik
+        self.bounds = np.asarray(bounds, dtype=float)
+        self.n_dims = len(self.bounds)
+        self.n_init = n_init
+        self.max_depth = max_depth
+        self.tol = tol
+        self.span = span
+
+        # points live on an integer lattice fine enough for the deepest cells
+        self.resolution = n_init * 2**max_depth
+        # offsets of the corners of a unit cell
+        self._corners = np.array(list(itertools.product([0, 1],
+            repeat=self.n_dims)))
+        self._cache = {}
+        self._grids = {}
+        self.leaves = []
+
+    @property
+    def n_evals(self):
+        '''Number of times the log-likelihood was evaluated.'''
+        return len(self._cache)
+
+    def to_params(self, lattice):
+        '''Parameter values (n_points x n_params) of lattice points.'''
+        lo, hi = self.bounds[:, 0], self.bounds[:, 1]
+        return lo + (hi - lo) * np.asarray(lattice) / self.resolution
+
+    def _evaluate(self, lattice):
+        '''Log-likelihood of lattice points (n_points x n_params),
+        evaluating the ones not in the cache as a single batch.
+        '''
+        keys = [tuple(p) for p in lattice]
+        new = sorted(set(k for k in keys if k not in self._cache))
+        if new:
+            with np.errstate(all='ignore'):
+                values = self.loglik(self.to_params(new).T)
+            self._cache.update(zip(new, np.asarray(values, dtype=float)))
+        return np.array([self._cache[k] for k in keys])
+
+    def refine(self):
+        '''Explore the surface, splitting cells until they are flat
+        enough or max_depth is reached. Leaf cells are kept in leaves,
+        as (lower corner, size) on the lattice.
+        '''
+        size = 2**self.max_depth
+        active = [(np.array(corner) * size, size) for corner in
+            itertools.product(range(self.n_init), repeat=self.n_dims)]
+        leaves = []
+
+        while active:
+            corners = np.array([c + s*self._corners for c, s in active])
+            values = self._evaluate(corners.reshape(-1, self.n_dims))
+            values = values.reshape(len(active), -1)
+            splittable = active[0][1] > 1
+            if splittable:
+                centers = np.array([c + s//2 for c, s in active])
+                center_values = self._evaluate(centers)
+
+            cached = np.array(list(self._cache.values()))
+            best = np.max(cached[np.isfinite(cached)], initial=-np.inf)
+
+            next_active = []
+            for n, (corner, size_) in enumerate(active):
+                if splittable and self._needs_split(values[n],
+                    center_values[n], best):
+                    half = size_ // 2
+                    next_active.extend((corner + half*offset, half)
+                        for offset in self._corners)
+                else:
+                    leaves.append((corner, size_))
+            active = next_active
+
+        self.leaves = leaves
+        self._grids = {}
+        return self
+
+    def _needs_split(self, corner_values, center_value, best):
+        '''Decide whether a cell is worth splitting.
+        '''
+        values = np.append(corner_values, center_value)
+        finite = np.isfinite(values)
+        if not finite.any():
+            return False
+        if not finite.all():
+            # edge of the legal parameter space
+            return True
+        if values.max() < best - self.span:
+            # nowhere near the best fit
+            return False
+        gradient = corner_values.max() - corner_values.min()
+        curvature = abs(center_value - corner_values.mean())
+        return gradient > self.tol or curvature > self.tol
+
+    def points(self):
+        '''All evaluated points.
+        RETURNS
+            params:     array (n_evals x n_params) of parameter values
+            lnL:        vector (n_evals) of log-likelihoods
+        '''
+        lattice = np.array(list(self._cache.keys())).reshape(-1, self.n_dims)
+        return self.to_params(lattice), np.array(list(self._cache.values()))
+
+    def mle(self):
+        '''Parameters and log-likelihood of the best point evaluated.'''
+        params, lnL = self.points()
+        i = np.nanargmax(np.where(np.isfinite(lnL), lnL, np.nan))
+        return params[i], lnL[i]
+
+    def grid(self, n=50, view='loglik', bounds=None):
+        '''Interpolate the cached points onto a regular grid for plotting.
+        ARGS
+            n:          number of grid points per dimension
+            view:       'loglik', 'nll' (negative log-likelihood) or
+                        'likelihood' (scaled to sum to 1 over the grid)
+            bounds:     part of the space to show (default: all of it)
+        RETURNS
+            axes + [surface]:   one vector per parameter, then the
+                                surface with surface[i,j] at
+                                (axes[0][i], axes[1][j])
+        '''
+        bounds = self.bounds if bounds is None else np.asarray(bounds, float)
+        key = (n, bounds.tobytes())
+        if key not in self._grids:
+            axes = [np.linspace(lo, hi, n) for lo, hi in bounds]
+            mesh = np.meshgrid(*axes, indexing='ij')
+            params, lnL = self.points()
+            finite = np.isfinite(lnL)
+            # scale each dimension to [0, 1] so cells are not squashed
+            lo, hi = self.bounds[:, 0], self.bounds[:, 1]
+            query = np.column_stack([m.ravel() for m in mesh])
+            surface = interpolate.griddata((params[finite] - lo) / (hi - lo),
+                lnL[finite], (query - lo) / (hi - lo), method='linear')
+            self._grids[key] = (axes, surface.reshape(mesh[0].shape))
+        axes, lnL = self._grids[key]
+
+        if view == 'loglik':
+            surface = lnL
+        elif view == 'nll':
+            surface = -lnL
+        elif view == 'likelihood':
+            finite = np.isfinite(lnL)
+            surface = np.zeros_like(lnL)
+            surface[finite] = np.exp(lnL[finite] - special.logsumexp(lnL[finite]))
+        else:
+            raise ValueError('unknown view: {}'.format(view))
+        return axes + [surface]
+
+
+def exgauss_loglik(rt, sigma=.1):
+    '''Log-likelihood of the RTs for (mu, tau) pairs, with sigma fixed
+    as in LSurfaceL.py. Returns a function of a (2 x n_points)
+    parameter array, for AdaptiveSurface.
+    '''
+    def loglik(parms):
+        mu, tau = parms
+        return exgauss.loglik([mu, np.full_like(mu, sigma), tau], rt)
+    return loglik
+
+
+if __name__ == '__main__':
+
+    import matplotlib.pyplot as plt
+    from mpl_toolkits.mplot3d import Axes3D
+    plt.ion()
+
+    # same fake response time data as LSurfaceL.py
+    rt = np.array([3,4,4,4,4,5,5,6,6,7,8,9])
+
+    surf = AdaptiveSurface(exgauss_loglik(rt), bounds=[(0, 5), (0, 5)])
+    surf.refine()
+    (mu, tau), lnL = surf.mle()
+    print('{} evaluations (uniform grid at the finest resolution: {})'.format(
+        surf.n_evals, (surf.resolution+1)**2))
+    print('MLE: mu={:.03f}, tau={:.03f}, lnL={:.03f}'.format(mu, tau, lnL))
+
+    def plot(view, title, zlabel, zlim=None):
+        mu_list, tau_list, surface = surf.grid(100, view=view)
+        fig = plt.figure()
+        ax = fig.add_subplot(projection='3d')
+        X, Y = np.meshgrid(mu_list, tau_list, indexing='ij')
+        ax.plot_surface(X, Y, surface, alpha=0, linewidth=0.5, edgecolors='k')
+        ax.set_xlabel(r'$\mu$ (s)')
+        ax.set_ylabel(r'$\tau$ (s)')
+        ax.set_zlabel(zlabel, fontsize=14)
+        if zlim is not None:
+            ax.set_zlim(*zlim)
+        ax.set_title(title)
+        ax.invert_xaxis() # just to make it look more similar to textbook fig4.9
+        return ax
+
+    # all of these reuse the same cached evaluations
+    axl = plot('likelihood', 'likelihood surface', r'$L(y|\theta)$')
+    axll = plot('loglik', 'log-likelihood surface', r'$ln L(y|\theta)$')
+    axnll = plot('nll', 'negative log-likelihood surface', r'$-ln L(y|\theta)$')
+    zoom_axll = plot('loglik', 'log-likelihood surface', r'$ln L(y|\theta)$',
+        zlim=(-30, -20))
+    zoom_axnll = plot('nll', 'negative log-likelihood surface',
+        r'$-ln L(y|\theta)$', zlim=(20, 30))
+
+    # where the evaluations went
+    params, lnL = surf.points()
+    plt.figure()
+    plt.scatter(params[:,0], params[:,1], s=2, c='k')
+    plt.xlabel(r'$\mu$ (s)')
+    plt.ylabel(r'$\tau$ (s)')
+    plt.title('adaptively sampled points')
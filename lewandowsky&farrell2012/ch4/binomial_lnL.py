@@ -0,0 +1,110 @@
+'''Lewandowsky and Farrell, Chapter 4
+
+Log-space binomial and multinomial likelihoods for fitting SIMPLE
+(and other models that predict response probabilities).
+
+binomPMF (in SIMPLEserial.py) multiplies a binomial coefficient by
+p**k * (1-p)**(N-k), which underflows for realistic numbers of trials.
+Here everything stays in log space, and the log-likelihood is split
+into the part that only depends on the data,
+
+    ln C(N,k) = gammaln(N+1) - gammaln(k+1) - gammaln(N-k+1)
+
+and the part that depends on the model's predictions,
+
+    k . ln(p) + (N-k) . ln(1-p)
+
+The data part is computed once, when the data object is made, so each
+evaluation during a fit only costs two dot products. Several
+participants (or simulated datasets) can be stacked in one object, and
+a batch of predictions is then scored against all of them at once:
+
+    >>> data = BinomialData(Nc, N)          # Nc: (n_datasets x J)
+    >>> pcor = simple_pcor(c, 1, 2, 5)      # (n_candidates x J)
+    >>> lnL = data.loglik(pcor)             # (n_candidates x n_datasets)
+
+Predicted probabilities are kept just above 0 (the smallest normal float)
+and at most 1-eps (as SIMPLEfreeBino does in ch5), so a prediction of
+exactly 0 or 1 cannot give log(0), or 0*log(0) for unobserved responses.
+'''
+
+from __future__ import division
+import numpy as np
+from scipy import special
+
+
+EPS = np.finfo(float).eps
+TINY = np.finfo(float).tiny
+
+
+class BinomialData(object):
+    '''Binomial response data, eg number correct at each list position.
+
+    ARGS
+        k:  number of "successes", array (J,) for a single dataset or
+            (n_datasets, J) for many
+        N:  number of trials, scalar or broadcastable against k
+    '''
+
+    def __init__(self, k, N):
+        self.k = np.asarray(k, dtype=float)
+        self.N = np.broadcast_to(np.asarray(N, dtype=float), self.k.shape)
+        self.n_k = self.N - self.k
+        # the data-dependent part, summed over positions
+        self.log_coef = special.gammaln(self.N + 1) \
+            - special.gammaln(self.k + 1) - special.gammaln(self.n_k + 1)
+        self.const = np.sum(self.log_coef, axis=-1)
+
+    def loglik(self, p):
+        '''Summed log-likelihood of the data for a batch of predictions.
+        ARGS
+            p:      predicted probabilities, array (..., J)
+        RETURNS
+            lnL:    array (...) for a single dataset,
+                    or (..., n_datasets) for many
+        '''
+        p = np.clip(p, TINY, 1 - EPS)
+        return np.dot(np.log(p), self.k.T) + np.dot(np.log1p(-p), self.n_k.T) \
+            + self.const
+
+    def logpmf(self, p):
+        '''Log probability mass at each position (the log of binomPMF),
+        for predictions p broadcast against the data.
+        '''
+        p = np.clip(p, TINY, 1 - EPS)
+        return self.log_coef + self.k*np.log(p) + self.n_k*np.log1p(-p)
+
+
+class MultinomialData(object):
+    '''Multinomial response data, eg the number of times each item was
+    recalled at each output position (k in SIMPLEmultinomLnL).
+
+    ARGS
+        k:  counts, array (J, K) for a single dataset, with one row per
+            output position and one column per response category,
+            or (n_datasets, J, K) for many
+    '''
+
+    def __init__(self, k):
+        self.k = np.asarray(k, dtype=float)
+        n = np.sum(self.k, axis=-1)
+        # the data-dependent part, summed over positions
+        self.const = np.sum(special.gammaln(n + 1)
+            - np.sum(special.gammaln(self.k + 1), axis=-1), axis=-1)
+        # counts flattened over positions and categories, for a dot product
+        self._flat = self.k.reshape(self.k.shape[:-2] + (-1,))
+
+    def loglik(self, p, log=False):
+        '''Summed log-likelihood of the data for a batch of predictions.
+        ARGS
+            p:      predicted probabilities, array (..., J, K)
+            log:    if True, p already holds log probabilities (eg from
+                    simple_kernel.log_simple_probs)
+        RETURNS
+            lnL:    array (...) for a single dataset,
+                    or (..., n_datasets) for many
+        '''
+        lnp = np.asarray(p, dtype=float) if log else np.log(p)
+        lnp = np.clip(lnp, np.log(TINY), 0)
+        lnp = lnp.reshape(lnp.shape[:-2] + (-1,))
+        return np.dot(lnp, self._flat.T) + self.const
@@ -0,0 +1,247 @@
+'''Lewandowsky and Farrell, Chapter 4
+
+Numerically stable ex-Gaussian distribution.
+
+exGaussPDF (in LSurfaceL.py) multiplies exp(...) by (1+erf(...)), which
+overflows or gives 0*inf for small tau, and its log then has to be taken
+by the caller. Here the log density is computed directly:
+
+    ln f(y) = -ln(tau) + (mu-y)/tau + sigma^2/(2 tau^2) + ln Phi(z)
+    z       = (y-mu)/sigma - sigma/tau
+
+with ln Phi from scipy.special.log_ndtr, which is accurate far into the
+tails. For z < 0 (which small tau always gives) the first terms and
+ln Phi(z) are large and of opposite sign, and cancel; there the scaled
+form is used instead,
+
+    ln f(y) = -ln(tau) - (y-mu)^2/(2 sigma^2) + ln(erfcx(-z/sqrt(2))/2)
+
+whose terms stay of the size of the result. The gradient is written
+in terms of h = phi(z)/Phi(z) + z and 1 + z*h, which far into the lower
+tail come from a continued fraction rather than as differences of
+nearly equal numbers, so it stays accurate as tau goes to 0 too.
+
+All functions broadcast their arguments against each other, so the
+parameters can be whole batches. For a population of candidate
+parameter sets, give them a trailing axis of length 1 so they broadcast
+against the RT vector:
+
+    >>> mu, sigma, tau = np.random.uniform(1, 3, size=[3, 1000, 1])
+    >>> lnL = logpdf(rt, mu, sigma, tau).sum(axis=-1)   # 1000 values
+
+or use loglik(), which takes parameters as (3 x n_candidates), the same
+layout as the batched discrepancy functions in ch3. Illegal parameters
+(sigma or tau not positive) get a log density of -inf.
+
+Running...
+$ python exgauss.py
+
+...will check logpdf against scipy.stats.exponnorm, and against the
+ex-Gaussian convolution integrated numerically for tau/sigma down to
+1e-12 (where exponnorm itself cancels), and grad_logpdf against finite
+differences.
+'''
+
+from __future__ import division
+import numpy as np
+import scipy.optimize
+from scipy import special
+
+
+def _z(y, mu, sigma, tau):
+    return (y - mu)/sigma - sigma/tau
+
+
+def _legal(sigma, tau):
+    return (sigma > 0) & (tau > 0)
+
+
+# below z = -CF_FROM, _mills uses CF_TERMS terms of the continued fraction
+CF_FROM = 4.
+CF_TERMS = 40
+
+
+def _mills(z):
+    '''h = phi(z)/Phi(z) + z and k = 1 + z*h, both of which go to 0 in the
+    lower tail (as -1/z and 2/z^2). Below -CF_FROM they come from the
+    continued fraction h = 1/(x + 2/(x + 3/(x + ...))), x = -z, and k is
+    (2/(x + 3/(x + ...)))*h, without any subtraction.
+    '''
+    z = np.asarray(z, dtype=float)
+    # phi(z)/Phi(z), without dividing two tiny numbers
+    r = np.sqrt(2/np.pi) / special.erfcx(-z/np.sqrt(2))
+    h = np.asarray(r + z)
+    k = np.asarray(1 + z*h)
+    tail = z < -CF_FROM
+    if np.any(tail):
+        x = -z[tail]
+        inner = x
+        for j in range(CF_TERMS - 1, 1, -1):
+            inner = x + (j + 1)/inner
+        h[tail] = 1/(x + 2/inner)
+        k[tail] = 2/inner*h[tail]
+    return h, k
+
+
+def logpdf(y, mu, sigma, tau):
+    '''
+    ARGS
+        y:      RTs (ie, data)
+        mu:     mean of the normal component
+        sigma:  sd of the normal component
+        tau:    mean of the exponential component
+    RETURNS
+        lnf:    log density of each y, broadcast over all arguments
+    '''
+    y, mu, sigma, tau = np.broadcast_arrays(*[np.asarray(a, dtype=float)
+        for a in (y, mu, sigma, tau)])
+    legal = _legal(sigma, tau)
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        z = _z(y, mu, sigma, tau)
+        lnf = np.where(z < 0,
+            -np.log(tau) - (y - mu)**2/(2*sigma**2)
+                + np.log(special.erfcx(-z/np.sqrt(2))/2),
+            -np.log(tau) + (mu - y)/tau + sigma**2/(2*tau**2)
+                + special.log_ndtr(z))
+    return np.where(legal, lnf, -np.inf)
+
+
+def pdf(y, mu, sigma, tau):
+    '''Density of each y (see logpdf).'''
+    return np.exp(logpdf(y, mu, sigma, tau))
+
+
+def cdf(y, mu, sigma, tau):
+    '''Cumulative probability of each y (see logpdf).
+
+    F(y) = Phi((y-mu)/sigma) - tau*f(y)
+    '''
+    y, mu, sigma, tau = np.broadcast_arrays(*[np.asarray(a, dtype=float)
+        for a in (y, mu, sigma, tau)])
+    legal = _legal(sigma, tau)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        F = special.ndtr((y - mu)/sigma) \
+            - np.exp(np.log(tau) + logpdf(y, mu, sigma, tau))
+    return np.where(legal, np.clip(F, 0, 1), np.nan)
+
+
+def grad_logpdf(y, mu, sigma, tau):
+    '''Gradient of the log density with respect to the parameters.
+    RETURNS
+        grad:   array (3, ...) with d/dmu, d/dsigma and d/dtau of
+                logpdf(y, mu, sigma, tau)
+    '''
+    y, mu, sigma, tau = np.broadcast_arrays(*[np.asarray(a, dtype=float)
+        for a in (y, mu, sigma, tau)])
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        u = (y - mu)/sigma
+        s = sigma/tau
+        h, k = _mills(u - s)
+        dmu = (u - h)/sigma
+        dsigma = (u**2 - h*(u + s))/sigma
+        dtau = (u*h - k)/tau
+    return np.array([dmu, dsigma, dtau])
+
+
+def loglik(params, y):
+    '''Summed log-likelihood of the RTs for a batch of parameter sets.
+    ARGS
+        params: array (3,) or (3, n_candidates) of (mu, sigma, tau)
+        y:      vector of RTs
+    RETURNS
+        lnL:    scalar or vector (n_candidates)
+    '''
+    mu, sigma, tau = np.asarray(params, dtype=float)[..., None]
+    return np.sum(logpdf(y, mu, sigma, tau), axis=-1)
+
+
+def grad_loglik(params, y):
+    '''Gradient of loglik() with respect to (mu, sigma, tau).
+    RETURNS
+        grad:   array (3,) or (3, n_candidates)
+    '''
+    mu, sigma, tau = np.asarray(params, dtype=float)[..., None]
+    return np.sum(grad_logpdf(y, mu, sigma, tau), axis=-1)
+
+
+def nlnL(params, y):
+    '''Negative log-likelihood (exGausslnL in ch5), for minimization.'''
+    return -loglik(params, y)
+
+
+def grad_nlnL(params, y):
+    '''Gradient of nlnL().'''
+    return -grad_loglik(params, y)
+
+
+def start_params(y):
+    '''Method-of-moments starting values (mu, sigma, tau) for fitting.'''
+    y = np.asarray(y, dtype=float)
+    sd = np.std(y)
+    skew = np.mean((y - np.mean(y))**3)
+    # the third central moment of the ex-Gaussian is 2 tau^3
+    tau = (skew/2)**(1/3) if skew > 0 else .5*sd
+    tau = min(tau, .9*sd)
+    sigma = np.sqrt(sd**2 - tau**2)
+    return np.array([np.mean(y) - tau, sigma, tau])
+
+
+def fit(y, start=None):
+    '''Maximum likelihood estimates of (mu, sigma, tau).
+
+    Uses the analytic gradient with L-BFGS-B instead of a simplex search.
+    ARGS
+        y:      vector of RTs
+        start:  starting parameters (default: start_params(y))
+    RETURNS
+        theta:  the MLE (mu, sigma, tau)
+        nlnL:   negative log-likelihood at theta
+    '''
+    y = np.asarray(y, dtype=float)
+    if start is None:
+        start = start_params(y)
+    tiny = 1e-8 * np.std(y)
+    res = scipy.optimize.minimize(nlnL, start, args=(y,), jac=grad_nlnL,
+        method='L-BFGS-B', bounds=[(None, None), (tiny, None), (tiny, None)])
+    return res.x, res.fun
+
+
+if __name__ == '__main__':
+    from scipy import integrate, stats
+
+    def convolution(y, mu, sigma, tau):
+        '''ln f(y) by integrating the normal density against the
+        exponential, with the exponential variable in units of tau.'''
+        f = integrate.quad(lambda t: stats.norm.pdf(y - mu - tau*t, 0, sigma)
+            * np.exp(-t), 0, np.inf, epsabs=0, epsrel=1e-12, limit=200)[0]
+        return np.log(f)
+
+    mu, sigma = 1., .1
+    ys = mu + sigma*np.array([-3, -1, 0, 1, 3, 10])
+    print('tau/sigma   max |error| vs exponnorm   vs convolution')
+    for ratio in 10.**np.arange(2, -13, -2):
+        tau = ratio*sigma
+        lnf = logpdf(ys, mu, sigma, tau)
+        exact = np.array([convolution(y, mu, sigma, tau) for y in ys])
+        scipy_lnf = stats.exponnorm.logpdf(ys, ratio, loc=mu, scale=sigma)
+        print('{:9.0e}   {:24.2e}   {:13.2e}'.format(ratio,
+            np.max(np.abs(lnf - scipy_lnf)), np.max(np.abs(lnf - exact))))
+        assert np.allclose(lnf, exact, rtol=1e-9, atol=1e-9)
+        # exponnorm loses accuracy itself below this
+        if ratio >= 1e-2:
+            assert np.allclose(lnf, scipy_lnf, rtol=1e-9, atol=1e-9)
+
+    # gradient, where finite differences are still accurate
+    for tau in (10., .1, 1e-3):
+        theta = np.array([mu, sigma, tau])
+        step = 1e-6*theta
+        numeric = [(logpdf(ys, *(theta + d)) - logpdf(ys, *(theta - d)))
+            / (2*d[i]) for i, d in enumerate(np.diag(step))]
+        assert np.allclose(grad_logpdf(ys, *theta), numeric, rtol=1e-5,
+            atol=1e-5)
+    # and its limit as tau goes to 0, the normal's gradient (with d/dtau
+    # that of the normal's mean)
+    u = (ys - mu)/sigma
+    assert np.allclose(grad_logpdf(ys, mu, sigma, 1e-12*sigma),
+        [u/sigma, (u**2 - 1)/sigma, u/sigma], rtol=1e-9, atol=1e-9)
+    print('gradient ok')
@@ -0,0 +1,94 @@
+'''Lewandowsky and Farrell, Chapter 4
+
+Vectorized SIMPLE model.
+
+The functions in SIMPLEserial.py loop over output positions, recomputing
+the log temporal distances for each one, and take a single value of each
+parameter. Here the J x J matrix of log temporal distances is built
+once, and the similarities of every item to every other item at every
+output position come out of one array expression:
+
+    M[i,j]      = ln(Tr[i] - Ti[j])
+    eta[i,j]    = exp(-c * |M[i,i] - M[i,j]|**alpha)
+    pall[i,j]   = eta[i,j] / sum_j eta[i,j]
+
+pall[i,j] is the probability of recalling item j at output position i,
+and its diagonal is the probability of correct recall (as returned by
+SIMPLEserial). With alpha=1 this is the model in SIMPLEserial and
+SIMPLEserialBinoPMF.
+
+c and alpha can be vectors (or any array), so a whole population of
+parameter sets is scored in one call, with the population axes in front:
+
+    >>> pcor = simple_pcor(np.linspace(1, 20, 500), 1, 2, 5)   # (500, 5)
+'''
+
+from __future__ import division
+import numpy as np
+from scipy import special
+
+
+def log_distances(presTime, recTime, J):
+    '''
+    ARGS
+        presTime:   time separating onset of words during encoding
+        recTime:    time of separation during retrieval
+        J:          length of the list (ie, how many words?)
+    RETURNS
+        M:          J x J matrix, M[i,j] = log temporal distance of
+                    word j at the time word i is recalled
+    '''
+    # presentation times (for each word)
+    Ti = np.cumsum(np.repeat(presTime, J))
+    # recall times
+    Tr = Ti[-1] + np.cumsum(np.repeat(recTime, J))
+    return np.log(Tr[:, None] - Ti[None, :])
+
+
+def log_simple_probs(c, alpha, presTime, recTime, J):
+    '''Log probability of recalling each item at each output position.
+    ARGS
+        c:          parameter(s) of SIMPLE (distinctiveness)
+        alpha:      parameter(s) of SIMPLE (shape of similarity gradient)
+        presTime, recTime, J:   as in log_distances
+    RETURNS
+        lnpall:     array (..., J, J), broadcast over c and alpha,
+                    lnpall[..., i, j] = ln P(item j at position i)
+    '''
+    M = log_distances(presTime, recTime, J)
+    # distance of every word from the word at each output position
+    D = np.abs(np.diag(M)[:, None] - M)
+    c = np.asarray(c, dtype=float)[..., None, None]
+    alpha = np.asarray(alpha, dtype=float)[..., None, None]
+    # log similarity, and its normalization over each row
+    lneta = -c * D**alpha
+    return lneta - special.logsumexp(lneta, axis=-1, keepdims=True)
+
+
+def simple_probs(c, alpha, presTime, recTime, J):
+    '''Probability of recalling each item at each output position
+    (see log_simple_probs).
+    '''
+    return np.exp(log_simple_probs(c, alpha, presTime, recTime, J))
+
+
+def simple_pcor(c, alpha, presTime, recTime, J):
+    '''Predicted proportion correct at each position (as SIMPLEserial).
+    RETURNS
+        pcor:       array (..., J), broadcast over c and alpha
+    '''
+    lnpall = log_simple_probs(c, alpha, presTime, recTime, J)
+    return np.exp(np.diagonal(lnpall, axis1=-2, axis2=-1))
+
+
+def simple_multinom_lnL(c, alpha, presTime, recTime, J, k):
+    '''Multinomial log-likelihood of recall frequencies
+    (as SIMPLEmultinomLnL, without the multinomial coefficient).
+    ARGS
+        k:          J x J matrix, k[i,j] = number of times item j was
+                    recalled at output position i
+    RETURNS
+        lnL:        array (..., J), log-likelihood of each output position
+    '''
+    lnpall = log_simple_probs(c, alpha, presTime, recTime, J)
+    return np.sum(np.asarray(k) * lnpall, axis=-1)
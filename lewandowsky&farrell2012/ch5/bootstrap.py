@@ -0,0 +1,179 @@
+'''Lewandowsky and Farrell, Chapter 5
+
+Parametric bootstrap for SIMPLE with a response threshold.
+
+This script includes the Ch5 matlab functions:
+    - SIMPLEfreeBino.m
+    - bootstrapExample.m
+
+bootstrapExample.m refits SIMPLEfreeBino to 1000 resampled datasets one
+after another. Here all resampled datasets are drawn up front as one
+(bootSamples x J) binomial draw, the refits are handed out in chunks to
+a pool of worker processes, and the likelihood of SIMPLEfreeBino is
+computed without loops over list positions. The percentile interval is
+updated each time a chunk comes back, and the bootstrap can stop early
+once its endpoints have settled.
+
+Running...
+$ python bootstrap.py
+
+...will run the example from bootstrapExample.m and print the MLE and
+the 95% interval of each parameter.
+'''
+
+from __future__ import division
+import multiprocessing
+import os
+import sys
+
+import numpy as np
+import scipy.optimize
+from scipy.special import expit
+
+# the binomial likelihood layer lives in ch4
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    os.pardir, 'ch4'))
+from binomial_lnL import BinomialData, EPS
+
+
+# example from bootstrapExample.m
+DATA = np.array([40, 28, 13, 11, 11, 10, 6, 11, 17, 8, 14,
+    14, 13, 14, 22, 43, 53, 70, 71, 74])
+N = 80
+Ti = np.arange(1, 21)   # presentation times
+Tr = 30                 # we assume retrieval time is fixed here
+
+
+def SIMPLEfreeBino(theta, data, Ti, Tr, N):
+    '''SIMPLE with a threshold, fitted to free recall (binomial) data.
+    ARGS
+        theta:  array (3,) or (3, n_candidates) of
+                c (distinctiveness), t (threshold) and s (noise)
+        data:   number of words recalled at each position, or a
+                BinomialData object holding them
+        Ti:     presentation time of each word
+        Tr:     time of retrieval
+        N:      number of trials at each position
+    RETURNS
+        dev:    summed negative log-likelihood (without the binomial
+                coefficient, as in the matlab), scalar or (n_candidates,)
+        p:      predicted probability of recall at each position,
+                (J,) or (n_candidates, J)
+    '''
+    c, t, s = [np.asarray(x, dtype=float)[..., None, None] for x in theta]
+    dist = np.log(np.abs(Tr - np.asarray(Ti, dtype=float)))
+    eta = np.exp(-c*np.abs(dist[:, None] - dist[None, :]))
+    # d[i,j]: similarity of i to j, relative to everything similar to j
+    d = eta / np.sum(eta, axis=-2, keepdims=True)
+    p = np.sum(expit(s*(d - t)), axis=-1)
+    p = np.minimum(p, 1 - EPS)
+
+    if not isinstance(data, BinomialData):
+        data = BinomialData(data, N)
+    dev = -(data.loglik(p) - data.const)
+    return dev, p
+
+
+def _deviance(theta, data, Ti, Tr, N):
+    return SIMPLEfreeBino(theta, data, Ti, Tr, N)[0]
+
+
+def fit(data, Ti, Tr, N, start):
+    '''Simplex search for the MLE (fminsearch in the matlab).
+    RETURNS
+        theta:  best fitting parameters
+        fVal:   deviance at theta
+    '''
+    data = BinomialData(data, N)
+    res = scipy.optimize.minimize(_deviance, start, args=(data, Ti, Tr, N),
+        method='Nelder-Mead')
+    return res.x, res.fun
+
+
+def _refit_chunk(task):
+    '''Refit a chunk of resampled datasets (this is what each worker runs).
+    '''
+    indices, samples, Ti, Tr, N, theta = task
+    return indices, np.array([fit(samp, Ti, Tr, N, theta)[0]
+        for samp in samples])
+
+
+def bootstrap(data=DATA, Ti=Ti, Tr=Tr, N=N, bootSamples=1000,
+    start=(5, .5, 10), quantiles=(.025, .975), chunk_size=25,
+    processes=None, seed=None, tol=.01, n_stable=None, callback=None):
+    '''Parametric bootstrap of SIMPLEfreeBino.
+    ARGS
+        data, Ti, Tr, N:    as for SIMPLEfreeBino
+        bootSamples:        (maximum) number of bootstrap samples
+        start:              starting parameters for the MLE (the matlab
+                            starts from [2 .1 20], where the predictions
+                            are clipped at 1-eps at every position, so
+                            the simplex never moves from there)
+        quantiles:          quantiles of the bootstrap distribution to report
+        chunk_size:         number of refits handed to a worker at a time
+        processes:          number of worker processes (default: all cores)
+        seed:               seed for the resampled datasets
+        tol:                the interval counts as settled when no endpoint
+                            moved by more than tol (relative to its size)
+                            since the previous chunk
+        n_stable:           stop once the interval has stayed settled for
+                            this many chunks in a row; None runs all samples
+        callback:           optional, called as callback(n_done, quants)
+                            whenever the interval is updated
+    RETURNS
+        theta:      MLE of the parameters
+        fVal:       deviance at the MLE
+        quants:     array (len(quantiles), 3), the bootstrap interval
+        samplePhat: array (n_done, 3), parameters of the refits done
+    '''
+    rng = np.random.default_rng(seed)
+
+    # MLE of parameters, and its predictions
+    theta, fVal = fit(data, Ti, Tr, N, start)
+    pred = SIMPLEfreeBino(theta, data, Ti, Tr, N)[1]
+
+    # all resampled datasets at once
+    sampData = rng.binomial(N, pred, size=(bootSamples, len(pred)))
+    tasks = [(np.arange(i, min(i + chunk_size, bootSamples)),
+        sampData[i:i + chunk_size], Ti, Tr, N, theta)
+        for i in range(0, bootSamples, chunk_size)]
+
+    samplePhat = np.full((bootSamples, len(theta)), np.nan)
+    done = np.zeros(bootSamples, dtype=bool)
+    quants = None
+    stable = 0
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        for indices, thetas in pool.imap_unordered(_refit_chunk, tasks):
+            samplePhat[indices] = thetas
+            done[indices] = True
+
+            new_quants = np.quantile(samplePhat[done], quantiles, axis=0)
+            if callback is not None:
+                callback(done.sum(), new_quants)
+            if quants is not None:
+                scale = np.abs(quants[-1] - quants[0]) + EPS
+                moved = np.max(np.abs(new_quants - quants) / scale)
+                stable = stable + 1 if moved <= tol else 0
+            quants = new_quants
+            if n_stable is not None and stable >= n_stable:
+                break
+    finally:
+        pool.terminate()
+        pool.join()
+
+    return theta, fVal, quants, samplePhat[done]
+
+
+if __name__ == '__main__':
+
+    def report(n_done, quants):
+        print('{} samples'.format(n_done))
+
+    theta, fVal, quants, samplePhat = bootstrap(seed=14141, n_stable=5,
+        callback=report)
+    print('MLE (c, t, s): {}'.format(np.round(theta, 4)))
+    print('deviance: {:.4f}'.format(fVal))
+    print('95% interval from {} samples:'.format(len(samplePhat)))
+    print(np.round(quants, 4))
@@ -0,0 +1,36 @@
+'''Lewandowsky and Farrell, Chapter 5
+
+This script includes the Ch5 matlab function:
+    - infoCriteria.m
+'''
+
+from __future__ import division
+import numpy as np
+
+
+def infoCriteria(nlnLs, Npar, N):
+    '''Calculate information criteria (AIC; BIC),
+    IC differences from best model (AICd; BICd),
+    and model weights (AICw, BICw) from negative lnLs.
+    ARGS
+        nlnLs:  negative log-likelihoods, with models along the last
+                axis (eg, participants x models)
+        Npar:   number of parameters in each model
+        N:      number of observations on which the
+                log-likelihoods were calculated
+    RETURNS
+        AIC, BIC, AICd, BICd, AICw, BICw:   each the same shape as nlnLs
+    '''
+    nlnLs = np.asarray(nlnLs, dtype=float)
+    Npar = np.asarray(Npar, dtype=float)
+
+    AIC = 2*nlnLs + 2*Npar
+    BIC = 2*nlnLs + Npar*np.log(N)
+
+    AICd = AIC - np.min(AIC, axis=-1, keepdims=True)
+    BICd = BIC - np.min(BIC, axis=-1, keepdims=True)
+
+    AICw = np.exp(-.5*AICd) / np.sum(np.exp(-.5*AICd), axis=-1, keepdims=True)
+    BICw = np.exp(-.5*BICd) / np.sum(np.exp(-.5*BICd), axis=-1, keepdims=True)
+
+    return AIC, BIC, AICd, BICd, AICw, BICw
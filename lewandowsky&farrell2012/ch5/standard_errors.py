@@ -0,0 +1,196 @@
+'''Lewandowsky and Farrell, Chapter 5
+
+Hessians and standard errors of parameter estimates.
+
+This script includes the Ch5 matlab functions:
+    - hessian.m
+    - myHessianExample.m (with exGausslnL)
+
+hessian.m evaluates the negative log-likelihood 4 times for every one of
+the p^2 pairs of parameters, with a single fixed step size delta. Here:
+
+    - if the model supplies an analytic gradient (eg, the ex-Gaussian in
+      ch4/exgauss.py), the Hessian is the central difference of the
+      gradient, which only needs 2p gradient evaluations
+    - otherwise, a symmetric finite-difference scheme is used that needs
+      2p^2+1 evaluations (the center, +-h_i, and +-h_i+-h_j for i<j),
+      instead of 4p^2
+
+In both cases the step for parameter i is h_i = r*max(|theta_i|, 1),
+with r = eps^(1/3) for differences of a gradient and eps^(1/4) for
+second differences of the objective (the steps that balance truncation
+and rounding error). Given bounds, no point is evaluated outside them:
+h_i is at most half the width of the bounds of parameter i, and if
+theta_i is closer than h_i to a bound (eg, an MLE on the bound), the
+differences are taken around the nearest point h_i inside it instead,
+which is as accurate as a one-sided difference. If the objective (or
+gradient) takes a batch of parameter sets as a (n_params x n_points)
+array, all perturbed points are evaluated in a single call.
+
+    >>> result = standard_errors(exgauss.nlnL, theta, args=(y,),
+    ...     grad=exgauss.grad_nlnL, batched=True)
+    >>> result['se'], result['cov'], result['cond']
+
+Running...
+$ python standard_errors.py
+
+...will run myHessianExample and print the MLE and its standard errors.
+'''
+
+from __future__ import division
+import os
+import sys
+
+import numpy as np
+
+
+# relative step sizes that balance truncation and rounding error
+GRAD_STEP = np.finfo(float).eps**(1/3)      # for differencing a gradient
+FUN_STEP = np.finfo(float).eps**(1/4)       # for second differences of f
+
+
+def step_sizes(theta, rel_step, bounds=None):
+    '''Step for each parameter, scaled to the size of the parameter, and
+    no more than half the width of its bounds (lower, upper).'''
+    theta = np.asarray(theta, dtype=float)
+    h = rel_step * np.maximum(np.abs(theta), 1.)
+    if bounds is not None:
+        lower, upper = np.broadcast_arrays(*bounds)
+        h = np.minimum(h, (upper - lower) / 2)
+    return h
+
+
+def _center(theta, h, bounds):
+    '''theta, moved just far enough from its bounds that theta +- h is
+    inside them.'''
+    theta = np.asarray(theta, dtype=float)
+    if bounds is None:
+        return theta
+    lower, upper = np.broadcast_arrays(*bounds)
+    return np.clip(theta, lower + h, upper - h)
+
+
+def _evaluate(fun, points, args, batched):
+    '''Evaluate fun at each column of points (n_params x n_points).'''
+    if batched:
+        return np.asarray(fun(points, *args))
+    return np.array([fun(point, *args) for point in points.T]).T
+
+
+def hessian_from_gradient(grad, theta, args=(), batched=False, h=None,
+    bounds=None):
+    '''Hessian as the central difference of an analytic gradient.
+    ARGS
+        grad:       gradient function, grad(theta, *args) -> (n_params,)
+                    (or (n_params x n_points) if batched)
+        theta:      parameters to compute the Hessian at
+        args:       extra arguments passed to grad (eg, the data)
+        batched:    grad takes a (n_params x n_points) array
+        h:          step for each parameter (default: step_sizes)
+        bounds:     (lower, upper) of the parameters, to keep the
+                    differences inside (default: unbounded)
+    RETURNS
+        H:          Hessian, (n_params x n_params)
+    '''
+    theta = np.asarray(theta, dtype=float)
+    h = step_sizes(theta, GRAD_STEP, bounds) if h is None else h
+    theta = _center(theta, h, bounds)
+    steps = np.diag(h)
+    points = np.hstack([theta[:, None] + steps, theta[:, None] - steps])
+    g = _evaluate(grad, points, args, batched)
+    p = len(theta)
+    H = (g[:, :p] - g[:, p:]) / (2*h)
+    return (H + H.T) / 2
+
+
+def hessian_from_function(fun, theta, args=(), batched=False, h=None,
+    bounds=None):
+    '''Hessian from symmetric finite differences of the objective.
+    ARGS
+        fun:        objective, fun(theta, *args) -> scalar
+                    (or (n_points,) if batched)
+        theta:      parameters to compute the Hessian at
+        args:       extra arguments passed to fun (eg, the data)
+        batched:    fun takes a (n_params x n_points) array
+        h:          step for each parameter (default: step_sizes)
+        bounds:     (lower, upper) of the parameters, to keep the
+                    differences inside (default: unbounded)
+    RETURNS
+        H:          Hessian, (n_params x n_params)
+    '''
+    theta = np.asarray(theta, dtype=float)
+    h = step_sizes(theta, FUN_STEP, bounds) if h is None else h
+    theta = _center(theta, h, bounds)
+    p = len(theta)
+    e = np.diag(h)
+    pairs = [(i, j) for i in range(p) for j in range(i+1, p)]
+
+    # center, +-e_i, then ++, +-, -+, -- for each pair i<j: 2p^2+1 points
+    offsets = [np.zeros(p)] + [e[i] for i in range(p)] + [-e[i] for i in range(p)]
+    for i, j in pairs:
+        offsets += [e[i]+e[j], e[i]-e[j], -e[i]+e[j], -e[i]-e[j]]
+    f = _evaluate(fun, theta[:, None] + np.array(offsets).T, args, batched)
+
+    f0, fplus, fminus = f[0], f[1:p+1], f[p+1:2*p+1]
+    H = np.diag((fplus - 2*f0 + fminus) / h**2)
+    for n, (i, j) in enumerate(pairs):
+        pp, pm, mp, mm = f[2*p+1+4*n:2*p+5+4*n]
+        H[i, j] = H[j, i] = (pp - pm - mp + mm) / (4*h[i]*h[j])
+    return H
+
+
+def standard_errors(fun, theta, args=(), grad=None, batched=False,
+    bounds=None):
+    '''Covariance, standard errors and conditioning of an MLE.
+    ARGS
+        fun:        negative log-likelihood, fun(theta, *args)
+        theta:      the MLE
+        args:       extra arguments passed to fun and grad (eg, the data)
+        grad:       analytic gradient of fun, if the model has one
+        batched:    fun (and grad) take a (n_params x n_points) array
+        bounds:     (lower, upper) of the parameters (arrays, or scalars
+                    for all of them; +-inf for none), which the finite
+                    differences don't step outside of
+    RETURNS
+        result:     dict with the Hessian (hessian), its inverse (cov),
+                    standard errors (se) and condition number (cond);
+                    se is nan for parameters with a non-positive variance
+    '''
+    if grad is not None:
+        H = hessian_from_gradient(grad, theta, args, batched, bounds=bounds)
+    else:
+        H = hessian_from_function(fun, theta, args, batched, bounds=bounds)
+    try:
+        cov = np.linalg.inv(H)
+    except np.linalg.LinAlgError:
+        cov = np.linalg.pinv(H)
+    var = np.diag(cov)
+    se = np.where(var > 0, np.sqrt(np.abs(var)), np.nan)
+    return dict(hessian=H, cov=cov, se=se, cond=np.linalg.cond(H))
+
+
+if __name__ == '__main__':
+
+    # the ex-Gaussian lives in ch4
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+        os.pardir, 'ch4'))
+    import exgauss
+
+    ## myHessianExample
+    np.random.seed(151513)
+    N = 100
+    y = np.random.normal(500, 65, size=N) + np.random.exponential(100, size=N)
+
+    # find MLEs for ex-Gaussian parameters
+    x, fVal = exgauss.fit(y, start=[500, 65, 100])
+
+    # find Hessian for MLEs, from the analytic gradient
+    result = standard_errors(exgauss.nlnL, x, args=(y,),
+        grad=exgauss.grad_nlnL, batched=True)
+    # and without it, for comparison
+    numeric = standard_errors(exgauss.nlnL, x, args=(y,), batched=True)
+
+    print('MLE (mu, sigma, tau): {}'.format(np.round(x, 3)))
+    print('SE (analytic gradient): {}'.format(np.round(result['se'], 3)))
+    print('SE (finite differences): {}'.format(np.round(numeric['se'], 3)))
+    print('condition number of the Hessian: {:.1f}'.format(result['cond']))
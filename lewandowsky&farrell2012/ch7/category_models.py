@@ -0,0 +1,256 @@
+'''Lewandowsky and Farrell, Chapter 7
+
+Categorization models fitted in catModels.m.
+
+This script includes the Ch7 matlab functions:
+    - GRTlnL.m
+    - DEMlnL.m
+
+and the GCM, which catModels.m fits as DEM with gamma fixed at 1.
+Each gives the negative log-likelihood of one participant's response
+frequencies, and the predicted probabilities of an 'A' response.
+
+Two problems in GRTlnL.m are fixed here: it did not return after
+flagging bound1 >= bound2, and its normalCDF was missing the +1
+(0.5*erf(x/sqrt(2)) instead of 0.5*(1+erf(x/sqrt(2)))).
+
+GRT_batch and DEM_batch score a whole population of candidate parameter
+sets against every participant in one array evaluation, for
+population-based optimizers and for likelihood grids over a cohort:
+
+    >>> theta = np.array(np.meshgrid(c_grid, gamma_grid)).reshape(2, -1)
+    >>> nlnL = DEM_batch(theta, stimval, feedback, dataF, N)
+    >>> nlnL.shape                          # (n_participants, n_candidates)
+
+They work with log probabilities throughout (log_ndtr for the GRT, and
+logsumexp for the summed similarities of the DEM), so predictions that
+are extremely close to 0 or 1 don't round off. Parameter sets that break
+a constraint (bound1 >= bound2 or sd <= 0 for the GRT; c < 0 or
+gamma < 0 for the DEM) are masked and given realmax, as GRTlnL does.
+
+The data from catModels.m are included at the bottom.
+
+Running...
+$ python category_models.py
+
+...will evaluate the DEM over a grid of (c, gamma) for all participants
+at once and print the best grid point for each.
+'''
+
+from __future__ import division
+import numpy as np
+from scipy import special
+
+
+REALMAX = np.finfo(float).max
+EPS = np.finfo(float).eps
+LOG_TINY = np.log(np.finfo(float).tiny)
+
+
+def normalCDF(x):
+    return 0.5*(1 + special.erf(x/np.sqrt(2)))
+
+
+def _binomial_nlnL(predP, data, N):
+    predP = np.clip(predP, EPS, 1 - EPS)
+    return -np.sum(data*np.log(predP) + (N - data)*np.log(1 - predP))
+
+
+def GRTlnL(theta, x, data, N):
+    '''
+    ARGS
+        theta:  GRT parameters (bound1, bound2, sd)
+        x:      stimulus values
+        data:   number of times 'A' was selected for each stimulus
+        N:      total number of test trials for each stimulus
+    RETURNS
+        lnL:    negative log-likelihood
+        predP:  predicted probability of 'A' for each stimulus
+    '''
+    bound1, bound2, sd = theta
+
+    if bound1 >= bound2:
+        return REALMAX, np.full(np.shape(x), np.nan)
+
+    a1 = normalCDF((bound1 - x)/sd)
+    a2 = 1 - normalCDF((bound2 - x)/sd)
+    predP = a1 + a2
+
+    return _binomial_nlnL(predP, data, N), predP
+
+
+def DEMlnL(theta, x, feedback, data, N):
+    '''
+    ARGS
+        theta:      DEM parameters (c, gamma)
+        x:          stimulus values
+        feedback:   2 x n_stimuli, number of times each stimulus was
+                    an 'A' (row 0) and a 'B' (row 1) during training
+        data:       number of times 'A' was selected for each stimulus
+        N:          total number of test trials for each stimulus
+    RETURNS
+        lnL:        negative log-likelihood
+        predP:      predicted probability of 'A' for each stimulus
+    '''
+    c, gamma = theta
+    x = np.asarray(x, dtype=float)
+
+    # similarity of every stimulus to every other
+    s = np.exp(-c*np.abs(x[:, None] - x[None, :]))
+    sumA = np.dot(s, feedback[0])
+    sumB = np.dot(s, feedback[1])
+    predP = sumA**gamma / (sumA**gamma + sumB**gamma)
+
+    return _binomial_nlnL(predP, data, N), predP
+
+
+def GCMlnL(theta, x, feedback, data, N):
+    '''GCM, which is DEM with gamma fixed at 1 (theta is just c).'''
+    return DEMlnL([theta[0], 1], x, feedback, data, N)
+
+
+## batched kernels
+
+def _as_population(theta):
+    '''theta as (n_params, n_candidates) or (n_params, n_participants,
+    n_candidates); a single parameter vector is one candidate.'''
+    theta = np.asarray(theta, dtype=float)
+    return theta[:, None] if theta.ndim == 1 else theta
+
+
+def _log_ndtr_diff(a, b):
+    '''log(Phi(b) - Phi(a)) for a < b, without cancellation in either tail.
+    '''
+    # above 0 both cdfs are close to 1, so use Phi(-a) - Phi(-b) instead
+    upper = a > 0
+    lo = np.where(upper, -b, a)
+    hi = np.where(upper, -a, b)
+    log_hi = special.log_ndtr(hi)
+    with np.errstate(divide='ignore'):
+        return log_hi + np.log(-np.expm1(special.log_ndtr(lo) - log_hi))
+
+
+def _binomial_nlnL_batch(logpA, logpB, data, N):
+    '''Negative log-likelihood of each participant's data for each candidate.
+    ARGS
+        logpA, logpB:   log predicted probabilities of 'A' and 'B',
+                        (n_candidates, n_stimuli) or
+                        (n_participants, n_candidates, n_stimuli)
+        data, N:        (n_participants, n_stimuli)
+    RETURNS
+        nlnL:           (n_participants, n_candidates)
+    '''
+    data = np.atleast_2d(np.asarray(data, dtype=float))[:, None, :]
+    N = np.asarray(N, dtype=float)
+    N = N[:, None, :] if N.ndim == 2 else N
+    # keep log(0) finite, so a count of 0 times it is 0 rather than nan
+    logpA = np.maximum(logpA, LOG_TINY)
+    logpB = np.maximum(logpB, LOG_TINY)
+    return -np.sum(data*logpA + (N - data)*logpB, axis=-1)
+
+
+def GRT_batch(theta, x, data, N):
+    '''GRTlnL for many parameter sets and participants at once.
+    ARGS
+        theta:  (3, n_candidates) of (bound1, bound2, sd) shared by all
+                participants, or (3, n_participants, n_candidates) for a
+                separate population per participant
+        x:      stimulus values
+        data:   (n_participants, n_stimuli) number of 'A' responses
+        N:      number of test trials for each stimulus
+    RETURNS
+        nlnL:   (n_participants, n_candidates), realmax where
+                bound1 >= bound2 or sd <= 0
+    '''
+    bound1, bound2, sd = [t[..., None] for t in _as_population(theta)]
+    x = np.asarray(x, dtype=float)
+    valid = (bound1 < bound2) & (sd > 0)
+    # harmless stand-ins where the constraints are broken
+    sd = np.where(valid, sd, 1.)
+    bound2 = np.where(valid, bound2, bound1 + 1.)
+
+    lo = (bound1 - x)/sd
+    hi = (bound2 - x)/sd
+    # 'A' below bound1 or above bound2, 'B' in between
+    logpA = np.logaddexp(special.log_ndtr(lo), special.log_ndtr(-hi))
+    logpB = _log_ndtr_diff(lo, hi)
+
+    nlnL = _binomial_nlnL_batch(logpA, logpB, data, N)
+    return np.where(valid[..., 0], nlnL, REALMAX)
+
+
+def DEM_batch(theta, x, feedback, data, N):
+    '''DEMlnL for many parameter sets and participants at once.
+    ARGS
+        theta:      (2, n_candidates) of (c, gamma) shared by all
+                    participants, or (2, n_participants, n_candidates)
+                    for a separate population per participant
+        x:          stimulus values
+        feedback:   2 x n_stimuli, as for DEMlnL
+        data:       (n_participants, n_stimuli) number of 'A' responses
+        N:          number of test trials for each stimulus
+    RETURNS
+        nlnL:       (n_participants, n_candidates), realmax where
+                    c < 0 or gamma < 0
+    '''
+    c, gamma = [t[..., None] for t in _as_population(theta)]
+    x = np.asarray(x, dtype=float)
+    feedback = np.asarray(feedback, dtype=float)
+    valid = (c >= 0) & (gamma >= 0)
+    c = np.where(valid, c, 0.)
+    gamma = np.where(valid, gamma, 1.)
+
+    # log similarity of every stimulus to every other
+    logs = -c[..., None]*np.abs(x[:, None] - x[None, :])
+    logA = gamma*special.logsumexp(logs, b=feedback[0], axis=-1)
+    logB = gamma*special.logsumexp(logs, b=feedback[1], axis=-1)
+    norm = np.logaddexp(logA, logB)
+
+    nlnL = _binomial_nlnL_batch(logA - norm, logB - norm, data, N)
+    return np.where(valid[..., 0], nlnL, REALMAX)
+
+
+def GCM_batch(theta, x, feedback, data, N):
+    '''DEM_batch with gamma fixed at 1 (theta is (1, ...) of c).'''
+    c = _as_population(theta)[0]
+    return DEM_batch(np.array([c, np.ones_like(c)]), x, feedback, data, N)
+
+
+## data and design of catModels.m
+
+dataP = np.array([
+    [0.75, 0.67, 0.54, 0.4, 0.4, 0.37, 0.58, 0.71],
+    [0.92, 0.81, 0.53, 0.28, 0.14, 0.22, 0.45, 0.81],
+    [0.91, 0.97, 0.93, 0.64, 0.28, 0.09, 0.12, 0.7],
+    [0.98, 0.94, 0.85, 0.62, 0.2, 0.037, 0.078, 0.71],
+    [0.97, 0.94, 0.8, 0.58, 0.4, 0.45, 0.81, 0.97],
+    [0.29, 0.66, 0.85, 0.71, 0.33, 0.1, 0.32, 0.77],
+    ])
+pptLab = ['SB', 'SEH', 'VB', 'BG', 'NV', 'LT']
+
+# number sessions x 10 blocks x 96 trials /(n stimuli)
+Ntrain = (5*10*96)/8
+pfeedback = np.array([.6, .6, 1, 1, 0, 0, .6, .6])
+Afeedback = pfeedback * Ntrain
+feedback = np.array([Afeedback, Ntrain - Afeedback])
+
+Ntest = (3*10*96)/8
+N = np.repeat(Ntest, 8)
+
+dataF = np.ceil(Ntest*dataP)
+
+stimval = np.linspace(.0625, .9375, 8)
+
+
+if __name__ == '__main__':
+
+    # the DEM over a (c, gamma) grid, for all participants in one go
+    c_grid = np.linspace(0, 20, 201)
+    gamma_grid = np.linspace(0, 8, 161)
+    theta = np.array(np.meshgrid(c_grid, gamma_grid)).reshape(2, -1)
+    nlnL = DEM_batch(theta, stimval, feedback, dataF, N)
+
+    best = np.argmin(nlnL, axis=1)
+    for ppt, i in zip(pptLab, best):
+        print('{}: c = {:.2f}, gamma = {:.2f}, -lnL = {:.2f}'.format(
+            ppt, theta[0, i], theta[1, i], nlnL[pptLab.index(ppt), i]))
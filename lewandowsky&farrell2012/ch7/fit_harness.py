@@ -0,0 +1,343 @@
+'''Lewandowsky and Farrell, Chapter 7
+
+Fitting harness for many models and many participants.
+
+catModels.m loops over the models (GCM, GRT, DEM) and the 6 participants
+one after another, and for each fits the model with fminbnd or
+fminsearchbnd, takes the Hessian for standard errors, and finally
+compares the models with infoCriteria. Here each (model, participant)
+fit is an independent task handed to a pool of worker processes, and all
+results are collected in one table with a row per (participant, model):
+
+    >>> table = fit_all(MODELS, dataF, N, cache_dir='fits')
+    >>> table.pivot(index='participant', columns='model', values='AICw')
+
+A model is a dict (see make_model) holding its negative log-likelihood
+function, the extra arguments it needs besides theta, the data and N,
+and its starting values and bounds. Models with one parameter and
+finite bounds are fitted with a bounded scalar search (fminbnd);
+all others with Nelder-Mead on transformed parameters that can't leave
+their bounds (as fminsearchbnd does):
+
+    - finite lower and upper bounds:    lower + (upper-lower)*logistic(z)
+    - lower bound only:                 lower + exp(z)
+    - upper bound only:                 upper - exp(z)
+
+The search in z can stall where the transforms flatten out, ie at the
+bounds (GRT for participant LT stops at bound1=-1, bound2=2 from the
+catModels start), so it is run from n_starts points: the model's start,
+and Latin hypercube points within +-Z_SPREAD of it in z, the best of
+which is kept. Standard errors are taken with the finite differences
+kept inside the bounds.
+
+If cache_dir is given, every fit is saved there under a hash of the
+model and the participant's data, so that re-running after adding a
+model (or a participant) only fits what is new.
+
+Running...
+$ python fit_harness.py
+
+...will run catModels and print the table, the model weights, and plot
+the predictions of each model for each participant.
+'''
+
+from __future__ import division
+import hashlib
+import multiprocessing
+import os
+import sys
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import scipy.optimize
+from scipy.special import expit, logit
+
+from category_models import (GRTlnL, DEMlnL, GCMlnL, dataP, dataF, N,
+    feedback, stimval, pptLab)
+
+# standard errors and information criteria live in ch5, start points in ch3
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    os.pardir, 'ch5'))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    os.pardir, 'ch3'))
+from standard_errors import standard_errors
+from info_criteria import infoCriteria
+from multistart import start_points
+
+
+# starts of each Nelder-Mead fit, spread +-Z_SPREAD around the model's
+# start in transformed (z) space
+N_STARTS = 10
+Z_SPREAD = 3.
+
+
+def make_model(fun, start, lower, upper, args=(), parnames=None):
+    '''Describe a model for fit_all.
+    ARGS
+        fun:        negative log-likelihood, called as
+                    fun(theta, *args, data, N) -> (nlnL, predP);
+                    it is sent to the worker processes, so has to be
+                    defined at the top level of a module
+        start:      starting parameters
+        lower:      lower bounds (-inf for none)
+        upper:      upper bounds (inf for none)
+        args:       extra arguments for fun (eg, stimulus values)
+        parnames:   names of the parameters
+    RETURNS
+        model:      dict
+    '''
+    start = np.asarray(start, dtype=float)
+    if parnames is None:
+        parnames = ['theta{}'.format(i) for i in range(len(start))]
+    return dict(fun=fun, args=tuple(args), start=start,
+        lower=np.broadcast_to(np.asarray(lower, dtype=float), start.shape),
+        upper=np.broadcast_to(np.asarray(upper, dtype=float), start.shape),
+        parnames=list(parnames))
+
+
+# the models of catModels.m
+MODELS = OrderedDict([
+    ('GCM', make_model(GCMlnL, [5], 0, 100,
+        args=(stimval, feedback), parnames=['c'])),
+    ('GRT', make_model(GRTlnL, [.3, .7, .1], [-1, -1, np.finfo(float).eps],
+        [2, 2, 10], args=(stimval,), parnames=['bound1', 'bound2', 'sd'])),
+    ('DEM', make_model(DEMlnL, [5, 1], [0, 0], [np.inf, np.inf],
+        args=(stimval, feedback), parnames=['c', 'gamma'])),
+    ])
+
+
+## bounded-parameter transforms
+
+def to_bounded(z, lower, upper):
+    '''Map unconstrained z into the bounds.'''
+    z = np.asarray(z, dtype=float)
+    lo, up = np.isfinite(lower), np.isfinite(upper)
+    with np.errstate(over='ignore', invalid='ignore'):
+        theta = np.where(lo & up, lower + (upper - lower)*expit(z),
+            np.where(lo, lower + np.exp(z),
+            np.where(up, upper - np.exp(z), z)))
+    return theta
+
+
+def from_bounded(theta, lower, upper):
+    '''Map theta (inside its bounds) to unconstrained z.'''
+    theta = np.asarray(theta, dtype=float)
+    lo, up = np.isfinite(lower), np.isfinite(upper)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = np.where(lo & up, logit((theta - lower) / (upper - lower)),
+            np.where(lo, np.log(theta - lower),
+            np.where(up, np.log(upper - theta), theta)))
+    return z
+
+
+## fitting a single (model, participant)
+
+def _nlnL(theta, model, data, N):
+    return model['fun'](theta, *(model['args'] + (data, N)))[0]
+
+
+def _nlnL_z(z, model, data, N):
+    return _nlnL(to_bounded(z, model['lower'], model['upper']), model, data, N)
+
+
+def fit_one(model, data, N, n_starts=N_STARTS, seed=0):
+    '''Fit one model to one participant.
+    ARGS
+        model:      as from make_model
+        data:       number of 'A' responses for each stimulus
+        N:          number of test trials for each stimulus
+        n_starts:   Nelder-Mead searches, from the model's start and
+                    n_starts-1 points around it (1 for the start only)
+        seed:       seed for the other start points
+    RETURNS
+        fit:    dict with the MLE (theta), its standard errors (se), the
+                negative log-likelihood (nlnL), the predictions (predP)
+                and whether the search converged (success)
+    '''
+    lower, upper = model['lower'], model['upper']
+    if len(model['start']) == 1 and np.all(np.isfinite([lower, upper])):
+        res = scipy.optimize.minimize_scalar(
+            lambda x: _nlnL([x], model, data, N),
+            bounds=(lower[0], upper[0]), method='bounded')
+        theta = np.array([res.x])
+    else:
+        # keep the start a little inside the bounds, so it maps to finite z
+        span = np.where(np.isfinite(upper - lower), upper - lower, 1.)
+        start = np.clip(model['start'], lower + 1e-6*span, upper - 1e-6*span)
+        z0 = from_bounded(start, lower, upper)
+        starts = [z0]
+        if n_starts > 1:
+            starts.extend(z0 + start_points([(-Z_SPREAD, Z_SPREAD)]*len(z0),
+                n_starts - 1, seed=seed))
+        res = min((scipy.optimize.minimize(_nlnL_z, z, args=(model, data, N),
+            method='Nelder-Mead') for z in starts), key=lambda r: r.fun)
+        theta = to_bounded(res.x, lower, upper)
+    nlnL, predP = model['fun'](theta, *(model['args'] + (data, N)))
+
+    se = standard_errors(_nlnL, theta, args=(model, data, N),
+        bounds=(lower, upper))['se']
+    return dict(theta=theta, se=se, nlnL=float(nlnL),
+        predP=np.asarray(predP, dtype=float), success=bool(res.success))
+
+
+## caching
+
+def fit_key(name, model, data, N, n_starts=N_STARTS):
+    '''Hash of everything a fit depends on.'''
+    h = hashlib.sha1()
+    h.update(name.encode())
+    h.update('n_starts={}'.format(n_starts).encode())
+    h.update('{}.{}'.format(model['fun'].__module__,
+        model['fun'].__name__).encode())
+    for x in ((model['start'], model['lower'], model['upper'])
+            + model['args'] + (data, N)):
+        x = np.ascontiguousarray(x, dtype=float)
+        h.update(str(x.shape).encode())
+        h.update(x.tobytes())
+    return h.hexdigest()
+
+
+def _cache_path(cache_dir, key):
+    return os.path.join(cache_dir, key + '.npz')
+
+
+def load_fit(cache_dir, key):
+    '''A cached fit, or None if there isn't one.'''
+    path = _cache_path(cache_dir, key)
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as f:
+        return dict(theta=f['theta'], se=f['se'], nlnL=float(f['nlnL']),
+            predP=f['predP'], success=bool(f['success']))
+
+
+def save_fit(cache_dir, key, fit):
+    path = _cache_path(cache_dir, key)
+    # write then rename, so an interrupted run can't leave half a file
+    tmp = path + '.tmp.npz'
+    np.savez(tmp, **fit)
+    os.replace(tmp, path)
+
+
+def _run_task(task):
+    '''Unpack a task for the worker pool.
+    '''
+    index, model, data, N, n_starts = task
+    return index, fit_one(model, data, N, n_starts)
+
+
+## all models for all participants
+
+def fit_all(models, data, N, participants=None, processes=None,
+    cache_dir=None, chunksize=1, n_starts=N_STARTS):
+    '''Fit every model to every participant.
+    ARGS
+        models:         dict of name: model (see make_model)
+        data:           array (n_participants x n_stimuli) of the number
+                        of 'A' responses
+        N:              number of test trials for each stimulus,
+                        (n_stimuli,) or (n_participants x n_stimuli)
+        participants:   labels for the participants (default: 0, 1, ...)
+        processes:      number of worker processes (default: all cores);
+                        1 fits everything in this process
+        cache_dir:      directory to keep fits in, or None for no cache
+        chunksize:      number of fits handed to a worker at a time
+        n_starts:       searches for each fit (see fit_one)
+    RETURNS
+        table:          pandas DataFrame with a row per (participant, model)
+                        holding theta, se and predP (as tuples), nlnL, the
+                        number of parameters, AIC, BIC, their differences
+                        from the best model (AICd, BICd) and the model
+                        weights (AICw, BICw), computed per participant
+    '''
+    data = np.atleast_2d(np.asarray(data, dtype=float))
+    N = np.broadcast_to(np.asarray(N, dtype=float), data.shape)
+    if participants is None:
+        participants = list(range(len(data)))
+    names = list(models)
+    if cache_dir is not None and not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+
+    fits, tasks, keys = {}, [], {}
+    for m, name in enumerate(names):
+        for p in range(len(data)):
+            if cache_dir is not None:
+                keys[m, p] = fit_key(name, models[name], data[p], N[p],
+                    n_starts)
+                fit = load_fit(cache_dir, keys[m, p])
+                if fit is not None:
+                    fits[m, p] = fit
+                    continue
+            tasks.append(((m, p), models[name], data[p], N[p], n_starts))
+
+    def collect(index, fit):
+        fits[index] = fit
+        if cache_dir is not None:
+            save_fit(cache_dir, keys[index], fit)
+
+    if processes == 1 or len(tasks) <= 1:
+        for task in tasks:
+            collect(*_run_task(task))
+    else:
+        pool = multiprocessing.Pool(processes)
+        try:
+            for index, fit in pool.imap_unordered(_run_task, tasks,
+                    chunksize):
+                collect(index, fit)
+        finally:
+            pool.terminate()
+            pool.join()
+
+    # information criteria across models, for each participant
+    nlnLs = np.array([[fits[m, p]['nlnL'] for m in range(len(names))]
+        for p in range(len(data))])
+    Npar = np.array([len(models[name]['start']) for name in names])
+    AIC, BIC, AICd, BICd, AICw, BICw = infoCriteria(nlnLs, Npar,
+        np.sum(N, axis=1, keepdims=True))
+
+    rows = []
+    for p, ppt in enumerate(participants):
+        for m, name in enumerate(names):
+            fit = fits[m, p]
+            rows.append(OrderedDict([
+                ('participant', ppt), ('model', name),
+                ('parnames', tuple(models[name]['parnames'])),
+                ('theta', tuple(fit['theta'])), ('se', tuple(fit['se'])),
+                ('nlnL', fit['nlnL']), ('npar', Npar[m]),
+                ('AIC', AIC[p, m]), ('BIC', BIC[p, m]),
+                ('AICd', AICd[p, m]), ('BICd', BICd[p, m]),
+                ('AICw', AICw[p, m]), ('BICw', BICw[p, m]),
+                ('predP', tuple(fit['predP'])), ('success', fit['success']),
+                ]))
+    return pd.DataFrame(rows)
+
+
+if __name__ == '__main__':
+    import matplotlib.pyplot as plt
+
+    table = fit_all(MODELS, dataF, N, participants=pptLab)
+
+    pd.set_option('display.width', 200)
+    for name in MODELS:
+        print(name)
+        print(table.loc[table.model == name,
+            ['participant', 'theta', 'se', 'nlnL']].to_string(index=False))
+    print(table.pivot(index='participant', columns='model',
+        values='AICw').loc[pptLab, list(MODELS)].round(3))
+
+    for name in MODELS:
+        fig = plt.figure()
+        fig.canvas.manager.set_window_title(name)
+        for i, ppt in enumerate(pptLab):
+            predP = table.loc[(table.model == name)
+                & (table.participant == ppt), 'predP'].iloc[0]
+            plt.subplot(2, 3, i+1)
+            plt.plot(stimval, dataP[i], '-+')
+            plt.plot(stimval, predP, '-.*')
+            plt.ylim([0, 1])
+            plt.xlabel('Luminance')
+            plt.ylabel('P(A)')
+            plt.title(ppt)
+        plt.tight_layout()
+    plt.show()